@@ -0,0 +1,67 @@
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Booking, Review, ArchivedBooking
+
+ARCHIVABLE_STATUSES = ('completed', 'canceled')
+DEFAULT_RETENTION_DAYS = 365
+DEFAULT_BATCH_SIZE = 1000
+
+ARCHIVED_FIELDS = (
+    'booking_id', 'listing_id', 'guest_id', 'check_in_date', 'check_out_date',
+    'number_of_guests', 'total_price', 'status', 'created_at', 'updated_at',
+)
+
+
+def archive_cutoff(retention_days=DEFAULT_RETENTION_DAYS):
+    """Bookings checking out before this date are eligible for archiving"""
+    return timezone.localdate() - timedelta(days=retention_days)
+
+
+def archivable_bookings(cutoff):
+    return Booking.objects.filter(status__in=ARCHIVABLE_STATUSES, check_out_date__lt=cutoff)
+
+
+def archive_batch(cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Move up to `batch_size` eligible bookings into the archive table.
+
+    Copy and delete happen in one short transaction, so a failure leaves
+    each booking in exactly one table. Reviews keep their booking id in
+    ArchivedBooking.review_id and are detached rather than cascaded away.
+    Returns the number of bookings moved.
+    """
+    with transaction.atomic():
+        rows = list(archivable_bookings(cutoff).order_by().values(*ARCHIVED_FIELDS)[:batch_size])
+        if not rows:
+            return 0
+        booking_ids = [row['booking_id'] for row in rows]
+        review_ids = dict(
+            Review.objects.filter(booking_id__in=booking_ids).values_list('booking_id', 'review_id')
+        )
+        ArchivedBooking.objects.bulk_create(
+            [ArchivedBooking(review_id=review_ids.get(row['booking_id']), **row) for row in rows],
+            ignore_conflicts=True,
+        )
+        if review_ids:
+            Review.objects.filter(booking_id__in=booking_ids).update(booking=None)
+        Booking.objects.filter(booking_id__in=booking_ids).delete()
+    return len(rows)
+
+
+def archive_bookings(cutoff, batch_size=DEFAULT_BATCH_SIZE, max_batches=None, pause=0.0):
+    """Archive eligible bookings batch by batch; returns the number moved"""
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+        if pause:
+            # Give other writers a chance at the bookings table between batches
+            time.sleep(pause)
+    return moved
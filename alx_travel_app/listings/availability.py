@@ -0,0 +1,71 @@
+from .models import Listing, Booking, BlockedDateRange
+
+# Night states in the availability strings
+FREE = ord('0')
+BOOKED = ord('1')
+UNAVAILABLE = ord('2')
+BLOCKED = ord('3')
+# Turns free nights blocked and leaves the others as they are
+BLOCK_FREE = bytes.maketrans(bytes([FREE]), bytes([BLOCKED]))
+
+MAX_CALENDAR_LISTINGS = 50
+MAX_CALENDAR_NIGHTS = 62
+
+
+def build_calendar(listing_ids, start, end):
+    """
+    Night-by-night availability for many listings over [start, end).
+
+    Uses three queries whatever the number of listings: one for the
+    listings' price and availability window, one for the bookings and one
+    for the imported blocked ranges that overlap the window. Each listing's
+    nights are a bytearray filled with slice assignments per booking and
+    blocked range rather than per-night loops.
+    Returns a columnar dict; ids that match no visible listing are listed
+    under `missing`.
+    """
+    nights = (end - start).days
+    listings = {
+        listing.listing_id: listing
+        for listing in Listing.objects.filter(listing_id__in=listing_ids).only(
+            'listing_id', 'price_per_night', 'available_from', 'available_to'
+        )
+    }
+
+    rows = {}
+    for listing_id, listing in listings.items():
+        row = bytearray([UNAVAILABLE]) * nights
+        first = max((listing.available_from - start).days, 0)
+        last = min((listing.available_to - start).days, nights)
+        if first < last:
+            row[first:last] = bytes([FREE]) * (last - first)
+        rows[listing_id] = row
+
+    bookings = Booking.objects.filter(
+        listing_id__in=list(listings), check_in_date__lt=end, check_out_date__gt=start
+    ).exclude(status='canceled').values_list('listing_id', 'check_in_date', 'check_out_date')
+    for listing_id, check_in_date, check_out_date in bookings:
+        first = max((check_in_date - start).days, 0)
+        last = min((check_out_date - start).days, nights)
+        rows[listing_id][first:last] = bytes([BOOKED]) * (last - first)
+
+    # Dates blocked by imported calendars; a booking on the same night wins
+    blocked = BlockedDateRange.objects.filter(
+        listing_id__in=list(listings), start_date__lt=end, end_date__gt=start
+    ).values_list('listing_id', 'start_date', 'end_date')
+    for listing_id, start_date, end_date in blocked:
+        first = max((start_date - start).days, 0)
+        last = min((end_date - start).days, nights)
+        row = rows[listing_id]
+        row[first:last] = row[first:last].translate(BLOCK_FREE)
+
+    found = [listing_id for listing_id in listing_ids if listing_id in listings]
+    return {
+        'start': start,
+        'end': end,
+        'nights': nights,
+        'listing_ids': found,
+        'price_per_night': [str(listings[listing_id].price_per_night) for listing_id in found],
+        'availability': [rows[listing_id].decode('ascii') for listing_id in found],
+        'missing': [listing_id for listing_id in listing_ids if listing_id not in listings],
+    }
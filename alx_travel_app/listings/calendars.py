@@ -0,0 +1,257 @@
+import os
+import shutil
+import tempfile
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta, timezone as dt_timezone
+from email.utils import formatdate
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import search
+from .models import Booking, BlockedDateRange, CalendarFeed
+
+PRODID = '-//ALX Travel//Listings//EN'
+# Upserted ranges per bulk statement during a sync
+DEFAULT_BATCH_SIZE = 5000
+FETCH_TIMEOUT = 30
+# Fetched feed bodies stay in memory up to this size, then spill to a temporary file
+SPOOL_BYTES = 1024 * 1024
+
+
+### EXPORT ###
+
+def fold(line):
+    """Fold a content line to 75-octet pieces as RFC 5545 requires"""
+    data = line.encode()
+    if len(data) <= 75:
+        return line + '\r\n'
+    pieces, start, limit = [], 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        # Don't split a UTF-8 sequence
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        pieces.append(data[start:end].decode())
+        start, limit = end, 74
+    return '\r\n '.join(pieces) + '\r\n'
+
+
+def escape(text):
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def export_bookings(listing, since=None, chunk_size=2000):
+    """
+    Yield an iCal calendar of a listing's booked nights, one event per
+    booking that isn't canceled and checks out on or after `since` (default
+    today). Rows are streamed from the database in chunks.
+    """
+    since = since or date.today()
+    yield fold('BEGIN:VCALENDAR')
+    yield fold('VERSION:2.0')
+    yield fold(f'PRODID:{PRODID}')
+    yield fold(f'X-WR-CALNAME:{escape(listing.title)}')
+    bookings = Booking.objects.filter(
+        listing_id=listing.listing_id, check_out_date__gte=since
+    ).exclude(status='canceled').order_by('check_in_date').values_list(
+        'booking_id', 'check_in_date', 'check_out_date', 'updated_at'
+    )
+    for booking_id, check_in_date, check_out_date, updated_at in bookings.iterator(chunk_size=chunk_size):
+        yield (
+            'BEGIN:VEVENT\r\n'
+            f'UID:{booking_id}@alx-travel\r\n'
+            f'DTSTAMP:{updated_at.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")}\r\n'
+            f'DTSTART;VALUE=DATE:{check_in_date:%Y%m%d}\r\n'
+            f'DTEND;VALUE=DATE:{check_out_date:%Y%m%d}\r\n'
+            'SUMMARY:Booked\r\n'
+            'TRANSP:OPAQUE\r\n'
+            'END:VEVENT\r\n'
+        )
+    yield fold('END:VCALENDAR')
+
+
+### IMPORT ###
+
+def unfold(lines):
+    """Join folded continuation lines; accepts str or bytes lines"""
+    current = None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def parse_date_value(value):
+    # DATE (20250101) or DATE-TIME (20250101T140000Z); nights only need the date
+    return date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+
+
+def parse_events(lines):
+    """
+    Yield (uid, start_date, end_date) for each event of an iCal feed,
+    reading it line by line so large feeds are never held in memory.
+    Cancelled events and events without a start are skipped; a missing
+    end means one night. Recurrence rules are not expanded.
+    """
+    event = None
+    for line in unfold(lines):
+        name, _, value = line.partition(':')
+        name = name.split(';', 1)[0].upper()
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            event = {}
+        elif name == 'END' and value.upper() == 'VEVENT':
+            if event and 'DTSTART' in event and event.get('STATUS', '').upper() != 'CANCELLED':
+                try:
+                    start = parse_date_value(event['DTSTART'])
+                    end = parse_date_value(event['DTEND']) if 'DTEND' in event else start + timedelta(days=1)
+                except (ValueError, IndexError):
+                    start = end = None
+                if start and end > start:
+                    uid = event.get('UID') or f'{event["DTSTART"]}-{event.get("DTEND", "")}'
+                    yield uid[:255], start, end
+            event = None
+        elif event is not None and name in ('UID', 'DTSTART', 'DTEND', 'STATUS'):
+            event[name] = value.strip()
+
+
+def fetch_feed(feed):
+    """
+    Fetch one feed. Returns (source, etag, last_modified), with source None
+    when it is unchanged since the last sync, else a binary file object for
+    parse_events that the caller closes. HTTP bodies are spooled to a
+    temporary file, so the fetch finishes without parsing the feed.
+    """
+    url = feed.url
+    if url.startswith(('http://', 'https://')):
+        request = urllib.request.Request(url)
+        if feed.etag:
+            request.add_header('If-None-Match', feed.etag)
+        if feed.last_modified:
+            request.add_header('If-Modified-Since', feed.last_modified)
+        try:
+            with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+                body = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+                shutil.copyfileobj(response, body)
+                body.seek(0)
+                return body, response.headers.get('ETag', ''), response.headers.get('Last-Modified', '')
+        except urllib.error.HTTPError as exc:
+            if exc.code == 304:
+                return None, feed.etag, feed.last_modified
+            raise
+
+    path = url[len('file://'):] if url.startswith('file://') else url
+    last_modified = formatdate(os.stat(path).st_mtime, usegmt=True)
+    if last_modified == feed.last_modified:
+        return None, feed.etag, last_modified
+    return open(path, 'rb'), '', last_modified
+
+
+def fetch_all(feeds, workers, window=None):
+    """
+    Yield (feed, result, error) in feed order as feeds are fetched on a
+    thread pool.
+
+    At most `window` feeds (default twice the workers) are fetched ahead of
+    the consumer; the next one is submitted only after the consumer is done
+    with a result, so open bodies stay bounded however many feeds there are.
+    """
+    def fetch(feed):
+        try:
+            return feed, fetch_feed(feed), None
+        except Exception as exc:
+            return feed, None, f'{type(exc).__name__}: {exc}'[:1000]
+
+    feeds = iter(feeds)
+    window = window or workers * 2
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque(pool.submit(fetch, feed) for feed in islice(feeds, window))
+        try:
+            while pending:
+                yield pending.popleft().result()
+                for feed in islice(feeds, 1):
+                    pending.append(pool.submit(fetch, feed))
+        finally:
+            # Stopped early: close the bodies fetched but never consumed
+            for future in pending:
+                if not future.cancel():
+                    _, result, _ = future.result()
+                    if result and result[0] is not None:
+                        result[0].close()
+
+
+def sync_feeds(feeds, workers=8, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Resync blocked ranges from many feeds.
+
+    Feeds are fetched in parallel threads, a bounded window ahead of this
+    thread, which does the parsing and the database work. Each feed's events
+    are streamed from its file, which is closed once read, and
+    upserted in bulk statements of up to `batch_size` ranges keyed by
+    (feed, uid), so no feed is held in memory as a whole. Ranges a feed no
+    longer lists are deleted with one statement per batch once the whole
+    feed has been read. Unchanged feeds (ETag, Last-Modified or file mtime)
+    are not reparsed. Returns counts of feeds synced, unchanged and failed
+    and of ranges upserted.
+    """
+    synced_at = timezone.now()
+    stats = {'synced': 0, 'unchanged': 0, 'failed': 0, 'ranges': 0}
+    ranges, done, locations = {}, [], set()
+
+    def flush():
+        with transaction.atomic():
+            if ranges:
+                BlockedDateRange.objects.bulk_create(
+                    list(ranges.values()), update_conflicts=True, unique_fields=['feed', 'uid'],
+                    update_fields=['start_date', 'end_date', 'synced_at'],
+                )
+            synced = [feed.pk for feed in done if not feed.last_error and feed.last_synced_at == synced_at]
+            if synced:
+                BlockedDateRange.objects.filter(feed_id__in=synced, synced_at__lt=synced_at).delete()
+            if done:
+                CalendarFeed.objects.bulk_update(done, ['etag', 'last_modified', 'last_synced_at', 'last_error'])
+            search.location_changed(*locations)
+        stats['ranges'] += len(ranges)
+        ranges.clear()
+        done.clear()
+        locations.clear()
+
+    for feed, result, error in fetch_all(feeds, workers):
+        if error:
+            feed.last_error = error
+            stats['failed'] += 1
+        else:
+            source, feed.etag, feed.last_modified = result
+            feed.last_error = ''
+            if source is None:
+                stats['unchanged'] += 1
+            else:
+                feed.last_synced_at = synced_at
+                stats['synced'] += 1
+                with source:
+                    for uid, start, end in parse_events(source):
+                        ranges[feed.pk, uid] = BlockedDateRange(
+                            feed_id=feed.pk, listing_id=feed.listing_id, uid=uid,
+                            start_date=start, end_date=end, synced_at=synced_at,
+                        )
+                        if len(ranges) >= batch_size:
+                            flush()
+                # Added after the events so the flush that completes the feed bumps it
+                locations.add(feed.listing.location)
+        done.append(feed)
+        if len(ranges) >= batch_size or len(done) >= batch_size:
+            flush()
+    flush()
+    return stats
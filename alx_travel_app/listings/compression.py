@@ -0,0 +1,305 @@
+import hashlib
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+# Bodies smaller than this go out as is; below ~1 KiB the header overhead and
+# CPU outweigh the bytes saved
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+DEFAULT_CACHE_BYTES = 16 * 1024 * 1024
+COMPRESSIBLE_TYPES = ('application/json', 'application/xml', 'text/')
+# Server preference when the client weights several encodings equally
+PREFERENCE = ('zstd', 'br', 'gzip')
+
+
+class GzipStream:
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self, level):
+        import brotli
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.finish()
+
+
+class ZstdStream:
+    def __init__(self, level):
+        import zstandard
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+
+def gzip_compress(data, level):
+    return zlib.compress(data, level, wbits=31)
+
+
+def brotli_compress(data, level):
+    import brotli
+    return brotli.compress(data, quality=level)
+
+
+def zstd_compress(data, level):
+    import zstandard
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+# encoding -> (module that must be importable, one-shot compress, streaming compressor)
+CODECS = {
+    'zstd': ('zstandard', zstd_compress, ZstdStream),
+    'br': ('brotli', brotli_compress, BrotliStream),
+    'gzip': (None, gzip_compress, GzipStream),
+}
+
+_available = None
+
+
+def available_encodings():
+    """Encodings this process can produce, most preferred first; zstd and brotli are optional"""
+    global _available
+    if _available is None:
+        encodings = []
+        for encoding in PREFERENCE:
+            module = CODECS[encoding][0]
+            if module is not None:
+                try:
+                    __import__(module)
+                except ImportError:
+                    continue
+            encodings.append(encoding)
+        _available = tuple(encodings)
+    return _available
+
+
+def level(encoding):
+    return getattr(settings, 'LISTINGS_COMPRESSION_LEVELS', {}).get(encoding, DEFAULT_LEVELS[encoding])
+
+
+def negotiate(accept_encoding):
+    """
+    Pick the encoding for an Accept-Encoding header: the highest q-value
+    among available encodings, ties going to PREFERENCE order. None means
+    send the body unencoded, which is also the fallback when the client
+    refuses both identity and every available coding.
+    """
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in available_encodings():
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    if best is None and weights.get('identity', weights.get('*', 1.0)) == 0:
+        # identity;q=0 rules out the plain body; use any coding the client hasn't refused,
+        # by name or through *;q=0 (in which case nothing is acceptable and identity it is)
+        best = next((encoding for encoding in available_encodings()
+                     if weights.get(encoding, weights.get('*')) != 0), None)
+    return best
+
+
+class CompressedBodyCache:
+    """
+    In-process LRU of compressed bodies keyed by (encoding, body digest),
+    bounded by compressed bytes.
+
+    A hot page rendered to the same bytes on every hit, whether recomputed
+    or served from the search cache or cache_page, is compressed once and
+    then costs one hash of the body. Also keeps bandwidth counters per
+    encoding for the metrics endpoint.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.counters = Counter()
+
+    def compress(self, encoding, body):
+        if not self.max_bytes:
+            return CODECS[encoding][1](body, level(encoding))
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        with self.lock:
+            compressed = self.entries.get(key)
+            if compressed is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return compressed
+            self.misses += 1
+
+        compressed = CODECS[encoding][1](body, level(encoding))
+        if len(compressed) <= self.max_bytes:
+            with self.lock:
+                if key not in self.entries:
+                    self.entries[key] = compressed
+                    self.bytes += len(compressed)
+                while self.bytes > self.max_bytes:
+                    self.bytes -= len(self.entries.popitem(last=False)[1])
+        return compressed
+
+    def record(self, encoding, size, compressed_size):
+        with self.lock:
+            self.counters[encoding, 'responses'] += 1
+            self.counters[encoding, 'bytes_in'] += size
+            self.counters[encoding, 'bytes_out'] += compressed_size
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            encodings = {}
+            for encoding in PREFERENCE:
+                bytes_in = self.counters[encoding, 'bytes_in']
+                if bytes_in:
+                    encodings[encoding] = {
+                        'responses': self.counters[encoding, 'responses'],
+                        'bytes_in': bytes_in,
+                        'bytes_out': self.counters[encoding, 'bytes_out'],
+                        'ratio': round(self.counters[encoding, 'bytes_out'] / bytes_in, 4),
+                    }
+            return {
+                'available': list(available_encodings()),
+                'encodings': encodings,
+                'cache': {
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                    'entries': len(self.entries),
+                    'bytes': self.bytes,
+                    'max_bytes': self.max_bytes,
+                },
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """The process-wide compressed body cache, sized by LISTINGS_COMPRESSION_CACHE_BYTES (0 disables it)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CompressedBodyCache(getattr(settings, 'LISTINGS_COMPRESSION_CACHE_BYTES', DEFAULT_CACHE_BYTES))
+    return _cache
+
+
+def reset_cache(cache=None):
+    global _cache
+    _cache = cache
+
+
+def compress_stream(encoding, chunks):
+    """Compress a streaming body incrementally; output is yielded as the compressor fills its blocks"""
+    stream = CODECS[encoding][2](level(encoding))
+    size = compressed_size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        data = stream.compress(chunk)
+        if data:
+            compressed_size += len(data)
+            yield data
+    data = stream.flush()
+    get_cache().record(encoding, size, compressed_size + len(data))
+    yield data
+
+
+def compressible(response):
+    if response.has_header('Content-Encoding'):
+        return False
+    content_type = response.get('Content-Type', '').split(';', 1)[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def set_encoding(response, encoding):
+    response['Content-Encoding'] = encoding
+    # The encoded body is a different representation; a strong ETag would claim byte equality
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+
+
+def compress_response(response, encoding):
+    if not compressible(response):
+        return
+    if response.streaming:
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if encoding:
+            response.streaming_content = compress_stream(encoding, response.streaming_content)
+            del response['Content-Length']
+            set_encoding(response, encoding)
+        return
+
+    body = response.content
+    if len(body) < getattr(settings, 'LISTINGS_COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE):
+        return
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if not encoding:
+        return
+    cache = get_cache()
+    compressed = cache.compress(encoding, body)
+    if len(compressed) >= len(body):
+        return
+    cache.record(encoding, len(body), len(compressed))
+    response.content = compressed
+    response['Content-Length'] = str(len(compressed))
+    set_encoding(response, encoding)
+
+
+def compressed(view):
+    """
+    Compress the response body with the best encoding the client accepts.
+
+    Offers zstd and brotli when their packages are installed and gzip
+    always. JSON and text bodies under LISTINGS_COMPRESSION_MIN_SIZE bytes
+    are left alone; streaming responses are compressed chunk by chunk.
+    DRF responses are compressed right after rendering, before any
+    response cache stores them, so cached pages are kept compressed.
+    """
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if hasattr(response, 'add_post_render_callback') and not response.is_rendered:
+            response.add_post_render_callback(lambda rendered: compress_response(rendered, encoding))
+        else:
+            compress_response(response, encoding)
+        return response
+    return wrapped
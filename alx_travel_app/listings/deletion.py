@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Listing, Booking, Review, ListingPurge
+from .signals import listing_soft_deleted
+from .sync import record_tombstones
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def soft_delete_listing(listing):
+    """
+    Hide a listing immediately and queue its purge.
+
+    Only the listing row is touched, so this returns in constant time
+    however many bookings and reviews the listing has. The listing leaves
+    every Listing.objects query at once and its tombstone is written now;
+    bookings and reviews are removed later by purge_listing_batch.
+    """
+    with transaction.atomic():
+        Listing.all_objects.filter(pk=listing.pk).update(is_deleted=True, updated_at=timezone.now())
+        record_tombstones('listing', [listing.pk])
+        purge, _ = ListingPurge.objects.get_or_create(listing_id=listing.pk)
+        transaction.on_commit(lambda: listing_soft_deleted.send(sender=Listing, listing=listing))
+    return purge
+
+
+def purge_listing_batch(purge, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Delete up to `batch_size` reviews or bookings of a purged listing.
+
+    Each call is its own short transaction. Reviews go first, so booking
+    deletes never cascade. The listing row is deleted once nothing
+    references it. Returns True when the purge is complete.
+    """
+    with transaction.atomic():
+        purge = ListingPurge.objects.select_for_update().get(pk=purge.pk)
+        if purge.status == 'completed':
+            return True
+        if purge.status == 'pending':
+            purge.status = 'running'
+            purge.bookings_total = Booking.objects.filter(listing_id=purge.listing_id).count()
+
+        reviews = Review.objects.filter(
+            Q(listing_id=purge.listing_id) | Q(booking__listing_id=purge.listing_id)
+        )
+        review_ids = list(reviews.values_list('review_id', flat=True)[:batch_size])
+        if review_ids:
+            Review.objects.filter(review_id__in=review_ids).delete()
+            purge.reviews_deleted += len(review_ids)
+            purge.save(update_fields=['status', 'bookings_total', 'reviews_deleted'])
+            return False
+
+        booking_ids = list(
+            Booking.objects.filter(listing_id=purge.listing_id).values_list('booking_id', flat=True)[:batch_size]
+        )
+        if booking_ids:
+            record_tombstones('booking', booking_ids)
+            Booking.objects.filter(booking_id__in=booking_ids).delete()
+            purge.bookings_deleted += len(booking_ids)
+            purge.save(update_fields=['status', 'bookings_total', 'bookings_deleted'])
+            return False
+
+        Listing.all_objects.filter(pk=purge.listing_id).delete()
+        purge.status = 'completed'
+        purge.finished_at = timezone.now()
+        purge.save(update_fields=['status', 'bookings_total', 'finished_at'])
+        return True
+
+
+def run_pending_purges(batch_size=DEFAULT_BATCH_SIZE, max_batches=None):
+    """Work through queued purges batch by batch; returns the number of batches run"""
+    batches = 0
+    for purge in ListingPurge.objects.exclude(status='completed'):
+        done = False
+        while not done:
+            if max_batches is not None and batches >= max_batches:
+                return batches
+            done = purge_listing_batch(purge, batch_size)
+            batches += 1
+    return batches
@@ -0,0 +1,78 @@
+"""
+Lazy stand-ins for drf_yasg's ``swagger_auto_schema`` and ``openapi``.
+
+Views declare their documentation with the usual drf_yasg syntax, but
+nothing from drf_yasg is imported until a schema is generated: annotations
+are recorded here and applied by ``apply_schemas()``. Processes that serve
+drf_yasg's own schema views directly should set ``LISTINGS_EAGER_DOCS = True``
+so annotations are applied as the views are defined.
+"""
+import threading
+
+from django.conf import settings
+
+_pending = []
+_lock = threading.Lock()
+
+
+class Deferred:
+    """An ``openapi`` attribute or call, resolved against drf_yasg.openapi when applied"""
+
+    def __init__(self, name, args=None, kwargs=None):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+
+    def __call__(self, *args, **kwargs):
+        return Deferred(self.name, args, kwargs)
+
+    def resolve(self, module):
+        value = getattr(module, self.name)
+        if self.args is None:
+            return value
+        return value(*resolve(self.args, module), **resolve(self.kwargs, module))
+
+
+class LazyOpenAPI:
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Deferred(name)
+
+
+openapi = LazyOpenAPI()
+
+
+def resolve(value, module):
+    if isinstance(value, Deferred):
+        return value.resolve(module)
+    if isinstance(value, (list, tuple)):
+        return type(value)(resolve(item, module) for item in value)
+    if isinstance(value, dict):
+        return {key: resolve(item, module) for key, item in value.items()}
+    return value
+
+
+def _apply(view, kwargs):
+    from drf_yasg import openapi as drf_openapi
+    from drf_yasg.utils import swagger_auto_schema as drf_swagger_auto_schema
+
+    return drf_swagger_auto_schema(**resolve(kwargs, drf_openapi))(view)
+
+
+def swagger_auto_schema(**kwargs):
+    """Record drf_yasg annotations for a view without importing drf_yasg"""
+    def decorator(view):
+        if getattr(settings, 'LISTINGS_EAGER_DOCS', False):
+            return _apply(view, kwargs)
+        with _lock:
+            _pending.append((view, kwargs))
+        return view
+    return decorator
+
+
+def apply_schemas():
+    """Attach every recorded annotation to its view; safe to call repeatedly"""
+    with _lock:
+        while _pending:
+            _apply(*_pending.pop(0))
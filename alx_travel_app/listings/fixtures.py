@@ -0,0 +1,285 @@
+"""
+Columnar binary snapshots of the users, listings, bookings and reviews tables.
+
+A snapshot file is a sequence of chunks followed by a JSON manifest:
+
+    MAGIC | chunk | chunk | ... | manifest JSON | manifest offset (u64) | MAGIC
+
+Each chunk holds up to `chunk_size` rows of one table, stored column by
+column: fixed-width arrays for numbers, dates (days since 0001-01-01),
+datetimes (microseconds since the epoch, UTC), decimals (scaled integers)
+and UUIDs (16 bytes), and offsets plus one UTF-8 blob for strings, or
+one-byte codes into a per-chunk dictionary when a string column has few
+distinct values. Nullable columns carry a one-byte-per-row null mask.
+Writing streams chunk by chunk; reading memory-maps the file and decodes
+columns from typed views over it.
+"""
+import json
+import mmap
+import struct
+import uuid
+from array import array
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from .models import Listing, Booking, Review
+
+MAGIC = b'LSTCOL01'
+# Parents first, so loading never references a missing row
+MODELS = (User, Listing, Booking, Review)
+DEFAULT_CHUNK_SIZE = 50_000
+DEFAULT_BATCH_SIZE = 5_000
+# String columns with at most this many distinct values per chunk are dictionary-coded
+MAX_DICTIONARY = 255
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+NUMBER_TYPES = {
+    'AutoField': 'int', 'BigAutoField': 'int', 'IntegerField': 'int', 'BigIntegerField': 'int',
+    'PositiveIntegerField': 'int', 'PositiveSmallIntegerField': 'int', 'SmallIntegerField': 'int',
+    'FloatField': 'float', 'BooleanField': 'bool', 'UUIDField': 'uuid', 'DateField': 'date',
+    'DateTimeField': 'datetime', 'DecimalField': 'decimal', 'CharField': 'str', 'TextField': 'str',
+    'EmailField': 'str',
+}
+CHUNK_HEADER = struct.Struct('<II')
+COLUMN_HEADER = struct.Struct('<BBQ')
+DICTIONARY_HEADER = struct.Struct('<QQ')
+# Column encodings
+PLAIN, DICTIONARY = 0, 1
+
+
+def column_type(field):
+    target = field.target_field if field.is_relation else field
+    kind = NUMBER_TYPES[target.get_internal_type()]
+    if kind == 'decimal':
+        return f'decimal:{target.decimal_places}'
+    return kind
+
+
+def table_columns(model):
+    return [(field.attname, column_type(field)) for field in model._meta.concrete_fields]
+
+
+### ENCODING ###
+
+def encode_strings(values):
+    offsets, blob = array('q', [0]), bytearray()
+    for value in values:
+        blob += value.encode()
+        offsets.append(len(blob))
+    return offsets.tobytes() + bytes(blob)
+
+
+def encode_column(kind, values):
+    """Return (encoding, payload) for one column of a chunk; nulls are already replaced"""
+    if kind == 'int':
+        return PLAIN, array('q', values).tobytes()
+    if kind == 'float':
+        return PLAIN, array('d', values).tobytes()
+    if kind == 'bool':
+        return PLAIN, bytes(values)
+    if kind == 'uuid':
+        return PLAIN, b''.join(value.bytes for value in values)
+    if kind == 'date':
+        return PLAIN, array('i', [value.toordinal() for value in values]).tobytes()
+    if kind == 'datetime':
+        return PLAIN, array('q', [(value - EPOCH) // timedelta(microseconds=1) for value in values]).tobytes()
+    if kind.startswith('decimal:'):
+        places = int(kind.split(':')[1])
+        return PLAIN, array('q', [int(value.scaleb(places)) for value in values]).tobytes()
+    distinct = list(dict.fromkeys(values))
+    if len(distinct) <= MAX_DICTIONARY and len(distinct) * 4 < len(values):
+        codes = {value: code for code, value in enumerate(distinct)}
+        dictionary = encode_strings(distinct)
+        header = DICTIONARY_HEADER.pack(len(distinct), len(dictionary))
+        return DICTIONARY, header + dictionary + bytes(codes[value] for value in values)
+    return PLAIN, encode_strings(values)
+
+
+NULL_PLACEHOLDERS = {
+    'int': 0, 'float': 0.0, 'bool': False, 'uuid': uuid.UUID(int=0), 'date': date.min,
+    'datetime': EPOCH, 'str': '',
+}
+
+
+def write_snapshot(path, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Stream every table in MODELS to `path`; returns the row count per table"""
+    manifest = {'tables': [], 'chunks': []}
+    counts = {}
+    with open(path, 'wb') as handle:
+        handle.write(MAGIC)
+        for table_index, model in enumerate(MODELS):
+            columns = table_columns(model)
+            manifest['tables'].append({'model': model._meta.label, 'columns': columns})
+            rows = model._base_manager.order_by('pk').values_list(*[name for name, _ in columns])
+            counts[model._meta.label] = 0
+            chunk = []
+            for row in rows.iterator(chunk_size=chunk_size):
+                chunk.append(row)
+                if len(chunk) == chunk_size:
+                    manifest['chunks'].append(write_chunk(handle, table_index, columns, chunk))
+                    counts[model._meta.label] += len(chunk)
+                    chunk = []
+                    if progress:
+                        progress(model, counts[model._meta.label])
+            if chunk:
+                manifest['chunks'].append(write_chunk(handle, table_index, columns, chunk))
+                counts[model._meta.label] += len(chunk)
+        offset = handle.tell()
+        handle.write(json.dumps(manifest).encode())
+        handle.write(struct.pack('<Q', offset) + MAGIC)
+    return counts
+
+
+def write_chunk(handle, table_index, columns, rows):
+    offset = handle.tell()
+    handle.write(CHUNK_HEADER.pack(table_index, len(rows)))
+    for index, (name, kind) in enumerate(columns):
+        values = [row[index] for row in rows]
+        mask = b''
+        if any(value is None for value in values):
+            mask = bytes(value is None for value in values)
+            placeholder = NULL_PLACEHOLDERS.get(kind, Decimal(0))
+            values = [placeholder if value is None else value for value in values]
+        encoding, payload = encode_column(kind, values)
+        handle.write(COLUMN_HEADER.pack(encoding, bool(mask), len(payload)))
+        handle.write(mask)
+        handle.write(payload)
+    return offset
+
+
+### DECODING ###
+
+def decode_strings(view, count):
+    offsets = view[:(count + 1) * 8].cast('q')
+    blob = view[(count + 1) * 8:]
+    return [str(blob[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(count)]
+
+
+def decode_column(kind, encoding, view, count):
+    if kind == 'int':
+        return view.cast('q').tolist()
+    if kind == 'float':
+        return view.cast('d').tolist()
+    if kind == 'bool':
+        return [bool(value) for value in view]
+    if kind == 'uuid':
+        return [uuid.UUID(bytes=bytes(view[i:i + 16])) for i in range(0, count * 16, 16)]
+    if kind == 'date':
+        return [date.fromordinal(value) for value in view.cast('i')]
+    if kind == 'datetime':
+        return [EPOCH + timedelta(microseconds=value) for value in view.cast('q')]
+    if kind.startswith('decimal:'):
+        places = -int(kind.split(':')[1])
+        return [Decimal(value).scaleb(places) for value in view.cast('q')]
+    if encoding == DICTIONARY:
+        entries, size = DICTIONARY_HEADER.unpack_from(view)
+        start = DICTIONARY_HEADER.size
+        dictionary = decode_strings(view[start:start + size], entries)
+        return [dictionary[code] for code in view[start + size:]]
+    return decode_strings(view, count)
+
+
+def read_snapshot(path):
+    """
+    Yield (model, attnames, rows) per chunk of a snapshot, decoding columns
+    from a memory map of the file. `rows` is a list of tuples.
+    """
+    with open(path, 'rb') as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            if bytes(view[:len(MAGIC)]) != MAGIC or bytes(view[-len(MAGIC):]) != MAGIC:
+                raise ValueError(f'{path} is not a listings snapshot')
+            offset, = struct.unpack_from('<Q', view, len(view) - len(MAGIC) - 8)
+            manifest = json.loads(bytes(view[offset:len(view) - len(MAGIC) - 8]))
+            models = {model._meta.label: model for model in MODELS}
+            tables = [(models[table['model']], table['columns']) for table in manifest['tables']]
+
+            for position in manifest['chunks']:
+                table_index, count = CHUNK_HEADER.unpack_from(view, position)
+                position += CHUNK_HEADER.size
+                model, columns = tables[table_index]
+                decoded = []
+                for _, kind in columns:
+                    encoding, has_mask, size = COLUMN_HEADER.unpack_from(view, position)
+                    position += COLUMN_HEADER.size
+                    mask = view[position:position + count] if has_mask else None
+                    position += count if has_mask else 0
+                    values = decode_column(kind, encoding, view[position:position + size], count)
+                    position += size
+                    if mask is not None:
+                        values = [None if null else value for null, value in zip(mask, values)]
+                    decoded.append(values)
+                yield model, [name for name, _ in columns], list(zip(*decoded))
+        finally:
+            view.release()
+
+
+### LOADING ###
+
+# Fields whose Python values the database adapters accept unchanged
+PASSTHROUGH_TYPES = {'int', 'float', 'bool', 'str'}
+
+
+def clear_tables():
+    """
+    Empty the snapshot's tables and the tables referencing them with the
+    backend's flush statements (TRUNCATE or DELETE), without collecting
+    rows or sending signals.
+    """
+    tables = [model._meta.db_table for model in MODELS]
+    connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables, allow_cascade=True))
+
+
+def load_snapshot(path, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Insert every row of a snapshot with batched multi-row INSERTs, in one
+    transaction.
+
+    Rows go in as stored, bypassing model save(), signals and auto_now, so
+    timestamps are preserved. Primary key sequences are reset afterwards,
+    as loaddata does. Tables are expected to be empty. Returns the row
+    count per table.
+    """
+    counts = {}
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model, names, rows in read_snapshot(path):
+            by_attname = {field.attname: field for field in model._meta.concrete_fields}
+            fields = [by_attname[name] for name in names]
+            converters = [
+                None if column_type(field) in PASSTHROUGH_TYPES
+                else (lambda value, field=field: field.get_db_prep_save(value, connection))
+                for field in fields
+            ]
+            if any(converters):
+                rows = [
+                    tuple(value if convert is None or value is None else convert(value)
+                          for value, convert in zip(row, converters))
+                    for row in rows
+                ]
+            table = quote(model._meta.db_table)
+            column_list = ', '.join(quote(field.column) for field in fields)
+            placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+            # Stay under the backend's bound-parameter limit
+            max_rows = batch_size
+            if connection.features.max_query_params:
+                max_rows = max(1, min(batch_size, connection.features.max_query_params // len(fields)))
+
+            for start in range(0, len(rows), max_rows):
+                batch = rows[start:start + max_rows]
+                cursor.execute(
+                    f'INSERT INTO {table} ({column_list}) VALUES ' + ', '.join([placeholders] * len(batch)),
+                    [value for row in batch for value in row]
+                )
+            counts[model._meta.label] = counts.get(model._meta.label, 0) + len(rows)
+            if progress:
+                progress(model, counts[model._meta.label])
+
+        # Rows kept their primary keys; move sequences past them so new rows don't collide
+        for statement in connection.ops.sequence_reset_sql(no_style(), MODELS):
+            cursor.execute(statement)
+    return counts
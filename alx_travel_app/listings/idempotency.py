@@ -0,0 +1,94 @@
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+
+def _client_scope(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f'ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+def _request_hash(request):
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    # The query string changes what a POST does (e.g. ?expand=), so it is part of the request
+    digest.update(request.get_full_path().encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def idempotent(view):
+    """
+    Replay the stored response for POSTs repeating an Idempotency-Key header.
+
+    The first request with a key reserves it, runs the view and stores the
+    status and body. Retries are answered from that row in one lookup
+    without running the view again. Keys are scoped per user (or client IP)
+    and expire after LISTINGS_IDEMPOTENCY_TTL seconds. 5xx responses are
+    not stored, so the client can retry them.
+    """
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        header = request.META.get(HEADER)
+        if request.method != 'POST' or not header:
+            return view(request, *args, **kwargs)
+
+        key = hashlib.sha256(f'{_client_scope(request)}:{header}'.encode()).hexdigest()
+        request_hash = _request_hash(request)
+        now = timezone.now()
+
+        record = IdempotencyKey.objects.filter(key=key, expires_at__gt=now).first()
+        if record is None:
+            ttl = getattr(settings, 'LISTINGS_IDEMPOTENCY_TTL', 24 * 60 * 60)
+            try:
+                with transaction.atomic():
+                    # Clear an expired row for this key before reserving it again
+                    IdempotencyKey.objects.filter(key=key, expires_at__lte=now).delete()
+                    IdempotencyKey.objects.create(
+                        key=key, request_hash=request_hash,
+                        expires_at=now + timedelta(seconds=ttl)
+                    )
+            except IntegrityError:
+                # A concurrent request reserved the key first
+                record = IdempotencyKey.objects.filter(key=key).first()
+
+        if record is not None:
+            if record.request_hash != request_hash:
+                return Response(
+                    {"error": "Idempotency-Key was already used for a different request"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record.status_code is None:
+                return Response(
+                    {"error": "A request with this Idempotency-Key is still in progress"},
+                    status=status.HTTP_409_CONFLICT
+                )
+            response = Response(record.response_body, status=record.status_code)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            IdempotencyKey.objects.filter(key=key).delete()
+            raise
+        if response.status_code >= 500:
+            IdempotencyKey.objects.filter(key=key).delete()
+        else:
+            IdempotencyKey.objects.filter(key=key).update(
+                status_code=response.status_code, response_body=response.data
+            )
+        return response
+    return wrapped
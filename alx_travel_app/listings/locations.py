@@ -0,0 +1,147 @@
+import bisect
+import heapq
+import re
+import sys
+import threading
+
+from django.db.models import Count
+
+from .models import Listing
+
+# Word boundaries where a typed prefix may also start matching
+WORD_START = re.compile(r'(?<=[\s,\-/])\S')
+
+# Results for prefixes matching more keys than this are memoized, so short
+# prefixes like "n" don't rescan a large slice on every keystroke
+CACHE_MIN_MATCHES = 1000
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+class LocationIndex:
+    """
+    In-memory prefix index of distinct listing locations with listing counts.
+
+    Every word start of a normalized location ("new york, ny", "york, ny",
+    "ny") is a key in one sorted list, so a prefix lookup is two bisects
+    plus a top-N pick over the matching slice, with no database access.
+    """
+
+    def __init__(self, counts=None):
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.keys = []
+        self.cache = {}
+        for location, count in (counts or {}).items():
+            self.counts[location] = count
+            self.keys.extend(self.keys_for(location))
+        self.keys.sort()
+
+    @classmethod
+    def build(cls):
+        """Build the index from one aggregate query over visible listings"""
+        rows = Listing.objects.order_by().values('location').annotate(listings=Count('listing_id'))
+        return cls({row['location']: row['listings'] for row in rows})
+
+    @staticmethod
+    def keys_for(location):
+        text = normalize(location)
+        starts = [0] + [match.start() for match in WORD_START.finditer(text)]
+        return [(text[start:], location) for start in starts]
+
+    def adjust(self, location, delta):
+        """Change a location's listing count, adding or dropping its keys as needed"""
+        with self.lock:
+            count = self.counts.get(location, 0) + delta
+            self._patch_cache(location, count)
+            if count > 0:
+                if location not in self.counts:
+                    for key in self.keys_for(location):
+                        bisect.insort(self.keys, key)
+                self.counts[location] = count
+            elif location in self.counts:
+                del self.counts[location]
+                for key in self.keys_for(location):
+                    position = bisect.bisect_left(self.keys, key)
+                    if position < len(self.keys) and self.keys[position] == key:
+                        del self.keys[position]
+
+    def _patch_cache(self, location, count):
+        """Update memoized results that `location` matches to its new count"""
+        keys = [key for key, _ in self.keys_for(location)]
+        for cache_key, results in list(self.cache.items()):
+            prefix, limit = cache_key
+            if not any(key.startswith(prefix) for key in keys):
+                continue
+            current = dict(results)
+            qualifies = (
+                location in current or len(results) < limit
+                or (count, location) > (results[-1][1], results[-1][0])
+            )
+            if count >= current.get(location, 0) and qualifies:
+                current[location] = count
+                self.cache[cache_key] = heapq.nlargest(limit, current.items(), key=lambda item: (item[1], item[0]))
+            elif location in current:
+                # It shrank or left; the next best may be outside the memo
+                del self.cache[cache_key]
+
+    def search(self, prefix, limit=10):
+        """Up to `limit` (location, count) pairs matching `prefix`, most listings first"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self.lock:
+            cached = self.cache.get((prefix, limit))
+            if cached is not None:
+                return cached
+            start = bisect.bisect_left(self.keys, (prefix,))
+            end = bisect.bisect_left(self.keys, (prefix + '\U0010ffff',), start)
+            matches = {location for _, location in self.keys[start:end]}
+            results = heapq.nlargest(limit, ((location, self.counts[location]) for location in matches),
+                                     key=lambda item: (item[1], item[0]))
+            if end - start > CACHE_MIN_MATCHES:
+                self.cache[(prefix, limit)] = results
+            return results
+
+    def memory_bytes(self):
+        """Approximate memory held by the key list and count table"""
+        total = sys.getsizeof(self.keys) + sys.getsizeof(self.counts)
+        for key, location in self.keys:
+            total += sys.getsizeof((key, location)) + sys.getsizeof(key)
+        total += sum(sys.getsizeof(location) for location in self.counts)
+        return total
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The process-wide index, built on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LocationIndex.build()
+    return _index
+
+
+def is_built():
+    return _index is not None
+
+
+def reset_index(index=None):
+    global _index
+    _index = index
+
+
+def location_changed(old_location, new_location):
+    """Move one listing between locations in a built index; either side may be None"""
+    if _index is None or old_location == new_location:
+        return
+    if old_location is not None:
+        _index.adjust(old_location, -1)
+    if new_location is not None:
+        _index.adjust(new_location, 1)
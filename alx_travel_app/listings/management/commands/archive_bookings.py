@@ -0,0 +1,109 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from listings.archive import (
+    DEFAULT_BATCH_SIZE, DEFAULT_RETENTION_DAYS, archive_bookings, archive_cutoff, archivable_bookings
+)
+from listings.models import Booking, Listing
+from datetime import timedelta
+import time
+
+class Command(BaseCommand):
+    help = 'Move old completed and canceled bookings into the bookings_archive table'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=DEFAULT_RETENTION_DAYS,
+            help=f'Archive bookings that checked out more than this many days ago (default: {DEFAULT_RETENTION_DAYS})'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Bookings moved per transaction (default: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help='Seconds to sleep between batches (default: 0)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Scheduled mode: keep running and archive every --interval seconds'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=3600.0,
+            help='Seconds between runs with --loop (default: 3600)'
+        )
+        parser.add_argument(
+            '--benchmark',
+            action='store_true',
+            help='Time typical hot-table queries before and after archiving'
+        )
+    
+    def handle(self, *args, **options):
+        while True:
+            cutoff = archive_cutoff(options['days'])
+            if options['benchmark']:
+                self.stdout.write(f'Eligible bookings: {archivable_bookings(cutoff).count()} of {Booking.objects.count()}')
+                before = self.benchmark()
+            
+            start = time.perf_counter()
+            moved = archive_bookings(cutoff, options['batch_size'], pause=options['pause'])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Archived {moved} bookings checked out before {cutoff} in {time.perf_counter() - start:.2f}s'
+                )
+            )
+            
+            if options['benchmark']:
+                after = self.benchmark()
+                self.stdout.write(f'{"query":<24}{"before ms":>12}{"after ms":>12}{"speedup":>10}')
+                for name in before:
+                    speedup = before[name] / after[name] if after[name] else float('inf')
+                    self.stdout.write(
+                        f'{name:<24}{before[name] * 1000:>12.2f}{after[name] * 1000:>12.2f}{speedup:>9.1f}x'
+                    )
+            
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+    
+    def benchmark(self, repeat=20):
+        """Average seconds per run of queries that scan the hot bookings table"""
+        listing_ids = list(
+            Listing.objects.annotate(n=Count('bookings')).order_by('-n').values_list('listing_id', flat=True)[:10]
+        )
+        guest_ids = list(
+            Booking.objects.values('guest').annotate(n=Count('booking_id')).order_by('-n').values_list('guest', flat=True)[:10]
+        )
+        start_date = archive_cutoff(0)
+        end_date = start_date + timedelta(days=30)
+        queries = {
+            'count': lambda: Booking.objects.count(),
+            'recent page': lambda: list(Booking.objects.order_by('-created_at')[:50]),
+            'availability': lambda: [
+                Booking.objects.filter(
+                    listing_id=listing_id, check_in_date__lt=end_date, check_out_date__gt=start_date
+                ).exclude(status='canceled').exists()
+                for listing_id in listing_ids
+            ],
+            'listing bookings': lambda: [
+                list(Booking.objects.filter(listing_id=listing_id)) for listing_id in listing_ids
+            ],
+            'guest bookings': lambda: [
+                list(Booking.objects.filter(guest_id=guest_id)) for guest_id in guest_ids
+            ],
+        }
+        timings = {}
+        for name, query in queries.items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                query()
+            timings[name] = (time.perf_counter() - start) / repeat
+        return timings
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from listings.compression import CODECS, CompressedBodyCache, available_encodings
+from listings.models import Listing, Booking
+from listings.serializers import ListingSerializer, BookingSerializer
+import time
+
+# Levels compared per encoding: fastest, the default, and the densest practical
+LEVELS = {'gzip': (1, 6, 9), 'br': (1, 4, 11), 'zstd': (1, 3, 19)}
+
+class Command(BaseCommand):
+    help = 'Benchmark response size and compression CPU cost per encoding and level on rendered listing and booking pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=100,
+            help='Listings or bookings per rendered page (default: 100)'
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=20,
+            help='Timed compressions per page, encoding and level (default: 20)'
+        )
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        listings = ListingSerializer().optimize_queryset(Listing.objects.all())[:page_size]
+        bookings = BookingSerializer().optimize_queryset(Booking.objects.all())[:page_size]
+        pages = [
+            (f'{len(listings)} listings', JSONRenderer().render(ListingSerializer(listings, many=True).data)),
+            (f'{len(bookings)} bookings', JSONRenderer().render(BookingSerializer(bookings, many=True).data)),
+        ]
+
+        self.stdout.write(f'Available encodings: {", ".join(available_encodings())}')
+        self.stdout.write('')
+        self.stdout.write(
+            f'{"page":<16}{"encoding":<10}{"level":>6}{"bytes":>10}{"ratio":>8}'
+            f'{"ms":>9}{"MB/s":>9}{"cached ms":>11}'
+        )
+        for label, body in pages:
+            self.stdout.write(f'{label:<16}{"identity":<10}{"":>6}{len(body):>10}{1:>8.3f}')
+            for encoding in available_encodings():
+                for level in LEVELS[encoding]:
+                    size, seconds = self.time_compress(encoding, level, body, options['rounds'])
+                    self.stdout.write(
+                        f'{label:<16}{encoding:<10}{level:>6}{size:>10}{size / len(body):>8.3f}'
+                        f'{seconds * 1000:>9.3f}{len(body) / seconds / 1e6:>9.1f}'
+                        f'{self.time_cached(encoding, body, options["rounds"]) * 1000:>11.3f}'
+                    )
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            '"ms" is one compression of the page; "cached ms" is a hit in the compressed body cache at the default level'
+        ))
+
+    def time_compress(self, encoding, level, body, rounds):
+        """Return (compressed bytes, mean seconds per compression)"""
+        compress = CODECS[encoding][1]
+        start = time.perf_counter()
+        for _ in range(rounds):
+            compressed = compress(body, level)
+        return len(compressed), (time.perf_counter() - start) / rounds
+
+    def time_cached(self, encoding, body, rounds):
+        """Mean seconds to serve the page from a warm compressed body cache"""
+        cache = CompressedBodyCache()
+        cache.compress(encoding, body)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            cache.compress(encoding, body)
+        return (time.perf_counter() - start) / rounds
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from listings.uuids import uuid7
+import time
+import uuid
+
+class Command(BaseCommand):
+    help = 'Benchmark insert throughput and primary key index size for UUID4 vs time-ordered UUIDv7 keys'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=100000,
+            help='Number of rows to insert per key type (default: 100000)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows inserted per transaction (default: 5000)'
+        )
+    
+    def handle(self, *args, **options):
+        results = []
+        for label, factory in (('uuid4', uuid.uuid4), ('uuid7', uuid7)):
+            self.stdout.write(f'Inserting {options["rows"]} rows with {label} keys...')
+            results.append((label,) + self.run_benchmark(label, factory, options['rows'], options['batch_size']))
+        
+        self.stdout.write('')
+        self.stdout.write(f'{"key":<8}{"seconds":>10}{"rows/s":>12}{"index size":>14}')
+        for label, elapsed, rate, index_bytes in results:
+            size = f'{index_bytes / 1024:.0f} KiB' if index_bytes is not None else 'n/a'
+            self.stdout.write(f'{label:<8}{elapsed:>10.2f}{rate:>12.0f}{size:>14}')
+    
+    def run_benchmark(self, label, factory, rows, batch_size):
+        """Insert rows into a scratch table and return (seconds, rows/s, index bytes)"""
+        table = connection.ops.quote_name(f'pk_benchmark_{label}')
+        id_field = models.UUIDField()
+        column_type = connection.data_types['UUIDField']
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+            cursor.execute(f'CREATE TABLE {table} (id {column_type} PRIMARY KEY, payload integer NOT NULL)')
+        
+        try:
+            start = time.perf_counter()
+            for offset in range(0, rows, batch_size):
+                batch = [
+                    (id_field.get_db_prep_value(factory(), connection), n)
+                    for n in range(offset, min(offset + batch_size, rows))
+                ]
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.executemany(f'INSERT INTO {table} (id, payload) VALUES (%s, %s)', batch)
+            elapsed = time.perf_counter() - start
+            index_bytes = self.primary_key_index_size(f'pk_benchmark_{label}')
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {table}')
+        
+        return elapsed, rows / elapsed if elapsed else 0.0, index_bytes
+    
+    def primary_key_index_size(self, table):
+        """Size in bytes of the table's primary key index, or None if unsupported"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                try:
+                    cursor.execute(
+                        'SELECT SUM(pgsize) FROM dbstat WHERE name = %s',
+                        [f'sqlite_autoindex_{table}_1']
+                    )
+                except Exception:
+                    # SQLite built without the dbstat virtual table
+                    return None
+                return cursor.fetchone()[0]
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_relation_size(%s::regclass)', [f'{table}_pkey'])
+                return cursor.fetchone()[0]
+        return None
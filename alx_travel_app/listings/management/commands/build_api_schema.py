@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from listings import schema
+import time
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema artifact for the current code version'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate even if an artifact for this version already exists'
+        )
+    
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        path = schema.build_schema(force=options['force'])
+        seconds = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Schema version {schema.schema_version()} at {path} '
+                f'({path.stat().st_size / 1024:.0f} KiB, {seconds:.3f}s)'
+            )
+        )
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from listings.locations import LocationIndex
+import random
+import time
+
+class Command(BaseCommand):
+    help = 'Build the location autocomplete index and report build time, memory and lookup latency'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=1000,
+            help='Number of random prefix lookups to time (default: 1000)'
+        )
+    
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        index = LocationIndex.build()
+        build_seconds = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Indexed {len(index.counts)} locations ({len(index.keys)} keys) in {build_seconds:.3f}s, '
+                f'~{index.memory_bytes() / 1024:.0f} KiB'
+            )
+        )
+        
+        if index.keys and options['queries']:
+            latencies = []
+            for _ in range(options['queries']):
+                key = random.choice(index.keys)[0]
+                prefix = key[:random.randint(1, min(len(key), 6))]
+                start = time.perf_counter()
+                index.search(prefix)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000
+            self.stdout.write(f'Lookup latency over {len(latencies)} queries: p50 {p50:.3f}ms, p99 {p99:.3f}ms')
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from listings import similarity
+import random
+import time
+import uuid
+
+class Command(BaseCommand):
+    help = 'Build the similar-listings index and report build time, memory and query latency'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=1000,
+            help='Number of random similarity queries to time (default: 1000)'
+        )
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            default=0,
+            help='Benchmark an index of this many random listings instead of the database'
+        )
+    
+    def handle(self, *args, **options):
+        if not similarity.is_available():
+            raise CommandError('NumPy is required for the similarity index: pip install numpy')
+        
+        start = time.perf_counter()
+        if options['synthetic']:
+            index = self.build_synthetic(options['synthetic'])
+        else:
+            index = similarity.SimilarityIndex.build()
+        build_seconds = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Indexed {index.size} listings in {build_seconds:.2f}s, '
+                f'~{index.memory_bytes() / 1024 / 1024:.1f} MiB'
+            )
+        )
+        
+        if index.size > 1 and options['queries']:
+            latencies = []
+            for _ in range(options['queries']):
+                listing_id = index.ids[random.randrange(index.size)]
+                start = time.perf_counter()
+                index.similar(listing_id, 10)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000
+            self.stdout.write(f'Query latency over {len(latencies)} queries: p50 {p50:.2f}ms, p99 {p99:.2f}ms')
+    
+    def build_synthetic(self, count):
+        """Random listings spread over 500 locations, with no co-booking data"""
+        index = similarity.SimilarityIndex()
+        index.scale = index.scale * similarity.np.asarray(similarity.FEATURE_WEIGHTS, dtype='float32')
+        for n in range(count):
+            bedrooms = random.randint(1, 5)
+            index.upsert(
+                uuid.uuid4(), f'City {n % 500}', random.randint(30, 800),
+                bedrooms, random.randint(1, 3), bedrooms * 2, random.uniform(1, 5)
+            )
+        return index
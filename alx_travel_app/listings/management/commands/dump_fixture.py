@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from listings.fixtures import DEFAULT_CHUNK_SIZE, write_snapshot
+import os
+import time
+
+class Command(BaseCommand):
+    help = 'Snapshot users, listings, bookings and reviews into a columnar binary fixture'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to write')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f'Rows read and written per chunk (default: {DEFAULT_CHUNK_SIZE})'
+        )
+    
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = write_snapshot(options['path'], options['chunk_size'])
+        seconds = time.perf_counter() - start
+        rows = sum(counts.values())
+        self.stdout.write(', '.join(f'{label}: {count}' for label, count in counts.items()))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Wrote {rows} rows to {options["path"]} '
+                f'({os.path.getsize(options["path"]) / 1024 / 1024:.1f} MiB) in {seconds:.2f}s'
+            )
+        )
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from listings.fixtures import DEFAULT_BATCH_SIZE, clear_tables, load_snapshot
+from listings.models import Listing
+import time
+
+class Command(BaseCommand):
+    help = 'Restore a columnar binary fixture written by dump_fixture using bulk inserts'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fixture file to read')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Rows per INSERT statement (default: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Empty the users, listings, bookings and reviews tables (and tables referencing them) first'
+        )
+    
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write('Clearing existing data...')
+            clear_tables()
+        elif User.objects.exists() or Listing.all_objects.exists():
+            raise CommandError('Target tables are not empty; use --clear to replace their contents')
+        
+        start = time.perf_counter()
+        try:
+            counts = load_snapshot(options['path'], options['batch_size'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        seconds = time.perf_counter() - start
+        rows = sum(counts.values())
+        self.stdout.write(', '.join(f'{label}: {count}' for label, count in counts.items()))
+        self.stdout.write(
+            self.style.SUCCESS(f'Loaded {rows} rows in {seconds:.2f}s ({rows / max(seconds, 1e-9):.0f} rows/s)')
+        )
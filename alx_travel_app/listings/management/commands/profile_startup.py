@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# Runs in a fresh interpreter so nothing is already imported
+STARTUP_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from importlib import import_module
+import_module({urlconf!r})
+urls = time.perf_counter()
+from django.test import Client
+from django.test.utils import setup_test_environment
+setup_test_environment()
+status = Client().get({path!r}).status_code
+done = time.perf_counter()
+print('PHASES', setup - start, urls - setup, done - urls, status, file=sys.stderr)
+'''
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+class Command(BaseCommand):
+    help = 'Measure cold-start time and per-module import cost for the listings app'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default='/api/listings/?limit=1',
+            help='Path of the first request to time (default: /api/listings/?limit=1)'
+        )
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=5,
+            help='Number of fresh interpreters to average over (default: 5)'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=15,
+            help='Number of heaviest third-party imports to list (default: 15)'
+        )
+
+    def handle(self, *args, **options):
+        script = STARTUP_SCRIPT.format(urlconf=settings.ROOT_URLCONF, path=options['path'])
+        runs = [self.run_once(script) for _ in range(max(options['runs'], 1))]
+
+        phases, status = zip(*[(run[0], run[1]) for run in runs])
+        setup, urls, request = (statistics.median(values) * 1000 for values in zip(*phases))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Time to first request (median of {len(runs)}): {setup + urls + request:.1f}ms '
+                f'= django.setup {setup:.1f}ms + URLconf {urls:.1f}ms + first request {request:.1f}ms '
+                f'(status {status[0]})'
+            )
+        )
+
+        # Median self/cumulative microseconds per module across runs
+        modules = {}
+        for _, _, imports in runs:
+            for name, timings in imports.items():
+                modules.setdefault(name, []).append(timings)
+        costs = {
+            name: (
+                statistics.median(t[0] for t in timings),
+                statistics.median(t[1] for t in timings),
+                timings[0][2],
+            )
+            for name, timings in modules.items()
+        }
+
+        app = __name__.split('.')[0]
+        self.stdout.write(f'\n{app} modules (self / cumulative ms, cumulative includes what they import):')
+        for name, (own, cumulative, _) in sorted(costs.items(), key=lambda item: -item[1][1]):
+            if name == app or name.startswith(app + '.'):
+                self.stdout.write(f'  {name:<40} {own / 1000:8.2f} {cumulative / 1000:8.2f}')
+
+        self.stdout.write('\nHeaviest top-level imports (cumulative ms):')
+        top_level = [(name, cost) for name, cost in costs.items() if cost[2] == 0 and not name.startswith(app)]
+        for name, (_, cumulative, _) in sorted(top_level, key=lambda item: -item[1][1])[:options['top']]:
+            self.stdout.write(f'  {name:<40} {cumulative / 1000:8.2f}')
+
+    def run_once(self, script):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            env=os.environ.copy(), capture_output=True, text=True
+        )
+        if result.returncode:
+            raise CommandError(f'Startup script failed:\n{result.stderr[-2000:]}')
+
+        imports, phases, status = {}, None, None
+        for line in result.stderr.splitlines():
+            if line.startswith('PHASES'):
+                *phases, status = line.split()[1:]
+                phases = [float(value) for value in phases]
+                continue
+            match = IMPORT_LINE.match(line)
+            if match:
+                own, cumulative, indent, name = match.groups()
+                imports[name] = (int(own), int(cumulative), len(indent) // 2)
+        if phases is None:
+            raise CommandError('Startup script did not report its timings')
+        return phases, status, imports
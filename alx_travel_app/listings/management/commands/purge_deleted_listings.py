@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from listings.deletion import DEFAULT_BATCH_SIZE, run_pending_purges
+from listings.models import ListingPurge
+import time
+
+class Command(BaseCommand):
+    help = 'Purge bookings and reviews of soft-deleted listings in bounded batches'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Rows deleted per transaction (default: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and poll for new purges'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds between polls with --loop (default: 5)'
+        )
+    
+    def handle(self, *args, **options):
+        while True:
+            batches = run_pending_purges(options['batch_size'])
+            if batches:
+                self.stdout.write(self.style.SUCCESS(f'Ran {batches} purge batches'))
+            for purge in ListingPurge.objects.exclude(status='completed'):
+                self.stdout.write(
+                    f'{purge.listing_id}: {purge.bookings_deleted}/{purge.bookings_total} bookings, '
+                    f'{purge.reviews_deleted} reviews'
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,21 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from listings.models import Tombstone
+
+class Command(BaseCommand):
+    help = 'Delete tombstones older than the change feed retention window'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'LISTINGS_TOMBSTONE_RETENTION_DAYS', 30),
+            help='Retention window in days (default: LISTINGS_TOMBSTONE_RETENTION_DAYS or 30)'
+        )
+    
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstones older than {options["days"]} days'))
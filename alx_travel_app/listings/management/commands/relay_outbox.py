@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from listings.outbox import (
+    DEFAULT_BATCH_SIZE, FileSink, HttpSink, get_sink, purge_delivered, relay_batch, requeue_dead_letters
+)
+from datetime import timedelta
+import time
+
+class Command(BaseCommand):
+    help = 'Deliver queued booking events from the outbox table to the configured sink'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Events delivered per sink call (default: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--file',
+            help='Append events to this JSON lines file instead of LISTINGS_OUTBOX_SINK'
+        )
+        parser.add_argument(
+            '--url',
+            help='POST event batches to this URL instead of LISTINGS_OUTBOX_SINK'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, polling every --interval seconds when the outbox is drained'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds between polls with --loop (default: 1)'
+        )
+        parser.add_argument(
+            '--retain-days',
+            type=int,
+            default=7,
+            help='Delete delivered events older than this many days (default: 7)'
+        )
+        parser.add_argument(
+            '--requeue-dead',
+            action='store_true',
+            help='Retry dead-lettered events from scratch before relaying'
+        )
+    
+    def handle(self, *args, **options):
+        if options['file']:
+            sink = FileSink(options['file'])
+        elif options['url']:
+            sink = HttpSink(options['url'])
+        else:
+            sink = get_sink()
+        
+        if options['requeue_dead']:
+            self.stdout.write(f'Requeued {requeue_dead_letters()} dead-lettered events')
+        
+        while True:
+            start = time.perf_counter()
+            delivered = failed = 0
+            while True:
+                sent, errors = relay_batch(sink, options['batch_size'])
+                delivered += sent
+                failed += errors
+                # Stop once nothing is due; failures back off, so this always ends
+                if not sent and not errors:
+                    break
+            purged = purge_delivered(timezone.now() - timedelta(days=options['retain_days']))
+            
+            if delivered or failed or purged or not options['loop']:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'Delivered {delivered} events, {failed} failed attempts, '
+                        f'purged {purged} in {time.perf_counter() - start:.2f}s'
+                    )
+                )
+            
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
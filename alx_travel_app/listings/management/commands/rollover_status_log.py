@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from listings.status_log import DEFAULT_BATCH_SIZE, DEFAULT_RETENTION_DAYS, rollover, rollover_cutoff
+import time
+
+class Command(BaseCommand):
+    help = 'Move old booking status transitions from booking_status_log into booking_status_log_archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=DEFAULT_RETENTION_DAYS,
+            help=f'Keep this many days of transitions in the hot table (default: {DEFAULT_RETENTION_DAYS})'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Transitions moved per transaction (default: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Scheduled mode: keep running and roll over every --interval seconds'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=24 * 3600.0,
+            help='Seconds between runs with --loop (default: 86400)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            cutoff = rollover_cutoff(options['days'])
+            start = time.perf_counter()
+            moved = rollover(cutoff, options['batch_size'])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Rolled over {moved} transitions before {cutoff:%Y-%m-%d %H:%M} '
+                    f'in {time.perf_counter() - start:.2f}s'
+                )
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
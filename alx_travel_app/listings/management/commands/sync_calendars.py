@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from listings.calendars import DEFAULT_BATCH_SIZE, sync_feeds
+from listings.models import CalendarFeed, Listing
+import time
+
+class Command(BaseCommand):
+    help = 'Resync blocked dates from the external iCal feeds of listings'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--add',
+            nargs=2,
+            metavar=('LISTING_ID', 'URL'),
+            help='Register a feed (http(s) URL, file:// URL or local path) for a listing before syncing'
+        )
+        parser.add_argument(
+            '--listing',
+            help='Only sync the feeds of this listing'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Feeds fetched in parallel (default: 8)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Ranges upserted per statement (default: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Scheduled mode: keep running and resync every --interval seconds'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=900.0,
+            help='Seconds between runs with --loop (default: 900)'
+        )
+    
+    def handle(self, *args, **options):
+        if options['add']:
+            listing_id, url = options['add']
+            if not Listing.objects.filter(pk=listing_id).exists():
+                raise CommandError(f'Listing {listing_id} does not exist')
+            CalendarFeed.objects.get_or_create(listing_id=listing_id, url=url)
+        
+        while True:
+            feeds = CalendarFeed.objects.select_related('listing').filter(listing__is_deleted=False)
+            if options['listing']:
+                feeds = feeds.filter(listing_id=options['listing'])
+            
+            start = time.perf_counter()
+            stats = sync_feeds(feeds.iterator(), options['workers'], options['batch_size'])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Synced {stats["synced"]} feeds ({stats["ranges"]} blocked ranges), '
+                    f'{stats["unchanged"]} unchanged, {stats["failed"]} failed '
+                    f'in {time.perf_counter() - start:.2f}s'
+                )
+            )
+            
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -1,11 +1,17 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
-import uuid
+from .uuids import generate_id
+
+class ListingManager(models.Manager):
+    """Default manager that hides listings pending deletion"""
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
 
 class Listing(models.Model):
     """Model representing a property listing"""
-    listing_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    listing_id = models.UUIDField(primary_key=True, default=generate_id, editable=False)
     host = models.ForeignKey(User, on_delete=models.CASCADE, related_name='listings')
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -25,9 +31,20 @@ class Listing(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Set when a delete is accepted; the row and its bookings and reviews
+    # are purged in the background (see listings.deletion)
+    is_deleted = models.BooleanField(default=False)
+    
+    objects = ListingManager()
+    all_objects = models.Manager()
+    
     class Meta:
         db_table = 'listings'
         ordering = ['-created_at']
+        indexes = [
+            # Change feed keyset
+            models.Index(fields=['updated_at', 'listing_id'], name='listing_updated_pk'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.location}"
@@ -49,7 +66,7 @@ class Booking(models.Model):
         ('completed', 'Completed'),
     ]
     
-    booking_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    booking_id = models.UUIDField(primary_key=True, default=generate_id, editable=False)
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='bookings')
     guest = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
     
@@ -67,15 +84,21 @@ class Booking(models.Model):
     class Meta:
         db_table = 'bookings'
         ordering = ['-created_at']
+        indexes = [
+            # Guest booking history: filter by guest/status, keyset on check-in date
+            models.Index(fields=['guest', 'status', 'check_in_date'], name='booking_guest_status_checkin'),
+            # Change feed keyset
+            models.Index(fields=['updated_at', 'booking_id'], name='booking_updated_pk'),
+            # Archival scan for old completed/canceled bookings
+            models.Index(fields=['status', 'check_out_date'], name='booking_status_checkout'),
+        ]
         constraints = [
             models.CheckConstraint(
                 check=models.Q(check_out_date__gt=models.F('check_in_date')),
                 name='check_out_after_check_in'
             ),
-            models.CheckConstraint(
-                check=models.Q(number_of_guests__lte=models.F('listing__max_guests')),
-                name='guests_within_limit'
-            )
+            # Guest capacity spans a join, which check constraints cannot
+            # reference; it is enforced by services.validate_booking instead
         ]
     
     def __str__(self):
@@ -96,7 +119,7 @@ class Booking(models.Model):
 
 class Review(models.Model):
     """Model representing a review"""
-    review_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    review_id = models.UUIDField(primary_key=True, default=generate_id, editable=False)
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='reviews')
     guest = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews')
     booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name='review', null=True, blank=True)
@@ -116,3 +139,251 @@ class Review(models.Model):
     
     def __str__(self):
         return f"Review by {self.guest.username} for {self.listing.title} - {self.rating}/5"
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a POST made with an Idempotency-Key header"""
+    # sha256 of the client scope and the header value
+    key = models.CharField(max_length=64, primary_key=True)
+    request_hash = models.CharField(max_length=64)
+    # Null while the original request is still being processed
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        db_table = 'idempotency_keys'
+    
+    def __str__(self):
+        return f"Idempotency key {self.key} ({self.status_code or 'in progress'})"
+
+class Tombstone(models.Model):
+    """Marker for a deleted listing or booking, served by the change feeds"""
+    MODEL_CHOICES = [
+        ('listing', 'Listing'),
+        ('booking', 'Booking'),
+    ]
+    
+    # Monotonic sequence clients use as their deletion watermark
+    sequence = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.UUIDField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        db_table = 'tombstones'
+        indexes = [
+            models.Index(fields=['model', 'sequence'], name='tombstone_model_sequence'),
+        ]
+    
+    def __str__(self):
+        return f"Deleted {self.model} {self.object_id}"
+
+class ListingPurge(models.Model):
+    """Progress of the background purge of a soft-deleted listing"""
+    PURGE_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+    ]
+    
+    purge_id = models.UUIDField(primary_key=True, default=generate_id, editable=False)
+    # Plain UUID rather than a foreign key: the listing row is deleted last
+    listing_id = models.UUIDField(unique=True)
+    status = models.CharField(max_length=20, choices=PURGE_STATUS_CHOICES, default='pending', db_index=True)
+    
+    # Progress
+    bookings_total = models.PositiveIntegerField(null=True)
+    bookings_deleted = models.PositiveIntegerField(default=0)
+    reviews_deleted = models.PositiveIntegerField(default=0)
+    
+    # Timestamps
+    requested_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'listing_purges'
+        ordering = ['requested_at']
+    
+    def __str__(self):
+        return f"Purge of listing {self.listing_id} ({self.status})"
+
+class ArchivedBooking(models.Model):
+    """Completed or canceled booking moved out of the hot bookings table"""
+    booking_id = models.UUIDField(primary_key=True, editable=False)
+    # Plain ids: archived rows outlive purged listings and are never joined
+    listing_id = models.UUIDField()
+    guest_id = models.IntegerField()
+    review_id = models.UUIDField(null=True, blank=True)
+    
+    # Booking details
+    check_in_date = models.DateField()
+    check_out_date = models.DateField()
+    number_of_guests = models.PositiveIntegerField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Booking.BOOKING_STATUS_CHOICES)
+    
+    # Timestamps
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'bookings_archive'
+        ordering = ['-check_in_date']
+        indexes = [
+            models.Index(fields=['guest_id', 'check_in_date'], name='archive_guest_checkin'),
+            models.Index(fields=['listing_id', 'check_in_date'], name='archive_listing_checkin'),
+        ]
+    
+    def __str__(self):
+        return f"Archived booking {self.booking_id}"
+
+class ListingViewStats(models.Model):
+    """Detail-page views per listing, flushed in batches from in-process counters"""
+    listing_id = models.UUIDField(primary_key=True)
+    total_views = models.BigIntegerField(default=0)
+    # Log of the forward-decayed view weight (see listings.popularity); it only
+    # grows, so ordering by it ranks trending listings without rescoring rows
+    trend_score = models.FloatField(db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'listing_view_stats'
+    
+    def __str__(self):
+        return f"{self.total_views} views of listing {self.listing_id}"
+
+class OutboxEvent(models.Model):
+    """Booking change written with the booking itself, delivered downstream by the outbox relay"""
+    EVENT_TYPE_CHOICES = [
+        ('booking.created', 'Booking created'),
+        ('booking.status_changed', 'Booking status changed'),
+        ('booking.canceled', 'Booking canceled'),
+    ]
+    
+    # Delivery order; events for one booking are relayed in this order
+    sequence = models.BigAutoField(primary_key=True)
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPE_CHOICES)
+    # Plain id rather than a foreign key: the event outlives a deleted booking
+    booking_id = models.UUIDField()
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    # Delivery state
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    # Set when the relay gives up after LISTINGS_OUTBOX_MAX_ATTEMPTS failures
+    dead_lettered_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'booking_outbox'
+        indexes = [
+            # Relay scan: undelivered events in sequence order
+            models.Index(fields=['delivered_at', 'sequence'], name='outbox_pending_sequence'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} for booking {self.booking_id}"
+
+class CalendarFeed(models.Model):
+    """External iCal feed whose events block dates on a listing"""
+    feed_id = models.UUIDField(primary_key=True, default=generate_id, editable=False)
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='calendar_feeds')
+    # http(s) URL, file:// URL or local path
+    url = models.CharField(max_length=500)
+    
+    # Validators from the last fetch, so unchanged feeds are skipped
+    etag = models.CharField(max_length=200, blank=True)
+    last_modified = models.CharField(max_length=100, blank=True)
+    
+    # Sync state
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'calendar_feeds'
+        unique_together = ['listing', 'url']
+    
+    def __str__(self):
+        return f"Calendar feed {self.url} for listing {self.listing_id}"
+
+class BlockedDateRange(models.Model):
+    """Nights [start_date, end_date) blocked on a listing by an imported calendar event"""
+    feed = models.ForeignKey(CalendarFeed, on_delete=models.CASCADE, related_name='blocked_ranges')
+    # Copied from the feed so availability checks don't join through it
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='blocked_ranges')
+    uid = models.CharField(max_length=255)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    # Sync run that last saw the event; older rows are gone from the feed
+    synced_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'blocked_date_ranges'
+        constraints = [
+            models.UniqueConstraint(fields=['feed', 'uid'], name='blocked_range_feed_uid'),
+        ]
+        indexes = [
+            # Overlap checks: listing, then ranges ending after a start date
+            models.Index(fields=['listing', 'end_date'], name='blocked_range_listing_end'),
+        ]
+    
+    def __str__(self):
+        return f"Listing {self.listing_id} blocked {self.start_date} to {self.end_date}"
+
+class BookingStatusTransition(models.Model):
+    """Append-only log of booking status changes, one narrow row per change"""
+    # Compact codes for Booking.status; 0 is the "from" side of a booking's first row
+    STATUS_CODE_CHOICES = [
+        (0, 'None'),
+        (1, 'Pending'),
+        (2, 'Confirmed'),
+        (3, 'Canceled'),
+        (4, 'Completed'),
+    ]
+    
+    # Append order; ties on changed_at resolve by it
+    id = models.BigAutoField(primary_key=True)
+    # Plain id rather than a foreign key: the history outlives deleted and archived bookings
+    booking_id = models.UUIDField()
+    from_status = models.PositiveSmallIntegerField(choices=STATUS_CODE_CHOICES)
+    to_status = models.PositiveSmallIntegerField(choices=STATUS_CODE_CHOICES)
+    changed_at = models.DateTimeField()
+    # Who may read the history: set on a booking's first row only, so access outlives the booking
+    guest_id = models.IntegerField(null=True, blank=True)
+    host_id = models.IntegerField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'booking_status_log'
+        indexes = [
+            # One booking's transitions in order
+            models.Index(fields=['booking_id', 'id'], name='status_log_booking'),
+            # Transitions per day: range scan that also covers the status grouped by
+            models.Index(fields=['changed_at', 'to_status'], name='status_log_changed_at'),
+        ]
+    
+    def __str__(self):
+        return f"Booking {self.booking_id} {self.get_from_status_display()} -> {self.get_to_status_display()}"
+
+class ArchivedStatusTransition(models.Model):
+    """Status transition rolled over out of the hot booking_status_log table"""
+    id = models.BigIntegerField(primary_key=True)
+    booking_id = models.UUIDField()
+    from_status = models.PositiveSmallIntegerField(choices=BookingStatusTransition.STATUS_CODE_CHOICES)
+    to_status = models.PositiveSmallIntegerField(choices=BookingStatusTransition.STATUS_CODE_CHOICES)
+    changed_at = models.DateTimeField()
+    guest_id = models.IntegerField(null=True, blank=True)
+    host_id = models.IntegerField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'booking_status_log_archive'
+        indexes = [
+            models.Index(fields=['booking_id', 'id'], name='status_archive_booking'),
+            models.Index(fields=['changed_at', 'to_status'], name='status_archive_changed_at'),
+        ]
+    
+    def __str__(self):
+        return f"Archived transition {self.id} of booking {self.booking_id}"
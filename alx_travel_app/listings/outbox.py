@@ -0,0 +1,179 @@
+import json
+import os
+import tempfile
+import urllib.request
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent
+
+DEFAULT_BATCH_SIZE = 100
+# Retry delay doubles per failed attempt, up to the cap
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 15 * 60
+# Failures before an event is dead-lettered; about three hours of retries at the capped backoff
+DEFAULT_MAX_ATTEMPTS = 20
+
+
+def booking_payload(booking, **extra):
+    """Booking fields sent downstream; `extra` adds or overrides keys"""
+    return {
+        'booking_id': booking.booking_id,
+        'listing_id': booking.listing_id,
+        'guest_id': booking.guest_id,
+        'status': booking.status,
+        'check_in_date': booking.check_in_date,
+        'check_out_date': booking.check_out_date,
+        'number_of_guests': booking.number_of_guests,
+        'total_price': booking.total_price,
+        **extra,
+    }
+
+
+def record_event(event_type, booking, **extra):
+    """
+    Queue an event for `booking`. Call inside the transaction that writes the
+    booking, so the event exists if and only if the change commits.
+    """
+    return OutboxEvent.objects.create(
+        event_type=event_type, booking_id=booking.booking_id, payload=booking_payload(booking, **extra)
+    )
+
+
+def event_message(event):
+    """The JSON-ready form sinks receive; `sequence` lets consumers drop redeliveries"""
+    return {
+        'sequence': event.sequence,
+        'event_type': event.event_type,
+        'booking_id': str(event.booking_id),
+        'created_at': event.created_at.isoformat(),
+        'payload': event.payload,
+    }
+
+
+class FileSink:
+    """Appends events as JSON lines to a local file; a stand-in for real consumers"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(tempfile.gettempdir(), 'booking-events.jsonl')
+
+    def send(self, messages):
+        with open(self.path, 'a') as handle:
+            handle.writelines(json.dumps(message, cls=DjangoJSONEncoder) + '\n' for message in messages)
+            handle.flush()
+            os.fsync(handle.fileno())
+
+
+class HttpSink:
+    """POSTs each batch as a JSON array; any non-2xx response or network error fails the batch"""
+
+    def __init__(self, url, timeout=10, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = headers or {}
+
+    def send(self, messages):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(messages, cls=DjangoJSONEncoder).encode(),
+            headers={'Content-Type': 'application/json', **self.headers},
+            method='POST',
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def get_sink():
+    """
+    Build the sink named by LISTINGS_OUTBOX_SINK: a dotted class path and
+    keyword arguments, e.g. ('listings.outbox.HttpSink', {'url': ...}).
+    Defaults to a FileSink under the system temp dir.
+    """
+    path, options = getattr(settings, 'LISTINGS_OUTBOX_SINK', ('listings.outbox.FileSink', {}))
+    return import_string(path)(**options)
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def record_failure(event, error, now, max_attempts):
+    """Back `event` off after a failed send, or dead-letter it once out of attempts"""
+    event.attempts += 1
+    event.last_error = error
+    if event.attempts >= max_attempts:
+        event.next_attempt_at = None
+        event.dead_lettered_at = now
+    else:
+        event.next_attempt_at = now + backoff(event.attempts)
+
+
+def relay_batch(sink, batch_size=DEFAULT_BATCH_SIZE, now=None):
+    """
+    Deliver up to `batch_size` due events to `sink` in one call.
+
+    Events are taken in sequence order. A booking whose earliest undelivered
+    event is still backing off is skipped entirely, so its later events never
+    overtake it. A failed send leaves the whole batch undelivered and backs
+    each event off; delivery is at least once. Retried events are sent one
+    per call, so an event the sink keeps rejecting fails on its own, and after
+    LISTINGS_OUTBOX_MAX_ATTEMPTS failures it is dead-lettered and its
+    booking's later events flow again. Run one relay at a time.
+    Returns (delivered, failed) counts.
+    """
+    now = now or timezone.now()
+    max_attempts = getattr(settings, 'LISTINGS_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    pending = OutboxEvent.objects.filter(
+        delivered_at__isnull=True, dead_lettered_at__isnull=True
+    ).order_by('sequence')
+
+    batch, held = [], set()
+    # Scan a little past the batch so a few held bookings don't starve it
+    for event in pending[:batch_size * 2]:
+        if event.booking_id in held:
+            continue
+        if event.next_attempt_at and event.next_attempt_at > now:
+            held.add(event.booking_id)
+            continue
+        if event.attempts:
+            # A retry goes alone, so it can't fail the events batched with it
+            if batch:
+                held.add(event.booking_id)
+                continue
+            batch.append(event)
+            break
+        batch.append(event)
+        if len(batch) == batch_size:
+            break
+    if not batch:
+        return 0, 0
+
+    sequences = [event.sequence for event in batch]
+    try:
+        sink.send([event_message(event) for event in batch])
+    except Exception as exc:
+        error = f'{type(exc).__name__}: {exc}'[:1000]
+        for event in batch:
+            record_failure(event, error, now, max_attempts)
+        OutboxEvent.objects.bulk_update(batch, ['attempts', 'next_attempt_at', 'last_error', 'dead_lettered_at'])
+        return 0, len(batch)
+
+    OutboxEvent.objects.filter(sequence__in=sequences).update(delivered_at=timezone.now(), last_error='')
+    return len(batch), 0
+
+
+def requeue_dead_letters():
+    """Give dead-lettered events a fresh set of attempts; returns the number requeued"""
+    return OutboxEvent.objects.filter(dead_lettered_at__isnull=False).update(
+        dead_lettered_at=None, attempts=0, next_attempt_at=None
+    )
+
+
+def purge_delivered(cutoff):
+    """Delete events delivered before `cutoff`; returns the number deleted"""
+    deleted, _ = OutboxEvent.objects.filter(delivered_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,187 @@
+import atexit
+import heapq
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import ListingViewStats
+
+logger = logging.getLogger(__name__)
+
+# Fixed landmark for forward decay; scores are stored relative to it
+LANDMARK = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+_lock = threading.Lock()
+_pending = {}
+_flusher = None
+
+
+def decay_rate():
+    """Exponential decay rate per second for the configured half-life"""
+    half_life_hours = getattr(settings, 'LISTINGS_TRENDING_HALF_LIFE_HOURS', 24)
+    return math.log(2) / (half_life_hours * 3600)
+
+
+def log_weight(views, at):
+    """Log of `views` forward-decayed to the landmark: log(views) + rate * (at - landmark)"""
+    return math.log(views) + decay_rate() * (at - LANDMARK).total_seconds()
+
+
+def decayed_views(trend_score, now=None):
+    """Views as of now with older views decayed by the half-life"""
+    now = now or timezone.now()
+    return math.exp(trend_score - decay_rate() * (now - LANDMARK).total_seconds())
+
+
+def log_add(a, b):
+    """log(exp(a) + exp(b)) without overflow"""
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+class TopK:
+    """Bounded set of the highest-scoring listings, trimmed with a heap"""
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.scores = {}
+
+    def offer(self, items):
+        with self.lock:
+            self.scores.update(items)
+            if len(self.scores) > self.size:
+                self.scores = dict(heapq.nlargest(self.size, self.scores.items(), key=lambda item: item[1]))
+
+    def replace(self, items):
+        with self.lock:
+            self.scores = dict(items)
+
+    def top(self, limit):
+        with self.lock:
+            return heapq.nlargest(limit, self.scores.items(), key=lambda item: item[1])
+
+
+trending = TopK(getattr(settings, 'LISTINGS_TRENDING_SIZE', 100))
+# Monotonic time of the last reload from the database, None before the first
+_refreshed_at = None
+
+
+def record_view(listing_id):
+    """
+    Count one detail view in memory; no database work on the request path.
+
+    With LISTINGS_VIEW_FLUSH_SECONDS set to 0 no flusher thread is started
+    and each view is flushed before returning, which keeps tests
+    deterministic.
+    """
+    with _lock:
+        _pending[listing_id] = _pending.get(listing_id, 0) + 1
+    if getattr(settings, 'LISTINGS_VIEW_FLUSH_SECONDS', 10) > 0:
+        _ensure_flusher()
+    else:
+        flush_views()
+
+
+def flush_views():
+    """
+    Write buffered views to listing_view_stats as one batched upsert.
+
+    Existing rows for the batch are read under lock in one query, merged in
+    log space, and written back with a single bulk upsert. The merged
+    scores are offered to the in-memory trending set. Returns the number
+    of listings flushed.
+    """
+    global _pending
+    with _lock:
+        pending, _pending = _pending, {}
+    if not pending:
+        return 0
+
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            existing = ListingViewStats.objects.select_for_update().in_bulk(list(pending))
+            rows = []
+            for listing_id, views in pending.items():
+                weight = log_weight(views, now)
+                row = existing.get(listing_id)
+                if row is None:
+                    row = ListingViewStats(listing_id=listing_id, total_views=views, trend_score=weight)
+                else:
+                    row.total_views += views
+                    row.trend_score = log_add(row.trend_score, weight)
+                row.updated_at = now
+                rows.append(row)
+            ListingViewStats.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['listing_id'],
+                update_fields=['total_views', 'trend_score', 'updated_at']
+            )
+    except Exception:
+        # Put the counts back so a transient failure loses nothing
+        with _lock:
+            for listing_id, views in pending.items():
+                _pending[listing_id] = _pending.get(listing_id, 0) + views
+        raise
+
+    trending.offer((row.listing_id, row.trend_score) for row in rows)
+    return len(rows)
+
+
+def refresh_trending():
+    """Reload the trending set from the top of the trend_score index"""
+    global _refreshed_at
+    top = ListingViewStats.objects.order_by('-trend_score').values_list('listing_id', 'trend_score')
+    trending.replace(top[:trending.size])
+    _refreshed_at = time.monotonic()
+
+
+def top_listings(limit):
+    """
+    [(listing_id, trend_score)] of the most viewed listings, decayed by recency.
+
+    Served from memory; reloaded from the database every
+    LISTINGS_TRENDING_REFRESH_SECONDS to pick up views flushed by other
+    processes.
+    """
+    interval = getattr(settings, 'LISTINGS_TRENDING_REFRESH_SECONDS', 60)
+    if _refreshed_at is None or time.monotonic() - _refreshed_at > interval:
+        refresh_trending()
+    return trending.top(limit)
+
+
+def reset_views():
+    """Drop buffered views and the in-memory trending set, forcing a reload"""
+    global _pending, _refreshed_at
+    with _lock:
+        _pending = {}
+    trending.replace({})
+    _refreshed_at = None
+
+
+def _flush_loop():
+    interval = getattr(settings, 'LISTINGS_VIEW_FLUSH_SECONDS', 10)
+    while True:
+        time.sleep(interval)
+        try:
+            flush_views()
+        except Exception:
+            logger.exception("Flushing listing view counts failed")
+        finally:
+            close_old_connections()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is None:
+        with _lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_loop, name='listing-view-flusher', daemon=True)
+                _flusher.start()
+                atexit.register(flush_views)
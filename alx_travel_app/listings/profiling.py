@@ -0,0 +1,135 @@
+import hmac
+import os
+import random
+import sys
+import tempfile
+import threading
+from collections import Counter
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+
+HEADER = 'HTTP_X_PROFILE'
+
+# Frames labelled with the class of `self`, so time in base serializer methods
+# shows up as ListingSerializer.to_representation, not Serializer.to_representation
+INSTANCE_LABEL_MODULES = ('rest_framework.serializers', 'rest_framework.fields', 'rest_framework.relations')
+# Stacks are cut above Django's request handler, which calls both the view and render()
+HANDLER_FRAMES = {('django.core.handlers.base', '_get_response'), ('django.core.handlers.base', '_get_response_async')}
+
+# Only one request per process is profiled at a time, bounding the overhead
+_busy = threading.Lock()
+_write_lock = threading.Lock()
+
+
+def _should_profile(request):
+    header = request.META.get(HEADER)
+    if header:
+        token = getattr(settings, 'LISTINGS_PROFILE_TOKEN', None)
+        if token and hmac.compare_digest(header.encode(), token.encode()):
+            return True
+    rate = getattr(settings, 'LISTINGS_PROFILE_SAMPLE_RATE', 0)
+    return rate > 0 and random.random() < rate
+
+
+def frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    # co_qualname is new in Python 3.11; older versions label functions without their class
+    name = getattr(code, 'co_qualname', code.co_name)
+    if module in INSTANCE_LABEL_MODULES and code.co_argcount and code.co_varnames[0] == 'self':
+        instance = frame.f_locals.get('self')
+        if instance is not None:
+            name = f'{type(instance).__name__}.{code.co_name}'
+    return f'{module}:{name}'
+
+
+def collapse(frame):
+    """Fold a stack into flamegraph order (root first), starting below the request handler"""
+    labels = []
+    while frame is not None:
+        if (frame.f_globals.get('__name__'), frame.f_code.co_name) in HANDLER_FRAMES:
+            break
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class Sampler(threading.Thread):
+    """
+    Samples one thread's stack at a fixed interval until stopped, then
+    appends the collapsed stacks to the view's .folded file.
+    """
+
+    def __init__(self, thread_id, view_name):
+        super().__init__(name=f'profile-{view_name}', daemon=True)
+        self.thread_id = thread_id
+        self.view_name = view_name
+        self.interval = getattr(settings, 'LISTINGS_PROFILE_INTERVAL', 0.002)
+        self.max_samples = getattr(settings, 'LISTINGS_PROFILE_MAX_SAMPLES', 5000)
+        self.stacks = Counter()
+        self.done = threading.Event()
+
+    def run(self):
+        frame = None
+        try:
+            samples = 0
+            while not self.done.wait(self.interval) and samples < self.max_samples:
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is None:
+                    break
+                self.stacks[collapse(frame)] += 1
+                samples += 1
+            del frame
+            self.write()
+        finally:
+            _busy.release()
+
+    def stop(self, response=None):
+        self.done.set()
+        return response
+
+    def write(self):
+        if not self.stacks:
+            return
+        directory = Path(getattr(
+            settings, 'LISTINGS_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'listings-profiles')
+        ))
+        directory.mkdir(parents=True, exist_ok=True)
+        lines = ''.join(f'{stack} {count}\n' for stack, count in self.stacks.items() if stack)
+        with _write_lock, open(directory / f'{self.view_name}.folded', 'a') as handle:
+            handle.write(lines)
+
+
+def profiled(view):
+    """
+    Run a sampled fraction of requests under a statistical profiler.
+
+    A request is profiled with probability LISTINGS_PROFILE_SAMPLE_RATE, or
+    when its X-Profile header matches LISTINGS_PROFILE_TOKEN. A background
+    thread samples the request thread's stack every
+    LISTINGS_PROFILE_INTERVAL seconds through the view and response
+    rendering, and appends collapsed stacks (flamegraph.pl / speedscope
+    input) to LISTINGS_PROFILE_DIR/<view>.folded. Unsampled requests pay
+    one settings lookup and one random draw.
+    """
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not _should_profile(request) or not _busy.acquire(blocking=False):
+            return view(request, *args, **kwargs)
+
+        sampler = Sampler(threading.get_ident(), view.__name__)
+        sampler.start()
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            sampler.stop()
+            raise
+        # DRF renders after the view returns; keep sampling until it has
+        if hasattr(response, 'add_post_render_callback') and not response.is_rendered:
+            response.add_post_render_callback(sampler.stop)
+        else:
+            sampler.stop()
+        return response
+    return wrapped
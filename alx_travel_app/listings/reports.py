@@ -0,0 +1,140 @@
+"""
+Booking exports rendered in parallel worker processes.
+
+DRF serialization of bookings with their nested listing and guest is
+CPU-bound, so one process tops out at one core. The export splits the
+matching bookings into primary key ranges of about equal size, and a pool
+of processes serializes the ranges, each worker with its own database
+connection, writing JSON lines to a temporary part file. The parent
+streams the parts back in range order, so the output is one file ordered
+by booking_id whatever the number of workers.
+"""
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import django
+from django.db import connections
+from rest_framework.renderers import JSONRenderer
+
+from .models import Booking
+from .serializers import BookingSerializer
+
+DEFAULT_CHUNK_SIZE = 1000
+# Ranges per worker; more, smaller ranges even out workers that draw slow ones
+SHARDS_PER_WORKER = 4
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+def quarter_range(value):
+    """Parse '2025Q1' into the [start, end) dates of that quarter"""
+    try:
+        year, quarter = value.upper().split('Q')
+        year, quarter = int(year), int(quarter)
+    except ValueError:
+        raise ValueError('quarter must look like 2025Q1')
+    if not 1 <= quarter <= 4:
+        raise ValueError('quarter must be between Q1 and Q4')
+    start = date(year, 3 * quarter - 2, 1)
+    end = date(year + 1, 1, 1) if quarter == 4 else date(year, 3 * quarter + 1, 1)
+    return start, end
+
+
+def report_bookings(start, end):
+    """Bookings checking in on or after `start` and before `end`"""
+    return Booking.objects.filter(check_in_date__gte=start, check_in_date__lt=end)
+
+
+def shard_bounds(queryset, shards):
+    """
+    Split `queryset` into at most `shards` primary key ranges of about
+    equal row counts. Returns [(low, high), ...] meaning low <= pk < high,
+    with None for an open end.
+    """
+    count = queryset.count()
+    shards = max(1, min(shards, count))
+    ordered = queryset.order_by('pk').values_list('pk', flat=True)
+    # One indexed OFFSET lookup per boundary, so the parent never loads the ids
+    boundaries = [ordered[count * index // shards] for index in range(1, shards)]
+    edges = [None] + boundaries + [None]
+    return list(zip(edges, edges[1:]))
+
+
+def render_rows(queryset, handle, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write each booking of `queryset` as a JSON line, walking the pk index in chunks; returns the count"""
+    serializer = BookingSerializer()
+    queryset = serializer.optimize_queryset(queryset).order_by('pk')
+    renderer = JSONRenderer()
+    rows, last = 0, None
+    while True:
+        page = queryset.filter(pk__gt=last) if last is not None else queryset
+        bookings = list(page[:chunk_size])
+        if not bookings:
+            return rows
+        for item in BookingSerializer(bookings, many=True).data:
+            handle.write(renderer.render(item))
+            handle.write(b'\n')
+        rows += len(bookings)
+        last = bookings[-1].pk
+
+
+def render_shard(start, end, low, high, path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Worker entry point: render one pk range of the report to `path`; returns the row count"""
+    queryset = report_bookings(start, end)
+    if low is not None:
+        queryset = queryset.filter(pk__gte=low)
+    if high is not None:
+        queryset = queryset.filter(pk__lt=high)
+    with open(path, 'wb') as handle:
+        return render_rows(queryset, handle, chunk_size)
+
+
+def export_bookings(start, end, workers=None, shards=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Yield the JSON-lines report of bookings checking in within [start,
+    end), ordered by booking_id, in blocks of bytes.
+
+    With one worker the report is rendered in this process. Otherwise
+    workers are started with the spawn method, so each sets up Django and
+    opens its own database connection instead of sharing an inherited
+    socket; this process's connections are closed first for the same
+    reason, so don't call this inside a transaction. `progress` is called
+    with (shards done, shards, rows so far).
+    """
+    workers = workers or os.cpu_count() or 1
+    bounds = shard_bounds(report_bookings(start, end), shards or workers * SHARDS_PER_WORKER)
+
+    with tempfile.TemporaryDirectory(prefix='booking-report-') as directory:
+        jobs = [
+            (start, end, low, high, os.path.join(directory, f'part-{index:05d}.jsonl'), chunk_size)
+            for index, (low, high) in enumerate(bounds)
+        ]
+        if workers == 1:
+            results = (render_shard(*job) for job in jobs)
+            yield from merge_parts(jobs, results, progress)
+            return
+
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(jobs)), mp_context=multiprocessing.get_context('spawn'),
+            # Referenced from django itself, so unpickling it doesn't import models before setup
+            initializer=django.setup,
+        ) as pool:
+            # map() hands results back in submission order, i.e. pk order
+            results = pool.map(render_shard, *zip(*jobs))
+            yield from merge_parts(jobs, results, progress)
+
+
+def merge_parts(jobs, results, progress):
+    rows = 0
+    for done, (job, count) in enumerate(zip(jobs, results), 1):
+        path = job[4]
+        with open(path, 'rb') as handle:
+            while block := handle.read(READ_BLOCK_SIZE):
+                yield block
+        os.remove(path)
+        rows += count
+        if progress:
+            progress(done, len(jobs), rows)
@@ -0,0 +1,135 @@
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+# Alias chosen for reads in the current request; None means the primary
+_read_alias = contextvars.ContextVar('listings_read_alias', default=None)
+
+# alias -> (checked_at, lag_seconds)
+_lag_cache = {}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def get_replicas():
+    return list(getattr(settings, 'LISTINGS_READ_REPLICAS', []))
+
+
+class ReadReplicaRouter:
+    """
+    Database router sending reads to a replica only inside views wrapped
+    with read_from_replica; every other read and all writes use the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+def measure_lag(alias):
+    """Return replication lag in seconds for `alias`, or None if the backend can't tell"""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+            )
+            return float(cursor.fetchone()[0])
+        if connection.vendor == 'mysql':
+            cursor.execute("SHOW REPLICA STATUS")
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            columns = [col[0] for col in cursor.description]
+            lag = dict(zip(columns, row)).get('Seconds_Behind_Source')
+            return float('inf') if lag is None else float(lag)
+        # SQLite stand-ins and unknown backends: just check the replica answers
+        cursor.execute("SELECT 1")
+        return None
+
+
+def replica_lag(alias):
+    """Replication lag for `alias`, cached for LISTINGS_REPLICA_LAG_CHECK_INTERVAL seconds"""
+    interval = getattr(settings, 'LISTINGS_REPLICA_LAG_CHECK_INTERVAL', 5)
+    now = time.monotonic()
+    checked = _lag_cache.get(alias)
+    if checked and now - checked[0] < interval:
+        return checked[1]
+    try:
+        lag = measure_lag(alias)
+    except DatabaseError:
+        # Unreachable replica: treat as infinitely behind until the next check
+        lag = float('inf')
+    _lag_cache[alias] = (now, lag)
+    return lag
+
+
+def healthy_replicas():
+    """Replicas within LISTINGS_REPLICA_MAX_LAG seconds of the primary"""
+    max_lag = getattr(settings, 'LISTINGS_REPLICA_MAX_LAG', 5)
+    healthy = []
+    for alias in get_replicas():
+        lag = replica_lag(alias)
+        if lag is None or lag <= max_lag:
+            healthy.append(alias)
+    return healthy
+
+
+def _sticky_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'listings:primary-pin:user:{user.pk}'
+    return f'listings:primary-pin:ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+def pin_to_primary(request):
+    """Send this client's reads to the primary for a short window after a write"""
+    seconds = getattr(settings, 'LISTINGS_REPLICA_STICKY_SECONDS', 10)
+    cache.set(_sticky_key(request), True, seconds)
+
+
+def choose_read_alias(request):
+    """Pick a replica for a safe request, or None to stay on the primary"""
+    if not get_replicas() or cache.get(_sticky_key(request)):
+        return None
+    replicas = healthy_replicas()
+    return random.choice(replicas) if replicas else None
+
+
+def read_from_replica(view):
+    """Route the ORM reads of GET requests handled by `view` to a healthy replica"""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return view(request, *args, **kwargs)
+        token = _read_alias.set(choose_read_alias(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return wrapped
+
+
+@contextmanager
+def primary_reads():
+    """Send the ORM reads in this block to the primary, even inside read_from_replica"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
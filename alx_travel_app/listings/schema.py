@@ -0,0 +1,84 @@
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.urls import get_resolver
+
+# Source files whose changes can alter the generated schema
+APP_DIR = Path(__file__).resolve().parent
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+def schema_version():
+    """
+    Version key for the schema artifact.
+
+    LISTINGS_SCHEMA_VERSION (e.g. a release or commit id) wins; otherwise a
+    digest of the app's Python sources, so any code change yields a new key.
+    """
+    version = getattr(settings, 'LISTINGS_SCHEMA_VERSION', None)
+    if version:
+        return str(version)
+    digest = hashlib.sha256(settings.ROOT_URLCONF.encode())
+    for path in sorted(APP_DIR.rglob('*.py')):
+        digest.update(path.relative_to(APP_DIR).as_posix().encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def schema_path(version):
+    directory = getattr(settings, 'LISTINGS_SCHEMA_DIR', os.path.join(tempfile.gettempdir(), 'listings-schema'))
+    return Path(directory) / f'openapi-{version}.json'
+
+
+def generate_schema():
+    """Introspect the URLconf with drf_yasg and return the schema as JSON bytes"""
+    # Imported here so workers that only serve the API never load drf_yasg
+    from drf_yasg import openapi
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    from .docs import apply_schemas
+
+    # Load every view module, then attach the annotations they recorded
+    get_resolver().url_patterns
+    apply_schemas()
+    info = openapi.Info(
+        title=getattr(settings, 'LISTINGS_SCHEMA_TITLE', 'ALX Travel API'),
+        default_version='v1',
+    )
+    schema = OpenAPISchemaGenerator(info).get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def build_schema(force=False):
+    """Write the schema artifact for the current version unless it already exists; return its path"""
+    path = schema_path(schema_version())
+    if force or not path.exists():
+        body = generate_schema()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(body)
+        os.replace(tmp, path)
+    return path
+
+
+def load_schema():
+    """
+    Return (body, etag) for the current schema, building the artifact on
+    first use if no management command has done so. Cached per process.
+    """
+    if 'body' not in _loaded:
+        with _lock:
+            if 'body' not in _loaded:
+                body = build_schema().read_bytes()
+                _loaded['etag'] = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+                _loaded['body'] = body
+    return _loaded['body'], _loaded['etag']
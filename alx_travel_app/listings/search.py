@@ -0,0 +1,190 @@
+import hashlib
+import json
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .locations import normalize
+from .models import Listing, Booking, BlockedDateRange
+from .routers import primary_reads
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+# Bounds staleness from changes that don't bump a version, e.g. host profile edits
+DEFAULT_TTL_SECONDS = 300
+
+
+def search_listings(location, check_in=None, check_out=None, guests=1, min_price=None, max_price=None):
+    """
+    Visible listings in `location` (case-insensitive) that fit `guests` and
+    the price range and, when dates are given, are open, unbooked and not
+    blocked by an imported calendar for every night of [check_in,
+    check_out). Cheapest first.
+    """
+    queryset = Listing.objects.filter(location__iexact=' '.join(location.split()), max_guests__gte=guests)
+    if min_price is not None:
+        queryset = queryset.filter(price_per_night__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(price_per_night__lte=max_price)
+    if check_in and check_out:
+        overlapping = Booking.objects.filter(
+            listing=OuterRef('pk'), check_in_date__lt=check_out, check_out_date__gt=check_in
+        ).exclude(status='canceled')
+        blocked = BlockedDateRange.objects.filter(
+            listing=OuterRef('pk'), start_date__lt=check_out, end_date__gt=check_in
+        )
+        queryset = queryset.filter(
+            available_from__lte=check_in, available_to__gte=check_out
+        ).exclude(Exists(overlapping)).exclude(Exists(blocked))
+    return queryset.order_by('price_per_night', 'listing_id')
+
+
+def version_key(location):
+    # Hashed so any location is a valid key for every cache backend
+    return 'listings:search-version:' + hashlib.sha1(location.encode()).hexdigest()
+
+
+def query_key(params):
+    """Canonical form of a search, so equivalent requests share an entry"""
+    return json.dumps(params, sort_keys=True, default=str, separators=(',', ':'))
+
+
+class SearchCache:
+    """
+    In-process LRU of search results, bounded by approximate bytes.
+
+    Entries are keyed by (location, location version, query). Versions are
+    counters in the shared Django cache (LISTINGS_SEARCH_VERSION_CACHE), so
+    a bump from any worker makes every worker's entries for that location
+    unreachable while other locations' entries stay valid. A version that
+    falls out of the shared cache is re-seeded from the clock rather than
+    restarting at zero, so old entries can't become reachable again.
+    Entries also expire `ttl` seconds after they are computed.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def versions(self):
+        return caches[getattr(settings, 'LISTINGS_SEARCH_VERSION_CACHE', 'default')]
+
+    def version(self, location):
+        key = version_key(location)
+        version = self.versions.get(key)
+        if version is None:
+            self.versions.add(key, time.time_ns(), timeout=None)
+            version = self.versions.get(key)
+        return version
+
+    def bump(self, location):
+        key = version_key(location)
+        try:
+            self.versions.incr(key)
+        except ValueError:
+            self.versions.set(key, time.time_ns(), timeout=None)
+        with self.lock:
+            self.invalidations += 1
+            # This worker's stale entries can go now; other workers' age out of their LRU
+            for entry_key in [k for k in self.entries if k[0] == location]:
+                self.bytes -= self.entries.pop(entry_key)[1]
+
+    def get_or_compute(self, location, query, compute):
+        """Return the cached results for `query` in `location`, computing them on the primary and storing them on a miss"""
+        location = normalize(location)
+        key = (location, self.version(location), query_key(query))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self.bytes -= self.entries.pop(key)[1]
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Fill from the primary: a lagging replica could recompute results the
+        # version bump has just invalidated, and they would be kept for the TTL
+        with primary_reads():
+            results = compute()
+        size = len(pickle.dumps(results, pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return results
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (results, size, time.monotonic() + self.ttl)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self.bytes -= self.entries.popitem(last=False)[1][1]
+        return results
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'invalidations': self.invalidations,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """The process-wide search cache, sized by LISTINGS_SEARCH_CACHE_BYTES and LISTINGS_SEARCH_CACHE_TTL"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchCache(
+                    getattr(settings, 'LISTINGS_SEARCH_CACHE_BYTES', DEFAULT_MAX_BYTES),
+                    getattr(settings, 'LISTINGS_SEARCH_CACHE_TTL', DEFAULT_TTL_SECONDS),
+                )
+    return _cache
+
+
+def reset_cache(cache=None):
+    global _cache
+    _cache = cache
+
+
+def location_changed(*locations):
+    """Invalidate cached searches for these locations once the current transaction commits"""
+    locations = {normalize(location) for location in locations if location}
+    if not locations:
+        return
+
+    def bump():
+        for location in locations:
+            get_cache().bump(location)
+    transaction.on_commit(bump)
+
+
+def listing_location(instance):
+    """
+    The location of the listing a booking or review belongs to, without a
+    query when the listing is loaded with it
+    """
+    if type(instance).listing.is_cached(instance) and 'location' not in instance.listing.get_deferred_fields():
+        return instance.listing.location
+    return Listing.all_objects.filter(pk=instance.listing_id).values_list('location', flat=True).first()
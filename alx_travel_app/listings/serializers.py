@@ -1,18 +1,121 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Listing, Booking, Review
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Prefetch
+from . import outbox, status_log
+from .models import Listing, Booking, Review, ListingPurge, ArchivedBooking
+from .services import calculate_total_price, create_booking, get_listing_for_booking, validate_booking
 
-class UserSerializer(serializers.ModelSerializer):
+
+def parse_field_list(value):
+    """Turn 'a,b.c,b.d' into a nested dict tree {'a': {}, 'b': {'c': {}, 'd': {}}}"""
+    if value is None:
+        return None
+    tree = {}
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        node = tree
+        for part in item.split('.'):
+            node = node.setdefault(part, {})
+    return tree
+
+
+class DynamicFieldsMixin:
+    """
+    Serializer mixin for sparse fieldsets and field expansion.
+
+    Accepts `fields` and `expand` trees (see parse_field_list). Fields not
+    listed in `fields` are dropped; nested serializers named in
+    `expandable_fields` are rendered inline only when listed in `expand`
+    and as a primary key otherwise. Passing None keeps the full output.
+    """
+    expandable_fields = ()
+    # Model columns needed by read-only properties exposed as fields
+    field_dependencies = {}
+    # Related lookups to prefetch for fields computed from a relation
+    field_prefetches = {}
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+        self.apply_fieldset(fields, expand)
+
+    def apply_fieldset(self, fields=None, expand=None):
+        """Prune and collapse this serializer's fields in place"""
+        if fields:
+            for name in set(self.fields) - set(fields):
+                if not self.fields[name].write_only:
+                    self.fields.pop(name)
+        for name in self.expandable_fields:
+            if name not in self.fields:
+                continue
+            if expand is not None and name not in expand:
+                self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
+            elif isinstance(self.fields[name], DynamicFieldsMixin):
+                self.fields[name].apply_fieldset(
+                    (fields or {}).get(name) or None,
+                    None if expand is None else expand[name] or None,
+                )
+
+    def optimize_queryset(self, queryset, extra_fields=()):
+        """Restrict the queryset to the columns, joins and prefetches the fields need"""
+        only, related, prefetches = self._query_plan()
+        only += list(extra_fields)
+        if related:
+            queryset = queryset.select_related(*related)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset.only(*only)
+
+    def _query_plan(self, prefix=''):
+        model = self.Meta.model
+        columns = {f.name for f in model._meta.concrete_fields}
+        only, related, prefetches = [], [], []
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            source = field.source
+            if isinstance(field, DynamicFieldsMixin):
+                related.append(prefix + source)
+                only.append(prefix + source)
+                sub_only, sub_related, sub_prefetches = field._query_plan(prefix + source + '__')
+                only += sub_only
+                related += sub_related
+                prefetches += sub_prefetches
+            elif isinstance(field, serializers.Serializer):
+                related.append(prefix + source)
+                only.append(prefix + source)
+                only += [prefix + source + '__' + sub.source
+                         for sub in field.fields.values() if not sub.write_only]
+            elif source in columns:
+                only.append(prefix + source)
+            only += [prefix + dep for dep in self.field_dependencies.get(name, ())]
+            if name in self.field_prefetches:
+                lookup, queryset = self.field_prefetches[name]
+                prefetches.append(Prefetch(prefix + lookup, queryset=queryset))
+        return only, related, prefetches
+
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for User model"""
     class Meta:
         model = User
         fields = ['id', 'username', 'first_name', 'last_name', 'email']
         read_only_fields = ['id']
 
-class ListingSerializer(serializers.ModelSerializer):
+class ListingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Listing model"""
     host = UserSerializer(read_only=True)
     average_rating = serializers.ReadOnlyField()
+
+    expandable_fields = ('host',)
+    field_prefetches = {
+        'average_rating': ('reviews', Review.objects.only('review_id', 'listing', 'rating')),
+    }
     
     class Meta:
         model = Listing
@@ -39,12 +142,15 @@ class ListingSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Price per night must be greater than 0.")
         return value
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Booking model"""
     listing = ListingSerializer(read_only=True)
     guest = UserSerializer(read_only=True)
     listing_id = serializers.UUIDField(write_only=True)
     duration_days = serializers.ReadOnlyField()
+
+    expandable_fields = ('listing', 'guest')
+    field_dependencies = {'duration_days': ('check_in_date', 'check_out_date')}
     
     class Meta:
         model = Booking
@@ -54,48 +160,92 @@ class BookingSerializer(serializers.ModelSerializer):
             'total_price', 'status', 'created_at', 'updated_at',
             'duration_days'
         ]
-        read_only_fields = ['booking_id', 'created_at', 'updated_at', 'duration_days']
+        read_only_fields = ['booking_id', 'total_price', 'created_at', 'updated_at', 'duration_days']
     
     def validate(self, data):
         """Custom validation for booking"""
-        # Check dates
-        if data['check_out_date'] <= data['check_in_date']:
-            raise serializers.ValidationError(
-                "Check-out date must be after check-in date."
-            )
+        # Load the listing once; create()/update() reuse this instance
+        try:
+            listing = get_listing_for_booking(data['listing_id'])
+        except Listing.DoesNotExist:
+            raise serializers.ValidationError({'listing_id': "Listing not found."})
         
-        # Check guest capacity
-        listing = Listing.objects.get(listing_id=data['listing_id'])
-        if data['number_of_guests'] > listing.max_guests:
-            raise serializers.ValidationError(
-                f"Number of guests ({data['number_of_guests']}) exceeds maximum allowed ({listing.max_guests})."
-            )
-        
-        # Check availability dates
-        if (data['check_in_date'] < listing.available_from or 
-            data['check_out_date'] > listing.available_to):
-            raise serializers.ValidationError(
-                f"Booking dates must be within availability period ({listing.available_from} to {listing.available_to})."
+        try:
+            validate_booking(
+                listing, data['check_in_date'], data['check_out_date'], data['number_of_guests']
             )
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.messages)
         
+        data['listing'] = listing
         return data
     
     def create(self, validated_data):
         """Create booking with calculated total price"""
-        listing_id = validated_data.pop('listing_id')
-        listing = Listing.objects.get(listing_id=listing_id)
-        
-        # Calculate total price
-        duration = (validated_data['check_out_date'] - validated_data['check_in_date']).days
-        total_price = listing.price_per_night * duration
-        
-        booking = Booking.objects.create(
-            listing=listing,
-            total_price=total_price,
-            **validated_data
+        validated_data.pop('listing_id')
+        return create_booking(**validated_data)
+    
+    def update(self, instance, validated_data):
+        """Update booking and recalculate total price"""
+        validated_data.pop('listing_id')
+        validated_data['total_price'] = calculate_total_price(
+            validated_data['listing'], validated_data['check_in_date'], validated_data['check_out_date']
         )
+        if validated_data['listing'].pk == instance.listing_id:
+            # Keep the instance's own listing rather than the partially loaded one
+            validated_data.pop('listing')
+        previous_status = instance.status
+        with transaction.atomic():
+            booking = super().update(instance, validated_data)
+            if booking.status != previous_status:
+                # Consumers see the same event for a cancel by PUT as for a DELETE
+                event_type = 'booking.canceled' if booking.status == 'canceled' else 'booking.status_changed'
+                outbox.record_event(event_type, booking, previous_status=previous_status)
+                status_log.record_transition(booking.booking_id, previous_status, booking.status, booking.updated_at)
         return booking
 
+class ListingSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Compact listing representation for embedding in booking lists"""
+    class Meta:
+        model = Listing
+        fields = ['listing_id', 'title', 'location', 'price_per_night']
+        read_only_fields = fields
+
+class BookingHistorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer for a guest's booking history"""
+    listing = ListingSummarySerializer(read_only=True)
+    duration_days = serializers.ReadOnlyField()
+
+    field_dependencies = {'duration_days': ('check_in_date', 'check_out_date')}
+
+    class Meta:
+        model = Booking
+        fields = [
+            'booking_id', 'listing', 'check_in_date', 'check_out_date',
+            'number_of_guests', 'total_price', 'status', 'duration_days'
+        ]
+        read_only_fields = fields
+
+class ArchivedBookingSerializer(serializers.ModelSerializer):
+    """Serializer for archived bookings"""
+    class Meta:
+        model = ArchivedBooking
+        fields = [
+            'booking_id', 'listing_id', 'review_id', 'check_in_date', 'check_out_date',
+            'number_of_guests', 'total_price', 'status', 'created_at', 'archived_at'
+        ]
+        read_only_fields = fields
+
+class ListingPurgeSerializer(serializers.ModelSerializer):
+    """Serializer for the progress of a listing purge"""
+    class Meta:
+        model = ListingPurge
+        fields = [
+            'purge_id', 'listing_id', 'status', 'bookings_total',
+            'bookings_deleted', 'reviews_deleted', 'requested_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
 class ReviewSerializer(serializers.ModelSerializer):
     """Serializer for Review model"""
     guest = UserSerializer(read_only=True)
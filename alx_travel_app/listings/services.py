@@ -0,0 +1,78 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import outbox, status_log
+from .models import Listing, Booking, BlockedDateRange
+
+# Listing columns needed to validate, price and label a booking, and to record its host
+BOOKING_LISTING_FIELDS = (
+    'listing_id', 'host', 'title', 'location', 'price_per_night', 'max_guests',
+    'available_from', 'available_to',
+)
+
+
+def get_listing_for_booking(listing_id, lock=None):
+    """
+    Load the listing columns a booking needs in a single query.
+
+    The row is locked with SELECT ... FOR UPDATE when `lock` is true, which
+    by default is whenever the caller is inside a transaction, so concurrent
+    bookings for the same listing are validated one at a time.
+    """
+    if lock is None:
+        lock = not transaction.get_autocommit()
+    queryset = Listing.objects.only(*BOOKING_LISTING_FIELDS)
+    if lock:
+        queryset = queryset.select_for_update()
+    return queryset.get(listing_id=listing_id)
+
+
+def validate_booking(listing, check_in_date, check_out_date, number_of_guests):
+    """Check booking dates and party size against an already loaded listing and its blocked dates"""
+    if check_out_date <= check_in_date:
+        raise ValidationError("Check-out date must be after check-in date.")
+    if number_of_guests > listing.max_guests:
+        raise ValidationError(
+            f"Number of guests ({number_of_guests}) exceeds maximum allowed ({listing.max_guests})."
+        )
+    if check_in_date < listing.available_from or check_out_date > listing.available_to:
+        raise ValidationError(
+            f"Booking dates must be within availability period ({listing.available_from} to {listing.available_to})."
+        )
+    # Nights taken by an imported calendar; one indexed EXISTS on (listing, end_date)
+    if BlockedDateRange.objects.filter(
+        listing_id=listing.listing_id, start_date__lt=check_out_date, end_date__gt=check_in_date
+    ).exists():
+        raise ValidationError("Some of the requested nights are blocked by the listing's calendar.")
+
+
+def calculate_total_price(listing, check_in_date, check_out_date):
+    """Total price for the stay at the listing's nightly rate"""
+    return listing.price_per_night * (check_out_date - check_in_date).days
+
+
+def create_booking(listing, guest, check_in_date, check_out_date, number_of_guests, **extra):
+    """
+    Insert a booking for an already loaded and validated listing, with its
+    outbox event in the same transaction.
+
+    The listing instance is attached to the booking, so nothing downstream
+    (pricing, __str__, clean, serialization of listing_id) fetches it again.
+    """
+    booking = Booking(
+        listing=listing,
+        guest=guest,
+        check_in_date=check_in_date,
+        check_out_date=check_out_date,
+        number_of_guests=number_of_guests,
+        total_price=calculate_total_price(listing, check_in_date, check_out_date),
+        **extra
+    )
+    with transaction.atomic():
+        booking.save(force_insert=True)
+        outbox.record_event('booking.created', booking)
+        status_log.record_transition(
+            booking.booking_id, None, booking.status, booking.created_at,
+            guest_id=guest.pk, host_id=listing.host_id,
+        )
+    return booking
@@ -0,0 +1,62 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from . import locations, search, similarity
+from .models import Listing, Booking, Review
+
+# Sent after a soft delete commits; queryset.update() sends no post_save
+listing_soft_deleted = Signal()
+
+
+@receiver(pre_save, sender=Listing)
+def remember_location(sender, instance, **kwargs):
+    # A listing moving between locations invalidates searches in both
+    if not instance._state.adding:
+        instance._previous_location = (
+            Listing.objects.filter(pk=instance.pk).values_list('location', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Listing)
+def listing_saved(sender, instance, created, **kwargs):
+    similarity.listing_changed(instance)
+    search.location_changed(instance.location, getattr(instance, '_previous_location', None))
+    if created:
+        locations.location_changed(None, instance.location)
+    elif hasattr(instance, '_previous_location'):
+        locations.location_changed(instance._previous_location, instance.location)
+        del instance._previous_location
+
+
+@receiver(listing_soft_deleted)
+def listing_hidden(sender, listing, **kwargs):
+    similarity.listing_deleted(listing.listing_id)
+    locations.location_changed(listing.location, None)
+    search.location_changed(listing.location)
+
+
+@receiver(post_delete, sender=Listing)
+def listing_deleted(sender, instance, **kwargs):
+    similarity.listing_deleted(instance.listing_id)
+    # Soft-deleted listings already left the location index when hidden
+    if not instance.is_deleted:
+        locations.location_changed(instance.location, None)
+        search.location_changed(instance.location)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, **kwargs):
+    # Ratings feed the similarity features and search results. There is deliberately no
+    # post_delete receiver: it would stop purge batches and cascades from
+    # deleting reviews in one query. sync.delete_booking covers the API.
+    similarity.ratings_changed(instance.listing_id)
+    # Cached search results carry average_rating
+    search.location_changed(search.listing_location(instance))
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, **kwargs):
+    # New, rescheduled and canceled bookings all change availability. There is
+    # deliberately no post_delete receiver: it would stop archive and purge
+    # batches from deleting in one query. sync.delete_booking covers the API.
+    search.location_changed(search.listing_location(instance))
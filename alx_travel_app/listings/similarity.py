@@ -0,0 +1,229 @@
+import math
+import threading
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Avg
+
+from .models import Listing, Booking
+
+# NumPy is imported on first use (see is_available), so processes that never
+# serve similar listings don't pay for it at startup
+np = None
+
+FEATURES = ('price_per_night', 'bedrooms', 'bathrooms', 'max_guests', 'average_rating')
+# Relative importance of each standardized feature in the distance
+FEATURE_WEIGHTS = (2.0, 1.0, 0.5, 1.0, 0.5)
+# Distance bonus per log-count of guests who booked both listings
+COBOOKING_WEIGHT = 0.5
+MAX_COBOOKED = 20
+# Cap per guest so a few frequent travellers don't dominate the pair count
+MAX_BOOKINGS_PER_GUEST = 50
+
+
+class SimilarityIndex:
+    """
+    In-memory nearest-neighbour index over listing feature vectors.
+
+    Each listing is a row of a float32 matrix of standardized, weighted
+    features (log price, bedrooms, bathrooms, max guests, rating) plus an
+    integer location code. A query scans only the rows sharing the
+    listing's location, falling back to all rows for sparse locations,
+    and boosts listings co-booked by the same guests. Rows are updated in
+    place as listings change; standardization stats are fixed at build
+    time, so rebuild periodically with build_similarity_index.
+    """
+
+    def __init__(self):
+        if not is_available():
+            raise ImproperlyConfigured('NumPy is required for the similarity index')
+        self.lock = threading.RLock()
+        self.ids = []
+        self.rows = {}
+        self.location_codes = {}
+        self.size = 0
+        self.matrix = np.zeros((0, len(FEATURES)), dtype=np.float32)
+        self.locations = np.zeros(0, dtype=np.int32)
+        self.active = np.zeros(0, dtype=bool)
+        self.mean = np.zeros(len(FEATURES), dtype=np.float32)
+        self.scale = np.ones(len(FEATURES), dtype=np.float32)
+        self.cobooked = {}
+
+    @staticmethod
+    def raw_features(price_per_night, bedrooms, bathrooms, max_guests, average_rating):
+        return (math.log1p(float(price_per_night)), bedrooms, bathrooms, max_guests, float(average_rating or 0))
+
+    @classmethod
+    def build(cls):
+        """Build the index from one aggregate listing query and one booking query"""
+        index = cls()
+        ids, locations, raw = [], [], []
+        queryset = Listing.objects.annotate(rating=Avg('reviews__rating')).order_by().values_list(
+            'listing_id', 'location', 'price_per_night', 'bedrooms', 'bathrooms', 'max_guests', 'rating'
+        )
+        for listing_id, location, *features in queryset.iterator(chunk_size=10000):
+            ids.append(listing_id)
+            locations.append(index.location_code(location))
+            raw.append(cls.raw_features(*features))
+
+        matrix = np.array(raw, dtype=np.float32).reshape(-1, len(FEATURES))
+        if len(matrix):
+            index.mean = matrix.mean(axis=0)
+            std = matrix.std(axis=0)
+            index.scale = np.asarray(FEATURE_WEIGHTS, dtype=np.float32) / np.where(std > 0, std, 1)
+        index.matrix = (matrix - index.mean) * index.scale
+        index.locations = np.array(locations, dtype=np.int32)
+        index.active = np.ones(len(ids), dtype=bool)
+        index.ids = ids
+        index.rows = {listing_id: row for row, listing_id in enumerate(ids)}
+        index.size = len(ids)
+        index.cobooked = index.build_cobooked()
+        return index
+
+    def build_cobooked(self):
+        """Top co-booked listing rows per row, from distinct (guest, listing) pairs"""
+        per_guest = defaultdict(list)
+        pairs = Booking.objects.exclude(status='canceled').order_by().values_list('guest_id', 'listing_id').distinct()
+        for guest_id, listing_id in pairs.iterator(chunk_size=10000):
+            row = self.rows.get(listing_id)
+            if row is not None and len(per_guest[guest_id]) < MAX_BOOKINGS_PER_GUEST:
+                per_guest[guest_id].append(row)
+
+        counts = defaultdict(Counter)
+        for rows in per_guest.values():
+            for a, b in combinations(rows, 2):
+                counts[a][b] += 1
+                counts[b][a] += 1
+        return {
+            row: dict(counter.most_common(MAX_COBOOKED)) for row, counter in counts.items()
+        }
+
+    def location_code(self, location):
+        return self.location_codes.setdefault(location, len(self.location_codes))
+
+    def _grow(self):
+        capacity = max(16, len(self.matrix) * 2)
+        matrix = np.zeros((capacity, len(FEATURES)), dtype=np.float32)
+        matrix[:self.size] = self.matrix[:self.size]
+        locations = np.zeros(capacity, dtype=np.int32)
+        locations[:self.size] = self.locations[:self.size]
+        active = np.zeros(capacity, dtype=bool)
+        active[:self.size] = self.active[:self.size]
+        self.matrix, self.locations, self.active = matrix, locations, active
+
+    def upsert(self, listing_id, location, *features):
+        """Insert or update one listing's row in place"""
+        vector = (np.asarray(self.raw_features(*features), dtype=np.float32) - self.mean) * self.scale
+        with self.lock:
+            row = self.rows.get(listing_id)
+            if row is None:
+                if self.size == len(self.matrix):
+                    self._grow()
+                row = self.size
+                self.size += 1
+                self.ids.append(listing_id)
+                self.rows[listing_id] = row
+            self.matrix[row] = vector
+            self.locations[row] = self.location_code(location)
+            self.active[row] = True
+
+    def remove(self, listing_id):
+        with self.lock:
+            row = self.rows.get(listing_id)
+            if row is not None:
+                self.active[row] = False
+
+    def similar(self, listing_id, limit=10):
+        """Ids of the `limit` listings most similar to `listing_id`, best first"""
+        with self.lock:
+            row = self.rows.get(listing_id)
+            if row is None:
+                raise KeyError(listing_id)
+            size = self.size
+            active = self.active[:size].copy()
+            active[row] = False
+            candidates = np.flatnonzero(active & (self.locations[:size] == self.locations[row]))
+            if len(candidates) < limit:
+                candidates = np.flatnonzero(active)
+            cobooked = self.cobooked.get(row, {})
+            if cobooked:
+                extra = np.fromiter(cobooked, dtype=np.int64, count=len(cobooked))
+                candidates = np.union1d(candidates, extra[active[extra]])
+            if not len(candidates):
+                return []
+
+            diff = self.matrix[candidates] - self.matrix[row]
+            scores = np.einsum('ij,ij->i', diff, diff)
+            for position in np.flatnonzero(np.isin(candidates, list(cobooked))):
+                scores[position] -= COBOOKING_WEIGHT * math.log1p(cobooked[int(candidates[position])])
+
+            top = min(limit, len(candidates))
+            best = np.argpartition(scores, top - 1)[:top]
+            best = best[np.argsort(scores[best])]
+            return [self.ids[int(candidates[i])] for i in best]
+
+    def memory_bytes(self):
+        """Approximate memory held by the index arrays and lookup tables"""
+        arrays = self.matrix.nbytes + self.locations.nbytes + self.active.nbytes
+        # Rough per-entry costs of the Python-side id list and dicts
+        tables = len(self.ids) * (8 + 56) + len(self.rows) * 100 + len(self.location_codes) * 150
+        cobooked = sum(100 + 70 * len(entry) for entry in self.cobooked.values())
+        return arrays + tables + cobooked
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def is_available():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover - optional dependency
+            return False
+        np = numpy
+    return True
+
+
+def get_index():
+    """The process-wide index, built on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SimilarityIndex.build()
+    return _index
+
+
+def reset_index(index=None):
+    global _index
+    _index = index
+
+
+def listing_changed(listing):
+    """Keep a built index current after a Listing save"""
+    if _index is None:
+        return
+    if listing.is_deleted:
+        _index.remove(listing.listing_id)
+        return
+    rating = listing.reviews.aggregate(rating=Avg('rating'))['rating']
+    _index.upsert(
+        listing.listing_id, listing.location, listing.price_per_night,
+        listing.bedrooms, listing.bathrooms, listing.max_guests, rating
+    )
+
+
+def ratings_changed(*listing_ids):
+    """Refresh listings whose reviews changed; costs nothing until the index is built"""
+    if _index is None:
+        return
+    for listing in Listing.all_objects.filter(pk__in=listing_ids):
+        listing_changed(listing)
+
+
+def listing_deleted(listing_id):
+    if _index is not None:
+        _index.remove(listing_id)
@@ -0,0 +1,116 @@
+from datetime import datetime, time as dt_time, timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import BookingStatusTransition, ArchivedStatusTransition
+
+STATUS_CODES = {None: 0, 'pending': 1, 'confirmed': 2, 'canceled': 3, 'completed': 4}
+STATUS_NAMES = {code: status for status, code in STATUS_CODES.items()}
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_BATCH_SIZE = 5000
+TRANSITION_FIELDS = ('id', 'booking_id', 'from_status', 'to_status', 'changed_at', 'guest_id', 'host_id')
+
+
+def record_transition(booking_id, from_status, to_status, changed_at=None, guest_id=None, host_id=None):
+    """
+    Append one status change. Call inside the transaction that writes the
+    booking, so the log has the change if and only if it commits.
+    `from_status` is None for a new booking, whose row also records the
+    guest and host allowed to read the history.
+    """
+    return BookingStatusTransition.objects.create(
+        booking_id=booking_id,
+        from_status=STATUS_CODES[from_status],
+        to_status=STATUS_CODES[to_status],
+        changed_at=changed_at or timezone.now(),
+        guest_id=guest_id,
+        host_id=host_id,
+    )
+
+
+def booking_parties(booking_id):
+    """
+    The (guest_id, host_id) recorded with a booking's first transition, or
+    None. Kept in the log, so it holds after the booking is deleted.
+    """
+    for model in (ArchivedStatusTransition, BookingStatusTransition):
+        parties = model.objects.filter(
+            booking_id=booking_id, from_status=STATUS_CODES[None]
+        ).values_list('guest_id', 'host_id').first()
+        if parties is not None:
+            return parties
+    return None
+
+
+def booking_transitions(booking_id):
+    """
+    A booking's transitions, oldest first, as dicts with status names.
+    Reads the archive and the hot table through their (booking_id, id) indexes.
+    """
+    rows = []
+    for model in (ArchivedStatusTransition, BookingStatusTransition):
+        rows += model.objects.filter(booking_id=booking_id).order_by('id').values(
+            'from_status', 'to_status', 'changed_at'
+        )
+    for row in rows:
+        row['from_status'] = STATUS_NAMES[row['from_status']]
+        row['to_status'] = STATUS_NAMES[row['to_status']]
+    return rows
+
+
+def transitions_per_day(start, end):
+    """
+    Count transitions per day and new status for days in [start, end),
+    in the current time zone. Each table is read by a range scan of its
+    (changed_at, to_status) index.
+    """
+    lower = timezone.make_aware(datetime.combine(start, dt_time.min))
+    upper = timezone.make_aware(datetime.combine(end, dt_time.min))
+    counts = {}
+    for model in (ArchivedStatusTransition, BookingStatusTransition):
+        rows = model.objects.filter(changed_at__gte=lower, changed_at__lt=upper).annotate(
+            day=TruncDate('changed_at')
+        ).values('day', 'to_status').annotate(count=Count('id')).order_by()
+        for row in rows:
+            key = (row['day'], row['to_status'])
+            counts[key] = counts.get(key, 0) + row['count']
+    return [
+        {'day': day, 'status': STATUS_NAMES[code], 'count': count}
+        for (day, code), count in sorted(counts.items())
+    ]
+
+
+def rollover_cutoff(retention_days=DEFAULT_RETENTION_DAYS):
+    """Transitions before this moment move to the archive table"""
+    return timezone.now() - timedelta(days=retention_days)
+
+
+def rollover_batch(cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Move up to `batch_size` of the oldest transitions before `cutoff` into
+    the archive table in one transaction, keeping their ids so per-booking
+    order holds across both tables. Returns the number moved.
+    """
+    with transaction.atomic():
+        rows = list(
+            BookingStatusTransition.objects.filter(changed_at__lt=cutoff)
+            .order_by('changed_at').values(*TRANSITION_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+        ArchivedStatusTransition.objects.bulk_create(
+            [ArchivedStatusTransition(**row) for row in rows], ignore_conflicts=True
+        )
+        BookingStatusTransition.objects.filter(id__in=[row['id'] for row in rows]).delete()
+    return len(rows)
+
+
+def rollover(cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    """Roll over every transition before `cutoff`; returns the number moved"""
+    moved = 0
+    while count := rollover_batch(cutoff, batch_size):
+        moved += count
+    return moved
@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import outbox, search, similarity, status_log
+from .models import Tombstone
+from .pagination import cursor_values, decode_cursor, encode_cursor, keyset_filter
+
+
+class ResyncRequired(Exception):
+    """The client's watermark predates the retained tombstones"""
+
+
+def record_tombstones(model, object_ids):
+    """Insert tombstones for deleted rows in one statement"""
+    Tombstone.objects.bulk_create([
+        Tombstone(model=model, object_id=object_id) for object_id in object_ids
+    ])
+
+
+def delete_booking(booking):
+    """Delete a booking, leaving a tombstone"""
+    with transaction.atomic():
+        record_tombstones('booking', [booking.booking_id])
+        search.location_changed(search.listing_location(booking))
+        outbox.record_event('booking.canceled', booking, status='canceled', previous_status=booking.status)
+        if booking.status != 'canceled':
+            status_log.record_transition(booking.booking_id, booking.status, 'canceled')
+        booking.delete()
+        # The booking's review, if any, went with it
+        transaction.on_commit(lambda: similarity.ratings_changed(booking.listing_id))
+
+
+def decode_watermark(value):
+    """
+    Split a watermark into (updated_at, pk, tombstone sequence, issued_at).
+
+    An empty watermark starts a full sync.
+    """
+    if not value:
+        return None, None, 0, None
+    values = decode_cursor(value)
+    if len(values) != 4:
+        raise ValueError("Invalid watermark")
+    updated_at, pk, sequence, issued_at = values
+    issued_at = parse_datetime(issued_at) if isinstance(issued_at, str) else None
+    if issued_at is None or timezone.is_naive(issued_at) or not isinstance(sequence, int):
+        raise ValueError("Invalid watermark")
+    return updated_at, pk, sequence, issued_at
+
+
+def change_feed(queryset, model, watermark=None, limit=100):
+    """
+    Rows of `queryset` changed since `watermark`, plus ids deleted since then.
+
+    Rows are keyset-paginated on (updated_at, pk), which the
+    listing_updated_pk / booking_updated_pk indexes serve, and deletions on
+    the tombstone sequence. Rows updated within the last
+    LISTINGS_SYNC_SETTLE_SECONDS are held back so a transaction committing
+    late with an older updated_at is not skipped past. Returns a dict with
+    `rows`, `deleted`, the next `watermark` and `has_more`; raises
+    ResyncRequired once the watermark is older than the tombstone retention.
+    """
+    updated_at, pk, sequence, issued_at = decode_watermark(watermark)
+    pk_name = queryset.model._meta.pk.name
+    now = timezone.now()
+
+    retention = getattr(settings, 'LISTINGS_TOMBSTONE_RETENTION_DAYS', 30)
+    if issued_at is not None and issued_at < now - timedelta(days=retention):
+        raise ResyncRequired()
+
+    settle = getattr(settings, 'LISTINGS_SYNC_SETTLE_SECONDS', 1)
+    queryset = queryset.filter(updated_at__lte=now - timedelta(seconds=settle))
+    if updated_at is not None or pk is not None:
+        ordering = ['updated_at', pk_name]
+        try:
+            values = cursor_values(queryset.model, ordering, [updated_at, pk])
+        except ValueError:
+            raise ValueError("Invalid watermark")
+        queryset = queryset.filter(keyset_filter(ordering, values))
+    rows = list(queryset.order_by('updated_at', pk_name)[:limit + 1])
+
+    tombstones = list(
+        Tombstone.objects.filter(model=model, sequence__gt=sequence)
+        .order_by('sequence')
+        .values_list('sequence', 'object_id')[:limit + 1]
+    )
+
+    has_more = len(rows) > limit or len(tombstones) > limit
+    rows, tombstones = rows[:limit], tombstones[:limit]
+    if rows:
+        updated_at, pk = rows[-1].updated_at, getattr(rows[-1], pk_name)
+    if tombstones:
+        sequence = tombstones[-1][0]
+    return {
+        'rows': rows,
+        'deleted': [object_id for _, object_id in tombstones],
+        'watermark': encode_cursor([updated_at, pk, sequence, now]),
+        'has_more': has_more,
+    }
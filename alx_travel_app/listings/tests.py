@@ -1,3 +1,1420 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from io import StringIO
+from datetime import date, timedelta
+from unittest import mock, skipUnless
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import DatabaseError, connection, connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import archive, calendars, compression, docs, locations, outbox, popularity, profiling, reports, routers, schema, search, similarity, status_log, uuids
+from .fixtures import MODELS
+from .deletion import purge_listing_batch, run_pending_purges, soft_delete_listing
+from .pagination import encode_cursor
+from .serializers import ListingSerializer
+from .throttling import TokenBucketLimiter, get_limiter, reset_limiter
+from .models import Listing, Booking, Review, OutboxEvent, ListingViewStats, ArchivedBooking, BlockedDateRange, CalendarFeed, BookingStatusTransition, ArchivedStatusTransition
+
+# Replica routing tests need a second database, like the SQLite setup in the README
+HAS_REPLICA = 'replica' in settings.DATABASES
+
+
+class BookingTestCase(TransactionTestCase):
+    """A host, a guest and a listing, with an authenticated client for the guest"""
+    databases = {'default', 'replica'} if HAS_REPLICA else {'default'}
+
+    def setUp(self):
+        self.host = User.objects.create_user('host', password='password123')
+        self.guest = User.objects.create_user('guest', password='password123')
+        self.listing = Listing.objects.create(
+            host=self.host,
+            title='Cozy Apartment in Austin',
+            description='Comfortable and clean.',
+            location='Austin, TX',
+            price_per_night=Decimal('120.00'),
+            bedrooms=2,
+            bathrooms=1,
+            max_guests=4,
+            available_from=date.today(),
+            available_to=date.today() + timedelta(days=90),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.guest)
+        self.url = reverse('booking-list-create')
+
+    def booking_data(self, **overrides):
+        data = {
+            'listing_id': str(self.listing.listing_id),
+            'check_in_date': str(date.today() + timedelta(days=5)),
+            'check_out_date': str(date.today() + timedelta(days=8)),
+            'number_of_guests': 2,
+        }
+        data.update(overrides)
+        return data
+
+
+class BookingCreateTests(BookingTestCase):
+    """Booking POST loads the listing once and inserts without refetching"""
+
+    def test_create_uses_fixed_number_of_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, self.booking_data(), format='json')
+        self.assertEqual(response.status_code, 201)
+        # One SELECT for the listing, one for blocked dates, one INSERT for the
+        # booking, one for its outbox event and one for its status log row;
+        # transaction control statements vary by backend and are not counted
+        statements = [
+            query['sql'] for query in ctx.captured_queries
+            if not query['sql'].startswith(('BEGIN', 'COMMIT', 'SAVEPOINT', 'RELEASE SAVEPOINT'))
+        ]
+        self.assertEqual(len(statements), 5, statements)
+        self.assertTrue(all(statement.startswith('SELECT') for statement in statements[:2]))
+        self.assertTrue(all(statement.startswith('INSERT') for statement in statements[2:]))
+
+    def test_create_calculates_total_price(self):
+        response = self.client.post(self.url, self.booking_data(), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_price'], '360.00')
+        self.assertEqual(response.data['listing'], self.listing.listing_id)
+        booking = Booking.objects.get()
+        self.assertEqual(booking.guest, self.guest)
+        self.assertEqual(booking.total_price, Decimal('360.00'))
+
+    def test_create_rejects_too_many_guests(self):
+        response = self.client.post(self.url, self.booking_data(number_of_guests=5), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_create_rejects_unknown_listing(self):
+        response = self.client.post(
+            self.url, self.booking_data(listing_id='00000000-0000-0000-0000-000000000000'), format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('listing_id', response.data)
+
+
+class SparseFieldsetTests(BookingTestCase):
+    """?fields= prunes nested serializers and the columns queried for them"""
+
+    # Read from the primary so every query is captured on one connection
+    @override_settings(LISTINGS_READ_REPLICAS=[])
+    def test_dotted_field_prunes_host(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('listing-list-create'), {'fields': 'title,host.username'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{'title': 'Cozy Apartment in Austin', 'host': {'username': 'host'}}])
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertIn('"auth_user"."username"', sql)
+        for column in ('"auth_user"."email"', '"auth_user"."first_name"', '"listings"."description"'):
+            self.assertNotIn(column, sql)
+
+
+@override_settings(LISTINGS_READ_REPLICAS=[])
+class MultiGetTests(BookingTestCase):
+    """?ids= batch endpoints keep request order and report ids they can't return"""
+
+    def make_listings(self, count):
+        return Listing.objects.bulk_create([
+            Listing(host=self.host, title=f'Loft {n}', description='Bright', location='Austin, TX',
+                    price_per_night=Decimal('99.00'), bedrooms=1, bathrooms=1, max_guests=2,
+                    available_from=date.today(), available_to=date.today() + timedelta(days=30))
+            for n in range(count)
+        ])
+
+    def get(self, ids, **params):
+        return self.client.get(reverse('listing-multi-get'), {'ids': ','.join(map(str, ids)), **params})
+
+    def test_results_follow_request_order(self):
+        listings = self.make_listings(3)
+        ids = [listings[2].listing_id, self.listing.listing_id, listings[0].listing_id, listings[2].listing_id]
+        response = self.get(ids, fields='listing_id')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['listing_id'] for row in response.data['results']], [str(pk) for pk in ids[:3]])
+        self.assertEqual(response.data['missing'], [])
+
+    def test_unknown_and_malformed_ids_are_missing(self):
+        unknown = uuid.uuid4()
+        response = self.get([unknown, self.listing.listing_id, 'not-a-uuid'], fields='title')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [{'title': 'Cozy Apartment in Austin'}])
+        self.assertEqual(response.data['missing'], [str(unknown), 'not-a-uuid'])
+
+    def test_id_count_is_capped(self):
+        self.assertEqual(self.get([]).status_code, 400)
+        self.assertEqual(self.get([uuid.uuid4() for _ in range(101)]).status_code, 400)
+        self.assertEqual(self.get([uuid.uuid4() for _ in range(100)]).status_code, 200)
+
+    def test_query_count_does_not_grow_with_ids(self):
+        listings = self.make_listings(10)
+        counts = []
+        for batch in (listings[:1], listings):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.get([listing.listing_id for listing in batch])
+            self.assertEqual(len(response.data['results']), len(batch))
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+        bookings = [
+            self.client.post(self.url, self.booking_data(check_in_date=str(date.today() + timedelta(days=start)),
+                                                         check_out_date=str(date.today() + timedelta(days=start + 2))),
+                             format='json').data['booking_id']
+            for start in (5, 10, 15)
+        ]
+        counts = []
+        for batch in (bookings[:1], bookings):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('booking-multi-get'), {'ids': ','.join(map(str, batch))})
+            self.assertEqual(len(response.data['results']), len(batch))
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+class IdempotencyKeyTests(BookingTestCase):
+    """A repeated Idempotency-Key replays the first response instead of booking again"""
+
+    def test_retry_replays_response(self):
+        first = self.client.post(self.url, self.booking_data(), format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        retry = self.client.post(self.url, self.booking_data(), format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['booking_id'], str(first.data['booking_id']))
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_key_reused_for_different_request(self):
+        self.client.post(self.url, self.booking_data(), format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        response = self.client.post(
+            self.url, self.booking_data(number_of_guests=3), format='json', HTTP_IDEMPOTENCY_KEY='abc'
+        )
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_key_reused_with_different_query_string(self):
+        self.client.post(self.url, self.booking_data(), format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        response = self.client.post(
+            self.url + '?expand=listing', self.booking_data(), format='json', HTTP_IDEMPOTENCY_KEY='abc'
+        )
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+@skipUnless(HAS_REPLICA, 'needs a second database aliased "replica"')
+@override_settings(DATABASE_ROUTERS=['listings.routers.ReadReplicaRouter'], LISTINGS_READ_REPLICAS=['replica'])
+class ReadReplicaTests(BookingTestCase):
+    """GETs read from a healthy replica; writes, locks and a client's own recent writes use the primary"""
+
+    def setUp(self):
+        super().setUp()
+        routers._lag_cache.clear()
+        cache.clear()
+        # GETs only check which alias served them: a replica that isn't a test mirror is empty
+        self.detail = reverse('listing-detail', args=[self.listing.listing_id])
+        # A healthy replica; tests patch this again to simulate lag or an outage
+        patcher = mock.patch.object(routers, 'measure_lag', return_value=0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, client, method, path, *args, **kwargs):
+        """Make a request; return its status code and the aliases that ran queries for it"""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(client, method)(path, *args, **kwargs)
+        aliases = {alias for alias, ctx in (('default', primary), ('replica', replica)) if ctx.captured_queries}
+        return response.status_code, aliases
+
+    def test_get_reads_from_replica(self):
+        self.assertEqual(self.request(self.client, 'get', self.detail)[1], {'replica'})
+
+    def test_writes_use_primary(self):
+        status_code, aliases = self.request(self.client, 'post', self.url, self.booking_data(), format='json')
+        self.assertEqual((status_code, aliases), (201, {'default'}))
+        booking = reverse('booking-detail', args=[Booking.objects.get().booking_id])
+        data = dict(self.booking_data(), status='confirmed')
+        self.assertEqual(self.request(self.client, 'put', booking, data, format='json'), (200, {'default'}))
+        self.assertEqual(self.request(self.client, 'delete', booking), (204, {'default'}))
+        self.assertEqual(self.request(self.client, 'delete', self.detail), (202, {'default'}))
+
+    def test_locking_reads_use_primary(self):
+        @routers.read_from_replica
+        def view(request):
+            return Listing.objects.all().db, Listing.objects.select_for_update().db
+        self.assertEqual(view(mock.Mock(method='GET', user=self.host, META={})), ('replica', 'default'))
+
+    @override_settings(LISTINGS_REPLICA_STICKY_SECONDS=60)
+    def test_booking_pins_client_to_primary_until_expiry(self):
+        self.client.post(self.url, self.booking_data(), format='json')
+        self.assertEqual(self.request(self.client, 'get', self.detail)[1], {'default'})
+        # Other clients still read from the replica
+        other = APIClient()
+        other.force_authenticate(self.host)
+        self.assertEqual(self.request(other, 'get', self.detail)[1], {'replica'})
+
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + 61):
+            self.assertEqual(self.request(self.client, 'get', self.detail)[1], {'replica'})
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        with mock.patch.object(routers, 'measure_lag', return_value=30.0):
+            self.assertEqual(self.request(self.client, 'get', self.detail)[1], {'default'})
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        with mock.patch.object(routers, 'measure_lag', side_effect=DatabaseError('connection refused')):
+            self.assertEqual(self.request(self.client, 'get', self.detail)[1], {'default'})
+        # Remembered as infinitely behind until the next lag check
+        self.assertEqual(routers._lag_cache['replica'][1], float('inf'))
+
+class ThrottlingTests(BookingTestCase):
+    """Per-IP and per-user token buckets, separate for reads and writes"""
+
+    def setUp(self):
+        super().setUp()
+        self.now = 0.0
+        reset_limiter(TokenBucketLimiter({'read': (1.0, 2), 'write': (1.0, 1)}, clock=lambda: self.now))
+        self.addCleanup(reset_limiter)
+        self.detail = reverse('listing-detail', args=[self.listing.listing_id])
+
+    def test_over_budget_gets_429_with_retry_after(self):
+        self.assertEqual(self.client.get(self.detail).status_code, 200)
+        self.assertEqual(self.client.get(self.detail).status_code, 200)
+        response = self.client.get(self.detail)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_read_and_write_budgets_are_independent(self):
+        self.client.get(self.detail)
+        self.client.get(self.detail)
+        self.assertEqual(self.client.post(self.url, self.booking_data(), format='json').status_code, 201)
+        self.assertEqual(self.client.post(self.url, self.booking_data(), format='json').status_code, 429)
+        self.assertEqual(self.client.get(self.detail).status_code, 429)
+
+    def test_buckets_refill_over_time(self):
+        for _ in range(3):
+            self.client.get(self.detail)
+        self.now += 1.0
+        self.assertEqual(self.client.get(self.detail).status_code, 200)
+        self.assertEqual(self.client.get(self.detail).status_code, 429)
+
+    def test_users_share_their_ip_budget(self):
+        self.client.get(self.detail)
+        self.client.get(self.detail)
+        # Same IP, different user: the IP bucket is empty
+        other = APIClient()
+        other.force_authenticate(self.host)
+        self.assertEqual(other.get(self.detail).status_code, 429)
+        # Same user, different IP: the user bucket is empty
+        self.assertEqual(self.client.get(self.detail, REMOTE_ADDR='10.0.0.2').status_code, 429)
+
+    def test_metrics_count_decisions(self):
+        for _ in range(3):
+            self.client.get(self.detail)
+        self.client.post(self.url, self.booking_data(), format='json')
+        metrics = get_limiter().metrics()
+        self.assertEqual(metrics['decisions']['read'], {'allowed': 2, 'rejected': 1})
+        self.assertEqual(metrics['decisions']['write'], {'allowed': 1, 'rejected': 0})
+        self.assertEqual(metrics['limits']['read'], {'rate': 1.0, 'burst': 2})
+
+
+class CompressionTests(BookingTestCase):
+    """Accept-Encoding negotiation, the compressed body cache and streaming compression"""
+
+    def setUp(self):
+        super().setUp()
+        compression.reset_cache(compression.CompressedBodyCache())
+        self.addCleanup(compression.reset_cache)
+
+    def test_negotiation_follows_q_values(self):
+        cases = {
+            'gzip, br;q=0.5': 'gzip',
+            'gzip;q=0.5, br;q=0.5, zstd;q=0.5': 'zstd',
+            'br;q=0.9, zstd;q=0.1': 'br',
+            '*': 'zstd',
+            '*;q=0.5, zstd;q=0': 'br',
+            'gzip;q=0': None,
+            '*;q=0': None,
+            'identity;q=0, *;q=0': None,
+            'identity': None,
+            '': None,
+            # Identity refused: fall back to a coding the client didn't refuse
+            'identity;q=0': 'zstd',
+            'identity;q=0, zstd;q=0': 'br',
+        }
+        with mock.patch.object(compression, 'available_encodings', return_value=('zstd', 'br', 'gzip')):
+            for header, expected in cases.items():
+                self.assertEqual(compression.negotiate(header), expected, header)
+        with mock.patch.object(compression, 'available_encodings', return_value=('gzip',)):
+            self.assertEqual(compression.negotiate('zstd, br;q=0.9, gzip;q=0.1'), 'gzip')
+
+    def test_large_bodies_are_compressed_once(self):
+        Listing.objects.bulk_create([
+            Listing(host=self.host, title=f'Loft {n}', description='Bright and quiet. ' * 10, location='Austin, TX',
+                    price_per_night=Decimal('99.00'), bedrooms=1, bathrooms=1, max_guests=2, available_from=date.today(),
+                    available_to=date.today() + timedelta(days=30))
+            for n in range(10)
+        ])
+        url = reverse('listing-list-create')
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        for _ in range(2):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn('Accept-Encoding', response['Vary'])
+            self.assertEqual(gzip.decompress(response.content), plain.content)
+        stats = compression.get_cache().stats()
+        self.assertEqual((stats['cache']['misses'], stats['cache']['hits']), (1, 1))
+        self.assertEqual(stats['encodings']['gzip']['responses'], 2)
+
+    def test_small_bodies_are_left_alone(self):
+        response = self.client.get(reverse('listing-detail', args=[self.listing.listing_id]),
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_encoded_response_gets_weak_etag(self):
+        response = HttpResponse(b'{"a": 1}' * 500, content_type='application/json')
+        response['ETag'] = '"abc"'
+        compression.compress_response(response, 'gzip')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertEqual(gzip.decompress(response.content), b'{"a": 1}' * 500)
+
+    def test_streaming_responses_are_compressed_in_chunks(self):
+        chunks = [f'line {n}\n'.encode() * 50 for n in range(20)]
+        response = StreamingHttpResponse(iter(chunks), content_type='text/calendar')
+        compression.compress_response(response, 'gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(chunks))
+
+        response = self.client.get(reverse('listing-ical', args=[self.listing.listing_id]), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(gzip.decompress(b''.join(response.streaming_content)).startswith(b'BEGIN:VCALENDAR'))
+
+
+class BookingArchiveTests(BookingTestCase):
+    """Old completed and canceled bookings move to the archive table intact"""
+
+    def make_booking(self, days_ago, status, guest=None):
+        check_out = date.today() - timedelta(days=days_ago)
+        booking = Booking.objects.create(
+            listing=self.listing, guest=guest or self.guest, check_in_date=check_out - timedelta(days=3),
+            check_out_date=check_out, number_of_guests=2, total_price=Decimal('360.00'), status=status,
+        )
+        # Archived rows must keep the original timestamps, not the time of the move
+        stamp = timezone.now() - timedelta(days=days_ago + 30)
+        Booking.objects.filter(pk=booking.pk).update(created_at=stamp, updated_at=stamp + timedelta(hours=1))
+        return booking
+
+    def hot_rows(self, *bookings):
+        return {
+            row['booking_id']: row
+            for row in Booking.objects.filter(pk__in=[b.pk for b in bookings]).values(*archive.ARCHIVED_FIELDS)
+        }
+
+    def test_archives_eligible_bookings_exactly(self):
+        completed, canceled = self.make_booking(400, 'completed'), self.make_booking(500, 'canceled')
+        kept = [self.make_booking(400, 'confirmed'), self.make_booking(100, 'completed')]
+        review = Review.objects.create(listing=self.listing, guest=self.guest, booking=completed, rating=5, comment='Lovely.')
+        expected = self.hot_rows(completed, canceled)
+
+        self.assertEqual(archive.archive_bookings(archive.archive_cutoff(365), batch_size=1), 2)
+        archived = {
+            row['booking_id']: row
+            for row in ArchivedBooking.objects.values(*archive.ARCHIVED_FIELDS)
+        }
+        self.assertEqual(archived, expected)
+        self.assertEqual(set(Booking.objects.values_list('pk', flat=True)), {booking.pk for booking in kept})
+
+        # The review survives, detached from the booking but recorded on the archived row
+        review.refresh_from_db()
+        self.assertIsNone(review.booking_id)
+        self.assertEqual(ArchivedBooking.objects.get(pk=completed.pk).review_id, review.pk)
+        self.assertIsNone(ArchivedBooking.objects.get(pk=canceled.pk).review_id)
+        self.assertEqual(archive.archive_batch(archive.archive_cutoff(365)), 0)
+
+    def test_failed_delete_rolls_back_copy(self):
+        booking = self.make_booking(400, 'completed')
+        review = Review.objects.create(listing=self.listing, guest=self.guest, booking=booking, rating=4, comment='Good.')
+        with mock.patch('django.db.models.query.QuerySet.delete', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                archive.archive_batch(archive.archive_cutoff(365))
+        self.assertFalse(ArchivedBooking.objects.exists())
+        self.assertTrue(Booking.objects.filter(pk=booking.pk).exists())
+        review.refresh_from_db()
+        self.assertEqual(review.booking_id, booking.pk)
+
+    def test_archive_endpoint_reads_back_own_bookings(self):
+        older, newer = self.make_booking(500, 'completed'), self.make_booking(400, 'canceled')
+        self.make_booking(450, 'completed', guest=self.host)
+        archive.archive_bookings(archive.archive_cutoff(365))
+
+        response = self.client.get(reverse('booking-archive'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['booking_id'] for row in response.data['results']], [str(newer.pk), str(older.pk)])
+        self.assertEqual(response.data['results'][0]['status'], 'canceled')
+        self.assertEqual(response.data['results'][0]['total_price'], '360.00')
+
+        page = self.client.get(reverse('booking-archive'), {'limit': 1})
+        self.assertEqual(len(page.data['results']), 1)
+        rest = self.client.get(reverse('booking-archive'), {'limit': 1, 'cursor': page.data['next_cursor']})
+        self.assertEqual(rest.data['results'][0]['booking_id'], str(older.pk))
+
+
+class UUIDTests(BookingTestCase):
+    """Primary keys are UUIDv4 or time-ordered UUIDv7, and routes only match well-formed ids"""
+
+    @mock.patch.object(uuids, '_counter', 0)
+    @mock.patch.object(uuids, '_last_ms', 0)
+    def test_uuid7_is_monotonic_within_a_millisecond(self):
+        now_ms = 1_750_000_000_000
+        # All-ones randomness starts the counter at its highest seed, 0x7FF, so it rolls over quickly
+        with mock.patch.object(uuids.time, 'time_ns', return_value=now_ms * 1_000_000), \
+                mock.patch.object(uuids.os, 'urandom', side_effect=lambda n: b'\xff' * n):
+            ids = [uuids.uuid7() for _ in range(0x1000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        timestamps = [value.int >> 80 for value in ids]
+        # 0x7FF..0xFFF fit in the current millisecond; the rest borrow the next one
+        self.assertEqual(timestamps.count(now_ms), 0x801)
+        self.assertEqual(set(timestamps[0x801:]), {now_ms + 1})
+        self.assertEqual((ids[0x801].int >> 64) & 0xFFF, 0)
+
+    def test_uuid7_version_and_variant(self):
+        before = time.time_ns() // 1_000_000
+        value = uuids.uuid7()
+        after = time.time_ns() // 1_000_000
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+        self.assertLessEqual(before, value.int >> 80)
+        self.assertLessEqual(value.int >> 80, after + 1)
+
+    def test_setting_selects_version_for_new_rows(self):
+        self.assertEqual(self.listing.listing_id.version, 4)
+        with override_settings(LISTINGS_UUID_VERSION=7):
+            response = self.client.post(self.url, self.booking_data(), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(uuid.UUID(str(response.data['booking_id'])).version, 7)
+        self.assertEqual(uuids.generate_id().version, 4)
+
+    def test_malformed_ids_in_routes_are_not_found(self):
+        for url in (
+            reverse('listing-list-create') + 'not-a-uuid/',
+            reverse('booking-list-create') + '12345/',
+            reverse('booking-list-create') + str(uuid.uuid4())[:-1] + 'z/transitions/',
+        ):
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+        self.assertEqual(self.client.get(reverse('listing-detail', args=[uuid.uuid4()])).status_code, 404)
+
+
+class ProfilingTests(BookingTestCase):
+    """Profiled requests write collapsed stacks per view, one sampler at a time"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(
+            LISTINGS_PROFILE_DIR=self.directory, LISTINGS_PROFILE_TOKEN='secret', LISTINGS_PROFILE_INTERVAL=0.001
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.request = RequestFactory().get('/', HTTP_X_PROFILE='secret')
+
+    def wait_for_sampler(self):
+        # The sampler releases the lock once its stacks are written
+        self.assertTrue(profiling._busy.acquire(timeout=5))
+        profiling._busy.release()
+
+    def test_stacks_are_written_per_view(self):
+        @profiling.profiled
+        def slow_view(request):
+            time.sleep(0.05)
+            return HttpResponse('ok')
+
+        slow_view(self.request)
+        slow_view(RequestFactory().get('/', HTTP_X_PROFILE='wrong'))
+        self.wait_for_sampler()
+        self.assertEqual(os.listdir(self.directory), ['slow_view.folded'])
+        with open(os.path.join(self.directory, 'slow_view.folded')) as handle:
+            lines = handle.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+        self.assertTrue(any('slow_view' in line for line in lines))
+
+    def test_overlapping_requests_share_one_sampler(self):
+        @profiling.profiled
+        def inner_view(request):
+            return HttpResponse('inner')
+
+        @profiling.profiled
+        def outer_view(request):
+            # A second request arriving while this one is being profiled
+            results = []
+            thread = threading.Thread(target=lambda: results.append(inner_view(self.request)))
+            thread.start()
+            thread.join()
+            time.sleep(0.01)
+            return results[0]
+
+        with mock.patch.object(profiling, 'Sampler', wraps=profiling.Sampler) as sampler:
+            self.assertEqual(outer_view(self.request).content, b'inner')
+            self.wait_for_sampler()
+        self.assertEqual(sampler.call_count, 1)
+        self.assertEqual(os.listdir(self.directory), ['outer_view.folded'])
+
+    def test_frame_labels(self):
+        label = profiling.frame_label(sys._getframe())
+        self.assertEqual(label, f'{__name__}:ProfilingTests.test_frame_labels')
+        # Code objects without co_qualname (Python < 3.11) fall back to co_name
+        frame = SimpleNamespace(
+            f_code=SimpleNamespace(co_name='handler', co_argcount=0, co_varnames=()),
+            f_globals={'__name__': 'app.views'}, f_locals={},
+        )
+        self.assertEqual(profiling.frame_label(frame), 'app.views:handler')
+
+
+class BookingHistoryPaginationTests(BookingTestCase):
+    """Guest history pages with opaque keyset cursors"""
+
+    def test_cursor_round_trip_returns_every_booking_once(self):
+        for offset in (5, 10, 15):
+            Booking.objects.create(
+                listing=self.listing, guest=self.guest, number_of_guests=2, total_price=Decimal('240.00'),
+                check_in_date=date.today() + timedelta(days=offset),
+                check_out_date=date.today() + timedelta(days=offset + 2),
+            )
+        url = reverse('booking-history')
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(url, {'limit': 2, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            seen += [row['check_in_date'] for row in response.data['results']]
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, sorted(str(date.today() + timedelta(days=offset)) for offset in (5, 10, 15)))
+
+    def test_tampered_cursor_is_rejected(self):
+        # Well-formed base64 JSON whose values don't fit the ordering fields
+        for cursor in ('WyJ4IiwgIjEiXQ', encode_cursor(['2025-01-01', 'not-a-uuid']), 'not base64!'):
+            for name in ('booking-history', 'booking-archive'):
+                response = self.client.get(reverse(name), {'cursor': cursor})
+                self.assertEqual(response.status_code, 400, (name, cursor))
+
+
+@override_settings(LISTINGS_SYNC_SETTLE_SECONDS=0)
+class ChangeFeedTests(BookingTestCase):
+    """Change feeds resume from a watermark and report deletions"""
+
+    def test_watermark_resumes_and_reports_deletions(self):
+        booking = Booking.objects.create(
+            listing=self.listing, guest=self.guest, number_of_guests=2, total_price=Decimal('360.00'),
+            check_in_date=date.today() + timedelta(days=5), check_out_date=date.today() + timedelta(days=8),
+        )
+        url = reverse('booking-changes')
+        response = self.client.get(url)
+        self.assertEqual([row['booking_id'] for row in response.data['results']], [str(booking.booking_id)])
+        watermark = response.data['watermark']
+
+        response = self.client.get(url, {'since': watermark})
+        self.assertEqual((response.data['results'], response.data['deleted']), ([], []))
+
+        self.client.delete(reverse('booking-detail', args=[booking.booking_id]))
+        response = self.client.get(url, {'since': watermark})
+        self.assertEqual(response.data['deleted'], [booking.booking_id])
+
+    def test_tampered_watermark_is_rejected(self):
+        now = timezone.now()
+        for watermark in (
+            encode_cursor(['yesterday', 'not-a-uuid', 0, now]),
+            encode_cursor([now, 'not-a-uuid', 0, now]),
+            encode_cursor([None, None, 0, '2024-02-30T00:00:00+00:00']),
+            encode_cursor([None, None, 0, '2024-01-01T00:00:00']),
+            'WyJ4IiwgIjEiXQ',
+        ):
+            response = self.client.get(reverse('listing-changes'), {'since': watermark})
+            self.assertEqual(response.status_code, 400, watermark)
+
+    def test_expired_watermark_requires_resync(self):
+        watermark = encode_cursor([None, None, 0, timezone.now() - timedelta(days=31)])
+        response = self.client.get(reverse('listing-changes'), {'since': watermark})
+        self.assertEqual(response.status_code, 410)
+
+
+class ReviewSignalTests(BookingTestCase):
+    """Review writes stay cheap while the similarity index is not built"""
+
+    def add_reviews(self, count):
+        guests = User.objects.bulk_create([User(username=f'reviewer{n}') for n in range(count)])
+        for guest in guests:
+            Review.objects.create(listing=self.listing, guest=guest, rating=4, comment='Nice.')
+
+    def test_review_save_runs_only_its_insert(self):
+        similarity.reset_index()
+        with CaptureQueriesContext(connection) as ctx:
+            Review.objects.create(listing=self.listing, guest=self.guest, rating=5, comment='Great stay.')
+        self.assertEqual(len(ctx.captured_queries), 1, [query['sql'] for query in ctx.captured_queries])
+
+    def test_purge_batch_deletes_reviews_in_bulk(self):
+        self.add_reviews(30)
+        purge = soft_delete_listing(self.listing)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertFalse(purge_listing_batch(purge, batch_size=100))
+        self.assertFalse(Review.objects.exists())
+        # Lock, count, select ids, one DELETE and the progress update; no per-review queries
+        self.assertLessEqual(len(ctx.captured_queries), 8, [query['sql'] for query in ctx.captured_queries])
+
+
+@skipUnless(similarity.is_available(), 'needs NumPy')
+class SimilarityTests(BookingTestCase):
+    """Similar listings rank by feature distance within a location, boosted by co-bookings"""
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(similarity.reset_index)
+
+    def make_listing(self, title, price, location='Austin, TX'):
+        return Listing.objects.create(
+            host=self.host, title=title, description='Comfortable and clean.', location=location,
+            price_per_night=Decimal(price), bedrooms=2, bathrooms=1, max_guests=4,
+            available_from=date.today(), available_to=date.today() + timedelta(days=90),
+        )
+
+    def build(self):
+        similarity.reset_index(similarity.SimilarityIndex.build())
+        return similarity.get_index()
+
+    def test_ranks_by_distance_within_location(self):
+        near, mid, far = self.make_listing('Near', '125'), self.make_listing('Mid', '400'), self.make_listing('Far', '1000')
+        twin = self.make_listing('Twin in Dallas', '120', location='Dallas, TX')
+        index = self.build()
+        self.assertEqual(index.similar(self.listing.listing_id, 3), [near.listing_id, mid.listing_id, far.listing_id])
+        # Too few listings in the location: every location is considered
+        self.assertEqual(index.similar(self.listing.listing_id, 4)[0], twin.listing_id)
+
+        # The view over-fetches by five, so four Austin listings are too few here too
+        response = self.client.get(reverse('listing-similar', args=[self.listing.listing_id]), {'limit': 2})
+        self.assertEqual([row['title'] for row in response.data['results']], ['Twin in Dallas', 'Near'])
+        missing = self.client.get(reverse('listing-similar', args=[uuid.uuid4()]))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_cobooked_listings_rank_higher(self):
+        near, cobooked = self.make_listing('Near', '125'), self.make_listing('Co-booked', '140')
+        self.make_listing('Far', '1000')
+        self.assertEqual(self.build().similar(self.listing.listing_id, 1), [near.listing_id])
+
+        guests = User.objects.bulk_create([User(username=f'traveller{n}') for n in range(2)])
+        for guest in guests:
+            for listing in (self.listing, cobooked):
+                Booking.objects.create(
+                    listing=listing, guest=guest, check_in_date=date.today(),
+                    check_out_date=date.today() + timedelta(days=1), number_of_guests=1, total_price=listing.price_per_night,
+                )
+        self.assertEqual(self.build().similar(self.listing.listing_id, 1), [cobooked.listing_id])
+
+    def test_saves_and_deletes_update_built_index(self):
+        near, far = self.make_listing('Near', '125'), self.make_listing('Far', '1000')
+        index = self.build()
+
+        closest = self.make_listing('Closest', '121')
+        self.assertEqual(index.similar(self.listing.listing_id, 1), [closest.listing_id])
+        closest.price_per_night = Decimal('900')
+        closest.save()
+        self.assertEqual(index.similar(self.listing.listing_id, 1), [near.listing_id])
+
+        soft_delete_listing(near)
+        far.delete()
+        self.assertEqual(index.similar(self.listing.listing_id, 5), [closest.listing_id])
+        self.assertIs(similarity.get_index(), index)
+
+
+class LocationAutocompleteTests(BookingTestCase):
+    """Location suggestions match word starts, stay current as listings move, and honour ?limit="""
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(locations.reset_index)
+
+    def make_listing(self, location):
+        return Listing.objects.create(
+            host=self.host, title=f'Home in {location}', description='Comfortable and clean.', location=location,
+            price_per_night=Decimal('100.00'), bedrooms=1, bathrooms=1, max_guests=2,
+            available_from=date.today(), available_to=date.today() + timedelta(days=90),
+        )
+
+    def move(self, listing, location):
+        listing.location = location
+        listing.save()
+
+    def test_prefix_matches_start_of_any_word(self):
+        index = locations.LocationIndex({'New York, NY': 3, 'Newark, NJ': 2, 'York, PA': 1, 'Austin, TX': 1})
+        self.assertEqual(index.search('new'), [('New York, NY', 3), ('Newark, NJ', 2)])
+        self.assertEqual(index.search('york'), [('New York, NY', 3), ('York, PA', 1)])
+        self.assertEqual(index.search('  NEW   york'), [('New York, NY', 3)])
+        self.assertEqual(index.search('nj'), [('Newark, NJ', 2)])
+        self.assertEqual(index.search('ork'), [])
+        self.assertEqual(index.search(''), [])
+
+    def test_limit_keeps_locations_with_most_listings(self):
+        index = locations.LocationIndex({'Austin, TX': 5, 'Aurora, CO': 7, 'Augusta, GA': 1})
+        self.assertEqual(index.search('au', 2), [('Aurora, CO', 7), ('Austin, TX', 5)])
+
+        locations.reset_index(index)
+        url = reverse('location-autocomplete')
+        response = self.client.get(url, {'q': 'au', 'limit': 1})
+        self.assertEqual(response.data['results'], [{'location': 'Aurora, CO', 'listings': 7}])
+        self.assertEqual(self.client.get(url, {'q': 'au', 'limit': 'many'}).status_code, 400)
+
+    @mock.patch.object(locations, 'CACHE_MIN_MATCHES', 0)
+    def test_memoized_results_follow_location_changes(self):
+        aurora = [self.make_listing('Aurora, CO') for _ in range(2)]
+        locations.reset_index(locations.LocationIndex.build())
+        index = locations.get_index()
+        self.assertEqual(index.search('au'), [('Aurora, CO', 2), ('Austin, TX', 1)])
+        self.assertIn(('au', 10), index.cache)
+
+        self.move(aurora[0], 'Austin, TX')
+        self.assertEqual(index.search('au'), [('Austin, TX', 2), ('Aurora, CO', 1)])
+        self.move(aurora[1], 'Boston, MA')
+        self.assertEqual(index.search('au'), [('Austin, TX', 2)])
+        self.assertEqual(index.search('bos'), [('Boston, MA', 1)])
+
+        soft_delete_listing(self.listing)
+        self.assertEqual(index.search('au'), [('Austin, TX', 1)])
+        self.assertEqual(index.search('au'), locations.LocationIndex.build().search('au'))
+
+
+@override_settings(LISTINGS_VIEW_FLUSH_SECONDS=0, LISTINGS_READ_REPLICAS=[])
+class TrendingTests(BookingTestCase):
+    """Views are flushed in one upsert and ranked by forward-decayed score"""
+
+    def setUp(self):
+        super().setUp()
+        popularity.reset_views()
+        self.addCleanup(popularity.reset_views)
+        self.other = Listing.objects.create(
+            host=self.host, title='Loft in Austin', description='Bright.', location='Austin, TX',
+            price_per_night=Decimal('90.00'), bedrooms=1, bathrooms=1, max_guests=2,
+            available_from=date.today(), available_to=date.today() + timedelta(days=90),
+        )
+
+    def record(self, listing, views, at):
+        with mock.patch.object(popularity.timezone, 'now', return_value=at):
+            for _ in range(views):
+                popularity.record_view(listing.listing_id)
+
+    @override_settings(LISTINGS_VIEW_FLUSH_SECONDS=10)
+    def test_buffered_views_flush_as_one_upsert(self):
+        with mock.patch.object(popularity, '_ensure_flusher') as ensure_flusher:
+            for listing, views in ((self.listing, 3), (self.other, 1), (self.listing, 2)):
+                for _ in range(views):
+                    popularity.record_view(listing.listing_id)
+        ensure_flusher.assert_called()
+        self.assertFalse(ListingViewStats.objects.exists())
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(popularity.flush_views(), 2)
+        writes = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(writes), 1)
+        self.assertIn('ON CONFLICT', writes[0])
+        self.assertEqual(popularity.flush_views(), 0)
+
+        with mock.patch.object(popularity, '_ensure_flusher'):
+            popularity.record_view(self.listing.listing_id)
+        popularity.flush_views()
+        totals = dict(ListingViewStats.objects.values_list('listing_id', 'total_views'))
+        self.assertEqual(totals, {self.listing.listing_id: 6, self.other.listing_id: 1})
+
+    def test_failed_flush_keeps_views(self):
+        with mock.patch.object(ListingViewStats.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.record(self.listing, 1, timezone.now())
+        popularity.flush_views()
+        self.assertEqual(ListingViewStats.objects.get().total_views, 1)
+
+    def test_recent_views_outrank_older_ones(self):
+        now = timezone.now()
+        self.record(self.listing, 10, now - timedelta(days=7))
+        self.record(self.other, 3, now)
+        scores = dict(ListingViewStats.objects.values_list('listing_id', 'trend_score'))
+        self.assertGreater(scores[self.other.listing_id], scores[self.listing.listing_id])
+        self.assertAlmostEqual(popularity.decayed_views(scores[self.other.listing_id], now), 3, places=3)
+        self.assertAlmostEqual(popularity.decayed_views(scores[self.listing.listing_id], now), 10 / 2 ** 7, places=3)
+
+        # Later views add to a row in log space without rescoring anything else
+        self.record(self.listing, 10, now)
+        score = ListingViewStats.objects.get(pk=self.listing.listing_id).trend_score
+        self.assertAlmostEqual(popularity.decayed_views(score, now), 10 + 10 / 2 ** 7, places=3)
+
+        popularity.reset_views()
+        response = self.client.get(reverse('listing-trending'))
+        self.assertEqual([row['title'] for row in response.data['results']],
+                         ['Cozy Apartment in Austin', 'Loft in Austin'])
+
+    def test_detail_views_are_counted(self):
+        for _ in range(2):
+            self.client.get(reverse('listing-detail', args=[self.other.listing_id]))
+        self.assertEqual(ListingViewStats.objects.get(pk=self.other.listing_id).total_views, 2)
+        response = self.client.get(reverse('listing-trending'), {'limit': 1})
+        self.assertEqual(response.data['results'][0]['title'], 'Loft in Austin')
+        self.assertAlmostEqual(response.data['results'][0]['recent_views'], 2, places=1)
+
+    def test_top_k_keeps_highest_scores(self):
+        top = popularity.TopK(2)
+        top.offer({'a': 1.0, 'b': 3.0})
+        top.offer({'c': 2.0})
+        self.assertEqual(top.top(5), [('b', 3.0), ('c', 2.0)])
+        top.offer({'c': 4.0, 'a': 5.0})
+        self.assertEqual(top.top(1), [('a', 5.0)])
+        top.replace({'d': 1.0})
+        self.assertEqual(top.top(5), [('d', 1.0)])
+
+
+class ApiSchemaTests(BookingTestCase):
+    """The schema artifact is built once per version and revalidated by ETag"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(LISTINGS_SCHEMA_DIR=directory.name, LISTINGS_SCHEMA_VERSION='test-1')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        schema._loaded.clear()
+        self.addCleanup(schema._loaded.clear)
+
+    def test_etag_round_trip(self):
+        url = reverse('api-schema')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/bookings/', json.loads(response.content)['paths'])
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"stale", ' + etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+        # A gzip response carries the weak form, and sending that back also revalidates
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['ETag'], 'W/' + etag)
+        revalidated = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=compressed['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_artifact_is_reused_per_version(self):
+        with mock.patch.object(schema, 'generate_schema', wraps=schema.generate_schema) as generate:
+            first = schema.build_schema()
+            self.assertEqual(schema.build_schema(), first)
+            self.assertEqual(generate.call_count, 1)
+            self.assertEqual(first.name, 'openapi-test-1.json')
+
+            with override_settings(LISTINGS_SCHEMA_VERSION='test-2'):
+                second = schema.build_schema()
+            self.assertNotEqual(second, first)
+            self.assertEqual(generate.call_count, 2)
+
+            # A served process keeps its loaded body without touching the artifact
+            body, etag = schema.load_schema()
+            self.assertEqual(schema.load_schema(), (body, etag))
+            self.assertEqual(generate.call_count, 2)
+
+    def test_version_digest_follows_sources(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(LISTINGS_SCHEMA_VERSION=None):
+            source = os.path.join(directory, 'views.py')
+            with open(source, 'w') as handle:
+                handle.write('VERSION = 1\n')
+            with mock.patch.object(schema, 'APP_DIR', schema.Path(directory)):
+                before = schema.schema_version()
+                self.assertEqual(schema.schema_version(), before)
+                with open(source, 'w') as handle:
+                    handle.write('VERSION = 2\n')
+                self.assertNotEqual(schema.schema_version(), before)
+
+    def test_lazy_annotations_match_eager_ones(self):
+        from django.urls import path
+        from drf_yasg.codecs import OpenAPICodecJson
+        from drf_yasg.generators import OpenAPISchemaGenerator
+        from drf_yasg import openapi as drf_openapi
+        from rest_framework.decorators import api_view
+
+        def annotate():
+            @docs.swagger_auto_schema(
+                method='get',
+                manual_parameters=[
+                    docs.openapi.Parameter('q', docs.openapi.IN_QUERY, type=docs.openapi.TYPE_STRING, required=True),
+                    docs.openapi.Parameter('day', docs.openapi.IN_QUERY, type=docs.openapi.TYPE_STRING,
+                                           format=docs.openapi.FORMAT_DATE),
+                ],
+                responses={200: ListingSerializer(many=True), 404: 'Not found'}
+            )
+            @api_view(['GET'])
+            def view(request):
+                """Documented view"""
+            return view
+
+        def render(view):
+            generator = OpenAPISchemaGenerator(drf_openapi.Info(title='t', default_version='v1'),
+                                               patterns=[path('things/', view)])
+            return json.loads(OpenAPICodecJson(validators=[]).encode(generator.get_schema(request=None, public=True)))
+
+        with override_settings(LISTINGS_EAGER_DOCS=True):
+            eager = annotate()
+        lazy = annotate()
+        self.assertNotIn('_swagger_auto_schema', vars(lazy.cls.get))
+        docs.apply_schemas()
+        self.assertEqual(render(lazy), render(eager))
+        self.assertEqual(render(lazy)['paths']['/things/']['get']['parameters'][0]['name'], 'q')
+
+
+class SearchCacheTests(BookingTestCase):
+    """Cached search results are invalidated by bookings and reviews, and expire"""
+
+    def setUp(self):
+        super().setUp()
+        search.reset_cache()
+        self.search_url = reverse('listing-search')
+
+    def search(self, **params):
+        response = self.client.get(self.search_url, {'location': 'austin, tx', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_booking_invalidates_date_search(self):
+        dates = {'check_in': str(date.today() + timedelta(days=5)), 'check_out': str(date.today() + timedelta(days=8))}
+        self.assertEqual(len(self.search(**dates)), 1)
+        self.assertEqual(len(self.search(**dates)), 1)
+        self.assertEqual(search.get_cache().hits, 1)
+
+        self.client.post(self.url, self.booking_data(), format='json')
+        self.assertEqual(self.search(**dates), [])
+
+    def test_review_refreshes_cached_rating(self):
+        self.assertEqual(self.search()[0]['average_rating'], 0.0)
+        Review.objects.create(listing=self.listing, guest=self.guest, rating=4, comment='Good.')
+        self.assertEqual(self.search()[0]['average_rating'], 4.0)
+
+    @skipUnless(HAS_REPLICA, 'needs a second database aliased "replica"')
+    @override_settings(DATABASE_ROUTERS=['listings.routers.ReadReplicaRouter'], LISTINGS_READ_REPLICAS=['replica'])
+    def test_misses_are_filled_from_primary(self):
+        routers._lag_cache.clear()
+        with mock.patch.object(routers, 'measure_lag', return_value=0.0), \
+                CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(len(self.search()), 1)
+        self.assertEqual(replica.captured_queries, [])
+
+    def test_entries_expire_after_ttl(self):
+        search.reset_cache(search.SearchCache(ttl=0))
+        self.search()
+        self.search()
+        self.assertEqual(search.get_cache().hits, 0)
+
+    def test_non_finite_prices_are_rejected(self):
+        for price in ('nan', 'Infinity', 'sNaN', 'abc'):
+            response = self.client.get(self.search_url, {'location': 'Austin, TX', 'min_price': price})
+            self.assertEqual(response.status_code, 400, price)
+
+
+class CalendarSyncTests(BookingTestCase):
+    """Imported feeds are stored in batches and block nights for the calendar and bookings"""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        path = os.path.join(self.directory.name, 'feed.ics')
+        events = [(5, 7), (20, 21), (30, 33)]
+        with open(path, 'w') as handle:
+            handle.write('BEGIN:VCALENDAR\r\n')
+            for number, (first, last) in enumerate(events):
+                handle.write(
+                    f'BEGIN:VEVENT\r\nUID:event-{number}\r\n'
+                    f'DTSTART;VALUE=DATE:{date.today() + timedelta(days=first):%Y%m%d}\r\n'
+                    f'DTEND;VALUE=DATE:{date.today() + timedelta(days=last):%Y%m%d}\r\nEND:VEVENT\r\n'
+                )
+            handle.write('END:VCALENDAR\r\n')
+        self.feed = CalendarFeed.objects.create(listing=self.listing, url=path)
+
+    def test_sync_stores_events_in_batches(self):
+        stats = calendars.sync_feeds([self.feed], workers=1, batch_size=2)
+        self.assertEqual(stats, {'synced': 1, 'unchanged': 0, 'failed': 0, 'ranges': 3})
+        self.assertEqual(
+            sorted(BlockedDateRange.objects.values_list('uid', flat=True)), ['event-0', 'event-1', 'event-2']
+        )
+
+    def test_fetches_stay_within_window(self):
+        pulled = []
+
+        def feeds():
+            for number in range(10):
+                pulled.append(number)
+                yield CalendarFeed(listing=self.listing, url=self.feed.url)
+
+        results = calendars.fetch_all(feeds(), workers=2, window=3)
+        for count, (feed, (source, _, _), error) in enumerate(results, 1):
+            self.assertIsNone(error)
+            source.close()
+            # Only the window is fetched ahead of what was consumed
+            self.assertLessEqual(len(pulled), count + 3)
+        self.assertEqual(len(pulled), 10)
+
+    def test_blocked_nights_in_calendar_and_bookings(self):
+        calendars.sync_feeds([self.feed], workers=1)
+        self.client.post(self.url, self.booking_data(
+            check_in_date=str(date.today() + timedelta(days=1)),
+            check_out_date=str(date.today() + timedelta(days=3)),
+        ), format='json')
+        response = self.client.get(reverse('listing-calendar'), {
+            'ids': str(self.listing.listing_id),
+            'start': str(date.today()), 'end': str(date.today() + timedelta(days=8)),
+        })
+        self.assertEqual(response.data['availability'], ['01100330'])
+
+        # Overlaps event-0 by one night
+        response = self.client.post(self.url, self.booking_data(
+            check_in_date=str(date.today() + timedelta(days=6)),
+            check_out_date=str(date.today() + timedelta(days=9)),
+        ), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+class ListingPurgeTests(BookingTestCase):
+    """Deleting a listing hides it at once and purges its rows in batches"""
+
+    def test_delete_then_purge_in_batches(self):
+        for offset in (5, 10, 15):
+            self.client.post(self.url, self.booking_data(
+                check_in_date=str(date.today() + timedelta(days=offset)),
+                check_out_date=str(date.today() + timedelta(days=offset + 2)),
+            ), format='json')
+        Review.objects.create(listing=self.listing, guest=self.guest, rating=5, comment='Great stay.')
+
+        detail = reverse('listing-detail', args=[self.listing.listing_id])
+        response = self.client.delete(detail)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertEqual(self.client.get(detail).status_code, 404)
+        progress = reverse('listing-purge-detail', args=[response.data['purge_id']])
+
+        # Reviews first, then bookings two at a time
+        self.assertEqual(run_pending_purges(batch_size=2, max_batches=2), 2)
+        data = self.client.get(progress).data
+        self.assertEqual((data['status'], data['reviews_deleted'], data['bookings_deleted']), ('running', 1, 2))
+        self.assertEqual(data['bookings_total'], 3)
+
+        run_pending_purges(batch_size=2)
+        data = self.client.get(progress).data
+        self.assertEqual((data['status'], data['bookings_deleted']), ('completed', 3))
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(Listing.all_objects.exists())
+
+    @override_settings(LISTINGS_SYNC_SETTLE_SECONDS=0)
+    def test_bookings_of_deleted_listing_are_hidden(self):
+        other = Listing.objects.create(
+            host=self.host, title='Loft in Austin', description='Bright.', location='Austin, TX',
+            price_per_night=Decimal('90.00'), bedrooms=1, bathrooms=1, max_guests=2,
+            available_from=date.today(), available_to=date.today() + timedelta(days=90),
+        )
+        hidden = self.client.post(self.url, self.booking_data(), format='json').data['booking_id']
+        kept = self.client.post(self.url, self.booking_data(listing_id=str(other.listing_id)), format='json').data['booking_id']
+        watermark = self.client.get(reverse('booking-changes')).data['watermark']
+        soft_delete_listing(self.listing)
+
+        def ids(rows):
+            return [str(row['booking_id']) for row in rows]
+        self.assertEqual(ids(self.client.get(self.url).data), [str(kept)])
+        batch = self.client.get(reverse('booking-multi-get'), {'ids': f'{hidden},{kept}'}).data
+        self.assertEqual((ids(batch['results']), batch['missing']), ([str(kept)], [str(hidden)]))
+        self.assertEqual(self.client.get(reverse('booking-detail', args=[hidden])).status_code, 404)
+        self.assertEqual(ids(self.client.get(reverse('booking-history')).data['results']), [str(kept)])
+        self.assertEqual(ids(self.client.get(reverse('booking-changes')).data['results']), [str(kept)])
+
+        # Clients that already synced the booking learn of its removal once it is purged
+        run_pending_purges()
+        feed = self.client.get(reverse('booking-changes'), {'since': watermark}).data
+        self.assertEqual((feed['results'], [str(pk) for pk in feed['deleted']]), ([], [str(hidden)]))
+
+
+class AvailabilityCalendarTests(BookingTestCase):
+    """One character per night for each listing, in request order"""
+
+    def test_calendar_marks_booked_and_unavailable_nights(self):
+        self.client.post(self.url, self.booking_data(
+            check_in_date=str(date.today() + timedelta(days=1)),
+            check_out_date=str(date.today() + timedelta(days=3)),
+        ), format='json')
+        unknown = '00000000-0000-0000-0000-000000000000'
+        response = self.client.get(reverse('listing-calendar'), {
+            'ids': f'{unknown},{self.listing.listing_id}',
+            'start': str(date.today() - timedelta(days=2)), 'end': str(date.today() + timedelta(days=4)),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['listing_ids'], [self.listing.listing_id])
+        self.assertEqual(response.data['availability'], ['220110'])
+        self.assertEqual(response.data['price_per_night'], ['120.00'])
+        self.assertEqual([str(listing_id) for listing_id in response.data['missing']], [unknown])
+
+    def test_calendar_rejects_long_windows(self):
+        response = self.client.get(reverse('listing-calendar'), {
+            'ids': str(self.listing.listing_id),
+            'start': str(date.today()), 'end': str(date.today() + timedelta(days=63)),
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class BookingExportTests(BookingTestCase):
+    """Sharded exports cover every booking once, ordered by booking_id"""
+
+    def test_shards_merge_in_booking_order(self):
+        for offset in range(7):
+            self.client.post(self.url, self.booking_data(
+                check_in_date=str(date.today() + timedelta(days=offset)),
+                check_out_date=str(date.today() + timedelta(days=offset + 1)),
+            ), format='json')
+        start, end = date.today(), date.today() + timedelta(days=30)
+
+        bounds = reports.shard_bounds(reports.report_bookings(start, end), 3)
+        self.assertEqual(len(bounds), 3)
+        self.assertEqual((bounds[0][0], bounds[-1][1]), (None, None))
+        self.assertTrue(all(high == low for (_, high), (low, _) in zip(bounds, bounds[1:])))
+
+        progress = []
+        output = b''.join(reports.export_bookings(
+            start, end, workers=1, shards=3, progress=lambda *args: progress.append(args)
+        ))
+        exported = [json.loads(line)['booking_id'] for line in output.splitlines()]
+        expected = sorted(str(pk) for pk in Booking.objects.values_list('booking_id', flat=True))
+        self.assertEqual(exported, expected)
+        self.assertEqual(progress[-1], (3, 3, 7))
+
+
+class FixtureRoundTripTests(BookingTestCase):
+    """dump_fixture and load_fixture --clear reproduce the tables exactly"""
+
+    def rows(self):
+        return {model: list(model._base_manager.order_by('pk').values_list()) for model in MODELS}
+
+    def test_round_trip_then_create(self):
+        self.client.post(self.url, self.booking_data(), format='json')
+        Review.objects.create(listing=self.listing, guest=self.guest, rating=5, comment='Great stay.')
+        before = self.rows()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'snapshot.bin')
+            call_command('dump_fixture', path, stdout=StringIO())
+            call_command('load_fixture', path, '--clear', stdout=StringIO())
+        self.assertEqual(self.rows(), before)
+
+        # Sequences were reset past the loaded ids
+        user = User.objects.create_user('newcomer', password='password123')
+        self.assertGreater(user.pk, max(row[0] for row in before[User]))
+
+
+class FailingSink:
+    def send(self, messages):
+        raise ConnectionError('sink unavailable')
+
+
+class PoisonSink:
+    """Rejects any batch holding an event for one booking"""
+
+    def __init__(self, booking_id):
+        self.booking_id = str(booking_id)
+        self.messages = []
+
+    def send(self, messages):
+        if any(message['booking_id'] == self.booking_id for message in messages):
+            raise ValueError('payload rejected')
+        self.messages.extend(messages)
+
+
+class CollectingSink:
+    def __init__(self):
+        self.messages = []
+
+    def send(self, messages):
+        self.messages.extend(messages)
+
+
+class OutboxRelayTests(BookingTestCase):
+    """Booking changes are queued in the outbox and relayed in order"""
+
+    def test_create_queues_event(self):
+        response = self.client.post(self.url, self.booking_data(), format='json')
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.event_type, 'booking.created')
+        self.assertEqual(str(event.booking_id), str(response.data['booking_id']))
+        self.assertEqual(event.payload['total_price'], '360.00')
+
+    def test_failed_batch_is_retried_after_backoff(self):
+        self.client.post(self.url, self.booking_data(), format='json')
+        self.assertEqual(outbox.relay_batch(FailingSink()), (0, 1))
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.attempts, 1)
+        self.assertIn('sink unavailable', event.last_error)
+
+        sink = CollectingSink()
+        # Still backing off
+        self.assertEqual(outbox.relay_batch(sink), (0, 0))
+        self.assertEqual(outbox.relay_batch(sink, now=event.next_attempt_at), (1, 0))
+        self.assertEqual(sink.messages[0]['event_type'], 'booking.created')
+        self.assertIsNotNone(OutboxEvent.objects.get().delivered_at)
+
+    def test_events_for_one_booking_stay_in_order(self):
+        response = self.client.post(self.url, self.booking_data(), format='json')
+        outbox.relay_batch(FailingSink())
+        booking = Booking.objects.get(pk=response.data['booking_id'])
+        booking.status = 'confirmed'
+        outbox.record_event('booking.status_changed', booking, previous_status='pending')
+
+        # The later event is due but waits for the earlier one
+        sink = CollectingSink()
+        self.assertEqual(outbox.relay_batch(sink), (0, 0))
+        first = OutboxEvent.objects.order_by('sequence').first()
+        # The retry goes alone, then the later event follows
+        self.assertEqual(outbox.relay_batch(sink, now=first.next_attempt_at), (1, 0))
+        self.assertEqual(outbox.relay_batch(sink, now=first.next_attempt_at), (1, 0))
+        self.assertEqual(
+            [message['event_type'] for message in sink.messages],
+            ['booking.created', 'booking.status_changed']
+        )
+
+
+    def test_cancel_by_update_or_delete_emits_canceled(self):
+        updated, deleted = [
+            self.client.post(self.url, self.booking_data(
+                check_in_date=str(date.today() + timedelta(days=start)),
+                check_out_date=str(date.today() + timedelta(days=start + 2)),
+            ), format='json').data['booking_id']
+            for start in (5, 10)
+        ]
+        detail = reverse('booking-detail', args=[updated])
+        self.client.put(detail, self.booking_data(status='confirmed'), format='json')
+        self.client.put(detail, self.booking_data(status='canceled'), format='json')
+        self.client.delete(reverse('booking-detail', args=[deleted]))
+
+        events = [
+            (event.event_type, event.payload['status'], event.payload.get('previous_status'))
+            for event in OutboxEvent.objects.filter(booking_id=updated).order_by('sequence')
+        ]
+        self.assertEqual(events, [
+            ('booking.created', 'pending', None),
+            ('booking.status_changed', 'confirmed', 'pending'),
+            ('booking.canceled', 'canceled', 'confirmed'),
+        ])
+        canceled = OutboxEvent.objects.filter(booking_id=deleted).order_by('sequence').last()
+        self.assertEqual((canceled.event_type, canceled.payload['status'], canceled.payload['previous_status']),
+                         ('booking.canceled', 'canceled', 'pending'))
+
+    @override_settings(LISTINGS_OUTBOX_MAX_ATTEMPTS=3)
+    def test_poison_event_is_isolated_and_dead_lettered(self):
+        poison = self.client.post(self.url, self.booking_data(), format='json').data['booking_id']
+        other = self.client.post(self.url, self.booking_data(
+            check_in_date=str(date.today() + timedelta(days=10)),
+            check_out_date=str(date.today() + timedelta(days=12)),
+        ), format='json').data['booking_id']
+        sink = PoisonSink(poison)
+        # Batched together, both fail
+        self.assertEqual(outbox.relay_batch(sink), (0, 2))
+
+        # Retried one per call: the good event goes through, the poison one keeps failing
+        later = timezone.now() + timedelta(days=1)
+        self.assertEqual(outbox.relay_batch(sink, now=later), (0, 1))
+        self.assertEqual(outbox.relay_batch(sink, now=later), (1, 0))
+        self.assertEqual([message['booking_id'] for message in sink.messages], [str(other)])
+
+        self.assertEqual(outbox.relay_batch(sink, now=later + timedelta(days=1)), (0, 1))
+        event = OutboxEvent.objects.get(booking_id=poison)
+        self.assertEqual(event.attempts, 3)
+        self.assertIsNotNone(event.dead_lettered_at)
+        self.assertIn('payload rejected', event.last_error)
+
+        # Dead-lettered events no longer hold up their booking
+        booking = Booking.objects.get(pk=poison)
+        outbox.record_event('booking.canceled', booking)
+        self.assertEqual(outbox.relay_batch(CollectingSink()), (1, 0))
+
+        self.assertEqual(outbox.requeue_dead_letters(), 1)
+        self.assertIsNone(OutboxEvent.objects.get(booking_id=poison, event_type='booking.created').dead_lettered_at)
+
+
+class StatusLogTests(BookingTestCase):
+    """Status changes are appended to the log and survive rollover and deletion"""
+
+    def create_booking(self):
+        response = self.client.post(self.url, self.booking_data(), format='json')
+        return response.data['booking_id']
+
+    def test_status_changes_are_logged_in_order(self):
+        booking_id = self.create_booking()
+        detail = reverse('booking-detail', args=[booking_id])
+        self.client.put(detail, self.booking_data(status='confirmed'), format='json')
+        # Saving without a status change adds nothing
+        self.client.put(detail, self.booking_data(status='confirmed', number_of_guests=3), format='json')
+        self.client.delete(detail)
+
+        response = self.client.get(reverse('booking-transitions', args=[booking_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['from_status'], row['to_status']) for row in response.data['results']],
+            [(None, 'pending'), ('pending', 'confirmed'), ('confirmed', 'canceled')]
+        )
+
+    def test_history_is_limited_to_guest_host_and_staff(self):
+        booking_id = self.create_booking()
+        self.client.delete(reverse('booking-detail', args=[booking_id]))
+        url = reverse('booking-transitions', args=[booking_id])
+
+        stranger = User.objects.create_user('stranger', password='password123')
+        admin = User.objects.create_user('admin', password='password123', is_staff=True)
+        for user, status_code in ((stranger, 404), (self.host, 200), (admin, 200)):
+            client = APIClient()
+            client.force_authenticate(user)
+            self.assertEqual(client.get(url).status_code, status_code, user.username)
+
+    def test_rollover_keeps_history_and_daily_counts(self):
+        booking_id = self.create_booking()
+        self.client.put(
+            reverse('booking-detail', args=[booking_id]), self.booking_data(status='confirmed'), format='json'
+        )
+        first = BookingStatusTransition.objects.order_by('id').first()
+        BookingStatusTransition.objects.filter(pk=first.pk).update(changed_at=first.changed_at - timedelta(days=200))
+
+        self.assertEqual(status_log.rollover(status_log.rollover_cutoff(90), batch_size=1), 1)
+        self.assertEqual(ArchivedStatusTransition.objects.get().id, first.id)
+        self.assertEqual(
+            [row['to_status'] for row in status_log.booking_transitions(booking_id)], ['pending', 'confirmed']
+        )
+
+        today = first.changed_at.date()
+        daily = status_log.transitions_per_day(today - timedelta(days=201), today + timedelta(days=1))
+        self.assertEqual([(row['status'], row['count']) for row in daily], [('pending', 1), ('confirmed', 1)])
+
+    def test_daily_counts_reject_bad_dates(self):
+        admin = User.objects.create_user('admin', password='password123', is_staff=True)
+        self.client.force_authenticate(admin)
+        url = reverse('booking-transitions-daily')
+        for query in ({'start': '2024-02-30', 'end': '2024-03-05'},
+                      {'start': '2024-03-05', 'end': '2024-03-01'},
+                      {'start': 'soon'}):
+            response = self.client.get(url, query)
+            self.assertEqual(response.status_code, 400, query)
+        self.assertEqual(self.client.get(url, {'start': '2024-03-01', 'end': '2024-03-05'}).status_code, 200)
@@ -0,0 +1,135 @@
+import math
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+# (tokens per second, burst) for each budget
+DEFAULT_RATE_LIMITS = {
+    'read': (20.0, 100),
+    'write': (1.0, 10),
+}
+# Idle buckets are dropped once this many clients are tracked
+MAX_TRACKED_KEYS = 100_000
+
+
+class TokenBucketLimiter:
+    """
+    In-process token buckets keyed by (budget, client).
+
+    A bucket is two floats, refilled lazily from the monotonic clock on
+    each check, so a decision is a dict lookup and some arithmetic under a
+    lock, with no database or cache round trip.
+    """
+
+    def __init__(self, limits=None, max_keys=MAX_TRACKED_KEYS, clock=time.monotonic):
+        self.limits = dict(DEFAULT_RATE_LIMITS, **(limits or {}))
+        self.max_keys = max_keys
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.decisions = Counter()
+
+    def check(self, budget, *clients, now=None):
+        """
+        Take a token from the bucket of every client key, or from none of
+        them; return 0 if allowed, else seconds until all have a token
+        """
+        rate, burst = self.limits[budget]
+        now = self.clock() if now is None else now
+        keys = [(budget, client) for client in clients]
+        with self.lock:
+            if len(self.buckets) >= self.max_keys and any(key not in self.buckets for key in keys):
+                self._evict(now)
+            levels = [
+                min(burst, tokens + (now - updated) * rate)
+                for tokens, updated in (self.buckets.get(key, (burst, now)) for key in keys)
+            ]
+            allowed = all(tokens >= 1 for tokens in levels)
+            # A rejected request takes nothing, so it can't drain the other buckets
+            for key, tokens in zip(keys, levels):
+                self.buckets[key] = (tokens - 1 if allowed else tokens, now)
+            if allowed:
+                self.decisions[budget, 'allowed'] += 1
+                return 0
+            self.decisions[budget, 'rejected'] += 1
+            return (1 - min(levels)) / rate
+
+    def _evict(self, now):
+        # A bucket idle long enough to have refilled is the same as no bucket
+        self.buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self.buckets.items()
+            if (now - updated) * self.limits[key[0]][0] < self.limits[key[0]][1] - tokens
+        }
+        if len(self.buckets) >= self.max_keys:
+            # Everyone is mid-burst; forgetting them only lets them burst again
+            self.buckets.clear()
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'limits': {budget: {'rate': rate, 'burst': burst} for budget, (rate, burst) in self.limits.items()},
+                'decisions': {
+                    budget: {
+                        'allowed': self.decisions[budget, 'allowed'],
+                        'rejected': self.decisions[budget, 'rejected'],
+                    }
+                    for budget in self.limits
+                },
+                'tracked_clients': len(self.buckets),
+            }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """The process-wide limiter, configured from LISTINGS_RATE_LIMITS"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = TokenBucketLimiter(getattr(settings, 'LISTINGS_RATE_LIMITS', None))
+    return _limiter
+
+
+def reset_limiter(limiter=None):
+    global _limiter
+    _limiter = limiter
+
+
+def client_keys(request):
+    """The buckets a request draws on: its IP, and its user when authenticated"""
+    keys = [f'ip:{request.META.get("REMOTE_ADDR", "")}']
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        keys.append(f'user:{user.pk}')
+    return keys
+
+
+def throttled(view):
+    """
+    Reject requests over the client's read or write budget with 429.
+
+    Every request is limited per IP, and authenticated requests per user
+    as well, so neither many accounts behind one IP nor one account spread
+    over many IPs escapes a budget. Safe methods draw on the read budget, others on the write budget. The
+    check runs before the view, so rejected requests never reach
+    serializer validation or the database.
+    """
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        budget = 'read' if request.method in SAFE_METHODS else 'write'
+        wait = get_limiter().check(budget, *client_keys(request))
+        if wait:
+            response = Response({"error": "Too many requests"}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(math.ceil(wait))
+            return response
+        return view(request, *args, **kwargs)
+    return wrapped
@@ -1,12 +1,44 @@
 from django.urls import path
-from .views import listing_list_create, listing_detail, booking_list_create, booking_detail
+from .views import (
+    listing_list_create, listing_detail, booking_list_create, booking_detail, booking_history,
+    listing_changes, booking_changes, listing_purge_detail, booking_archive,
+    listing_calendar, listing_similar, location_autocomplete,
+    listing_trending, listing_multi_get, booking_multi_get, api_schema,
+    throttle_metrics, listing_search, search_cache_metrics,
+    listing_ical, compression_metrics, booking_transitions, booking_transitions_daily
+)
 
 urlpatterns = [
     # Listings API
     path('listings/', listing_list_create, name='listing-list-create'),
-    path('listings/<int:pk>/', listing_detail, name='listing-detail'),
+    path('listings/batch/', listing_multi_get, name='listing-multi-get'),
+    path('listings/calendar/', listing_calendar, name='listing-calendar'),
+    path('listings/changes/', listing_changes, name='listing-changes'),
+    path('listings/search/', listing_search, name='listing-search'),
+    path('listings/trending/', listing_trending, name='listing-trending'),
+    path('listings/<uuid:pk>/', listing_detail, name='listing-detail'),
+    path('listings/<uuid:pk>/calendar.ics', listing_ical, name='listing-ical'),
+    path('listings/<uuid:pk>/similar/', listing_similar, name='listing-similar'),
+    path('listings/purges/<uuid:pk>/', listing_purge_detail, name='listing-purge-detail'),
 
     # Bookings API
     path('bookings/', booking_list_create, name='booking-list-create'),
-    path('bookings/<int:pk>/', booking_detail, name='booking-detail'),
+    path('bookings/batch/', booking_multi_get, name='booking-multi-get'),
+    path('bookings/changes/', booking_changes, name='booking-changes'),
+    path('bookings/history/', booking_history, name='booking-history'),
+    path('bookings/archive/', booking_archive, name='booking-archive'),
+    path('bookings/transitions/daily/', booking_transitions_daily, name='booking-transitions-daily'),
+    path('bookings/<uuid:pk>/', booking_detail, name='booking-detail'),
+    path('bookings/<uuid:pk>/transitions/', booking_transitions, name='booking-transitions'),
+
+    # Locations API
+    path('locations/autocomplete/', location_autocomplete, name='location-autocomplete'),
+
+    # Metrics
+    path('metrics/throttle/', throttle_metrics, name='throttle-metrics'),
+    path('metrics/search-cache/', search_cache_metrics, name='search-cache-metrics'),
+    path('metrics/compression/', compression_metrics, name='compression-metrics'),
+
+    # Prebuilt OpenAPI schema
+    path('schema/', api_schema, name='api-schema'),
 ]
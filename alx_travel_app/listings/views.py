@@ -1,15 +1,115 @@
-from rest_framework.decorators import api_view
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_safe
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
-from .models import Listing, Booking
-from .serializers import ListingSerializer, BookingSerializer
+from .availability import MAX_CALENDAR_LISTINGS, MAX_CALENDAR_NIGHTS, build_calendar
+from .compression import compressed
+from .deletion import soft_delete_listing
+from .docs import openapi, swagger_auto_schema
+from .models import Listing, Booking, ListingPurge, ArchivedBooking
+from .idempotency import idempotent
+from .pagination import keyset_paginate, parse_limit
+from .profiling import profiled
+from .routers import pin_to_primary, read_from_replica
+from . import calendars, compression, locations, popularity, schema, search, similarity, status_log
+from .sync import ResyncRequired, change_feed, delete_booking
+from .throttling import get_limiter, throttled
+from .serializers import (
+    ListingSerializer, ListingSummarySerializer, BookingSerializer, BookingHistorySerializer,
+    ListingPurgeSerializer, ArchivedBookingSerializer, parse_field_list
+)
+
+FIELDSET_PARAMETERS = [
+    openapi.Parameter(
+        'fields', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+        description="Comma-separated fields to return, dotted for nested (e.g. title,host.username)"
+    ),
+    openapi.Parameter(
+        'expand', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+        description="Comma-separated relations to render inline; others are returned as ids"
+    ),
+]
+
+
+def get_fieldset(request):
+    """Read ?fields= and ?expand= into serializer keyword arguments"""
+    return {
+        'fields': parse_field_list(request.query_params.get('fields')),
+        'expand': parse_field_list(request.query_params.get('expand')),
+    }
+
+
+def parse_id_list(request):
+    """Read ?ids= as a de-duplicated, ordered list of UUIDs, leaving malformed values as strings"""
+    ids = []
+    for value in request.query_params.get('ids', '').split(','):
+        value = value.strip()
+        if not value:
+            continue
+        try:
+            ids.append(uuid.UUID(value))
+        except ValueError:
+            ids.append(value)
+    return list(dict.fromkeys(ids))
+
+
+def get_id_list(request):
+    """Read ?ids= as a de-duplicated, ordered list of UUIDs, raising ValueError if malformed"""
+    ids = parse_id_list(request)
+    if any(isinstance(pk, str) for pk in ids):
+        raise ValueError("ids must be comma-separated UUIDs")
+    return ids
+
+
+MAX_BATCH_IDS = 100
+
+
+def multi_get_response(request, queryset, serializer_class):
+    """Serialize the rows named by ?ids= in request order, reporting unknown or malformed ids"""
+    ids = parse_id_list(request)
+    if not ids or len(ids) > MAX_BATCH_IDS:
+        return Response(
+            {"error": f"Provide between 1 and {MAX_BATCH_IDS} ids"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    fieldset = get_fieldset(request)
+    # Malformed ids can't match a row; they are reported under missing as given
+    rows = serializer_class(**fieldset).optimize_queryset(queryset).in_bulk(
+        [pk for pk in ids if isinstance(pk, uuid.UUID)]
+    )
+    found = [rows[pk] for pk in ids if pk in rows]
+    serializer = serializer_class(found, many=True, **fieldset)
+    return Response({
+        "results": serializer.data,
+        "missing": [str(pk) for pk in ids if pk not in rows],
+    })
+
+
+def visible_bookings():
+    """Bookings whose listing isn't pending deletion; the purge removes the rest"""
+    return Booking.objects.filter(listing__is_deleted=False)
+
+
+MULTI_GET_PARAMETERS = FIELDSET_PARAMETERS + [
+    openapi.Parameter(
+        'ids', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+        description=f"Comma-separated ids (at most {MAX_BATCH_IDS}); results keep this order"
+    ),
+]
 
 ### LISTINGS CRUD ###
 
 @swagger_auto_schema(
     method='get',
+    manual_parameters=FIELDSET_PARAMETERS,
     responses={200: ListingSerializer(many=True)}
 )
 @swagger_auto_schema(
@@ -18,11 +118,16 @@ from .serializers import ListingSerializer, BookingSerializer
     responses={201: ListingSerializer}
 )
 @api_view(['GET', 'POST'])
+@throttled
+@profiled
+@compressed
+@read_from_replica
 def listing_list_create(request):
     """Retrieve all listings or create a new listing"""
     if request.method == 'GET':
-        listings = Listing.objects.all()
-        serializer = ListingSerializer(listings, many=True)
+        fieldset = get_fieldset(request)
+        listings = ListingSerializer(**fieldset).optimize_queryset(Listing.objects.all())
+        serializer = ListingSerializer(listings, many=True, **fieldset)
         return Response(serializer.data)
 
     elif request.method == 'POST':
@@ -35,6 +140,22 @@ def listing_list_create(request):
 
 @swagger_auto_schema(
     method='get',
+    manual_parameters=MULTI_GET_PARAMETERS,
+    responses={200: ListingSerializer(many=True)}
+)
+@api_view(['GET'])
+@throttled
+@profiled
+@compressed
+@read_from_replica
+def listing_multi_get(request):
+    """Retrieve several listings by id in one request"""
+    return multi_get_response(request, Listing.objects.all(), ListingSerializer)
+
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=FIELDSET_PARAMETERS,
     responses={200: ListingSerializer}
 )
 @swagger_auto_schema(
@@ -44,18 +165,27 @@ def listing_list_create(request):
 )
 @swagger_auto_schema(
     method='delete',
-    responses={204: 'No Content'}
+    responses={202: ListingPurgeSerializer}
 )
 @api_view(['GET', 'PUT', 'DELETE'])
+@throttled
+@profiled
+@compressed
+@read_from_replica
 def listing_detail(request, pk):
     """Retrieve, update, or delete a listing by ID"""
+    queryset = Listing.objects.all()
+    if request.method == 'GET':
+        fieldset = get_fieldset(request)
+        queryset = ListingSerializer(**fieldset).optimize_queryset(queryset)
     try:
-        listing = Listing.objects.get(pk=pk)
+        listing = queryset.get(pk=pk)
     except Listing.DoesNotExist:
         return Response({"error": "Listing not found"}, status=status.HTTP_404_NOT_FOUND)
 
     if request.method == 'GET':
-        serializer = ListingSerializer(listing)
+        popularity.record_view(listing.listing_id)
+        serializer = ListingSerializer(listing, **fieldset)
         return Response(serializer.data)
 
     elif request.method == 'PUT':
@@ -66,39 +196,286 @@ def listing_detail(request, pk):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     elif request.method == 'DELETE':
-        listing.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        # Hide now; bookings and reviews are purged by purge_deleted_listings
+        purge = soft_delete_listing(listing)
+        return Response(ListingPurgeSerializer(purge).data, status=status.HTTP_202_ACCEPTED)
+
+
+@swagger_auto_schema(
+    method='get',
+    responses={200: ListingPurgeSerializer}
+)
+@api_view(['GET'])
+def listing_purge_detail(request, pk):
+    """Retrieve the progress of a listing purge"""
+    try:
+        purge = ListingPurge.objects.get(pk=pk)
+    except ListingPurge.DoesNotExist:
+        return Response({"error": "Purge not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(ListingPurgeSerializer(purge).data)
+
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter(
+            'ids', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+            description=f"Comma-separated listing ids (at most {MAX_CALENDAR_LISTINGS})"
+        ),
+        openapi.Parameter('start', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, required=True),
+        openapi.Parameter(
+            'end', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, required=True,
+            description=f"Exclusive; at most {MAX_CALENDAR_NIGHTS} nights after start"
+        ),
+    ],
+    responses={200: 'Columnar calendar: one availability string per listing, one character per night '
+                    '(0 free, 1 booked, 2 outside the availability period, 3 blocked by an imported calendar)'}
+)
+@api_view(['GET'])
+@throttled
+@profiled
+@compressed
+@read_from_replica
+def listing_calendar(request):
+    """Retrieve night-by-night availability and price for many listings at once"""
+    try:
+        listing_ids = get_id_list(request)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    if not listing_ids or len(listing_ids) > MAX_CALENDAR_LISTINGS:
+        return Response(
+            {"error": f"Provide between 1 and {MAX_CALENDAR_LISTINGS} listing ids"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        start = parse_date(request.query_params.get('start', ''))
+        end = parse_date(request.query_params.get('end', ''))
+    except ValueError:
+        start = end = None
+    if start is None or end is None:
+        return Response({"error": "start and end must be dates (YYYY-MM-DD)"}, status=status.HTTP_400_BAD_REQUEST)
+    if not 0 < (end - start).days <= MAX_CALENDAR_NIGHTS:
+        return Response(
+            {"error": f"end must be 1 to {MAX_CALENDAR_NIGHTS} nights after start"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response(build_calendar(listing_ids, start, end))
+
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER)],
+    responses={200: ListingSummarySerializer(many=True)}
+)
+@api_view(['GET'])
+@throttled
+@profiled
+@compressed
+@read_from_replica
+def listing_similar(request, pk):
+    """Retrieve listings similar to a listing, most similar first"""
+    if not similarity.is_available():
+        return Response({"error": "Similar listings are unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    try:
+        limit = parse_limit(request.query_params.get('limit'), default=10)
+        # Ask for a few extra in case some were deleted since the index was updated
+        similar_ids = similarity.get_index().similar(pk, limit + 5)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    except KeyError:
+        return Response({"error": "Listing not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    listings = Listing.objects.only(*ListingSummarySerializer.Meta.fields).in_bulk(similar_ids)
+    ordered = [listings[listing_id] for listing_id in similar_ids if listing_id in listings][:limit]
+    serializer = ListingSummarySerializer(ordered, many=True)
+    return Response({"results": serializer.data})
+
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER)],
+    responses={200: ListingSummarySerializer(many=True)}
+)
+@api_view(['GET'])
+@throttled
+@profiled
+@compressed
+@read_from_replica
+def listing_trending(request):
+    """Retrieve the most viewed listings, with recent views weighted most"""
+    try:
+        limit = parse_limit(request.query_params.get('limit'), default=10)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    top = popularity.top_listings(limit + 5)
+    listings = Listing.objects.only(*ListingSummarySerializer.Meta.fields).in_bulk([pk for pk, _ in top])
+
+    results = []
+    now = timezone.now()
+    for listing_id, score in top:
+        if listing_id in listings and len(results) < limit:
+            data = ListingSummarySerializer(listings[listing_id]).data
+            data['recent_views'] = round(popularity.decayed_views(score, now), 2)
+            results.append(data)
+    return Response({"results": results})
+
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=FIELDSET_PARAMETERS + [
+        openapi.Parameter('location', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                          description="Location to search, case-insensitive"),
+        openapi.Parameter('check_in', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+        openapi.Parameter('check_out', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+        openapi.Parameter('guests', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        openapi.Parameter('min_price', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+        openapi.Parameter('max_price', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+        openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+    ],
+    responses={200: ListingSerializer(many=True)}
+)
+@api_view(['GET'])
+@throttled
+@profiled
+@compressed
+@read_from_replica
+def listing_search(request):
+    """Search listings in a location, optionally free for given dates, cheapest first"""
+    params = request.query_params
+    location = ' '.join(params.get('location', '').split())
+    if not location:
+        return Response({"error": "location is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        check_in = parse_date(params.get('check_in', ''))
+        check_out = parse_date(params.get('check_out', ''))
+    except ValueError:
+        check_in = check_out = None
+    if (params.get('check_in') or params.get('check_out')) and not (check_in and check_out):
+        return Response(
+            {"error": "check_in and check_out must both be dates (YYYY-MM-DD)"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    if check_in and check_out <= check_in:
+        return Response({"error": "check_out must be after check_in"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        guests = int(params.get('guests') or 1)
+        min_price = Decimal(params['min_price']) if params.get('min_price') else None
+        max_price = Decimal(params['max_price']) if params.get('max_price') else None
+        limit = parse_limit(params.get('limit'))
+        if any(price is not None and not price.is_finite() for price in (min_price, max_price)):
+            raise ValueError("Prices must be finite")
+    except (ValueError, InvalidOperation):
+        return Response(
+            {"error": "guests and limit must be integers, prices numbers"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    fieldset = get_fieldset(request)
+    filters = {
+        'check_in': check_in, 'check_out': check_out, 'guests': guests,
+        'min_price': min_price, 'max_price': max_price,
+    }
+
+    def run_search():
+        queryset = ListingSerializer(**fieldset).optimize_queryset(search.search_listings(location, **filters))
+        return list(ListingSerializer(queryset[:limit], many=True, **fieldset).data)
+
+    query = dict(filters, limit=limit, **fieldset)
+    return Response({"results": search.get_cache().get_or_compute(location, query, run_search)})
+
+
+@swagger_auto_schema(method='get', responses={200: 'iCalendar (text/calendar) of booked nights'})
+@api_view(['GET'])
+@throttled
+@profiled
+@compressed
+def listing_ical(request, pk):
+    """Stream a listing's upcoming booked nights as an iCal feed for other platforms"""
+    listing = Listing.objects.filter(pk=pk).only('listing_id', 'title').first()
+    if listing is None:
+        return Response({"error": "Listing not found"}, status=status.HTTP_404_NOT_FOUND)
+    response = StreamingHttpResponse(calendars.export_bookings(listing), content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = f'inline; filename="{listing.listing_id}.ics"'
+    return response
 
 
 ### BOOKINGS CRUD ###
 
 @swagger_auto_schema(
     method='get',
+    manual_parameters=FIELDSET_PARAMETERS,
     responses={200: BookingSerializer(many=True)}
 )
 @swagger_auto_schema(
     method='post',
     request_body=BookingSerializer,
+    manual_parameters=[
+        openapi.Parameter(
+            'Idempotency-Key', openapi.IN_HEADER, type=openapi.TYPE_STRING,
+            description="Client-generated key; retries with the same key replay the first response"
+        ),
+    ],
     responses={201: BookingSerializer}
 )
 @api_view(['GET', 'POST'])
+@throttled
+@profiled
+@compressed
+@idempotent
+@read_from_replica
 def booking_list_create(request):
     """Retrieve all bookings or create a new booking"""
     if request.method == 'GET':
-        bookings = Booking.objects.all()
-        serializer = BookingSerializer(bookings, many=True)
+        fieldset = get_fieldset(request)
+        bookings = BookingSerializer(**fieldset).optimize_queryset(visible_bookings())
+        serializer = BookingSerializer(bookings, many=True, **fieldset)
         return Response(serializer.data)
 
     elif request.method == 'POST':
+        if not request.user.is_authenticated:
+            return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
         serializer = BookingSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # The listing row stays locked from validation until the insert commits
+        with transaction.atomic():
+            if serializer.is_valid():
+                serializer.save(guest=request.user)
+        if serializer.errors:
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Read-your-writes: keep this client's reads off lagging replicas
+        pin_to_primary(request)
+
+        # Relations come back as ids unless ?expand= asks for them, so the
+        # response is built from the instance just saved without a refetch
+        fieldset = get_fieldset(request)
+        booking = serializer.instance
+        if fieldset['expand']:
+            booking = BookingSerializer(**fieldset).optimize_queryset(Booking.objects.all()).get(pk=booking.pk)
+        else:
+            fieldset['expand'] = {}
+        return Response(BookingSerializer(booking, **fieldset).data, status=status.HTTP_201_CREATED)
 
 
 @swagger_auto_schema(
     method='get',
+    manual_parameters=MULTI_GET_PARAMETERS,
+    responses={200: BookingSerializer(many=True)}
+)
+@api_view(['GET'])
+@throttled
+@profiled
+@compressed
+@read_from_replica
+def booking_multi_get(request):
+    """Retrieve several bookings by id in one request"""
+    return multi_get_response(request, visible_bookings(), BookingSerializer)
+
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=FIELDSET_PARAMETERS,
     responses={200: BookingSerializer}
 )
 @swagger_auto_schema(
@@ -111,15 +488,23 @@ def booking_list_create(request):
     responses={204: 'No Content'}
 )
 @api_view(['GET', 'PUT', 'DELETE'])
+@throttled
+@profiled
+@compressed
+@read_from_replica
 def booking_detail(request, pk):
     """Retrieve, update, or delete a booking by ID"""
+    queryset = visible_bookings()
+    if request.method == 'GET':
+        fieldset = get_fieldset(request)
+        queryset = BookingSerializer(**fieldset).optimize_queryset(queryset)
     try:
-        booking = Booking.objects.get(pk=pk)
+        booking = queryset.get(pk=pk)
     except Booking.DoesNotExist:
         return Response({"error": "Booking not found"}, status=status.HTTP_404_NOT_FOUND)
 
     if request.method == 'GET':
-        serializer = BookingSerializer(booking)
+        serializer = BookingSerializer(booking, **fieldset)
         return Response(serializer.data)
 
     elif request.method == 'PUT':
@@ -130,5 +515,273 @@ def booking_detail(request, pk):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     elif request.method == 'DELETE':
-        booking.delete()
+        delete_booking(booking)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+### CHANGE FEEDS ###
+
+CHANGE_FEED_PARAMETERS = FIELDSET_PARAMETERS + [
+    openapi.Parameter(
+        'since', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+        description="Watermark from the previous response; omit for a full sync"
+    ),
+    openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+]
+
+
+def change_feed_response(request, queryset, model, serializer_class):
+    """Serialize one page of a change feed, or the error explaining why it can't"""
+    # Served from the primary: replica lag could let a row appear behind the watermark
+    fieldset = get_fieldset(request)
+    # updated_at is loaded whatever ?fields= asks for, to build the watermark
+    queryset = serializer_class(**fieldset).optimize_queryset(queryset, extra_fields=['updated_at'])
+    try:
+        limit = parse_limit(request.query_params.get('limit'))
+        feed = change_feed(queryset, model, request.query_params.get('since'), limit)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    except ResyncRequired:
+        return Response(
+            {"error": "Watermark expired; restart without 'since' for a full sync"},
+            status=status.HTTP_410_GONE
+        )
+    serializer = serializer_class(feed['rows'], many=True, **fieldset)
+    return Response({
+        "results": serializer.data,
+        "deleted": feed['deleted'],
+        "watermark": feed['watermark'],
+        "has_more": feed['has_more'],
+    })
+
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=CHANGE_FEED_PARAMETERS,
+    responses={200: ListingSerializer(many=True), 410: 'Watermark expired'}
+)
+@api_view(['GET'])
+@compressed
+def listing_changes(request):
+    """Retrieve listings created, updated or deleted since a watermark"""
+    return change_feed_response(request, Listing.objects.all(), 'listing', ListingSerializer)
+
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=CHANGE_FEED_PARAMETERS,
+    responses={200: BookingSerializer(many=True), 410: 'Watermark expired'}
+)
+@api_view(['GET'])
+@compressed
+def booking_changes(request):
+    """Retrieve bookings created, updated or deleted since a watermark"""
+    return change_feed_response(request, visible_bookings(), 'booking', BookingSerializer)
+
+
+### GUEST BOOKING HISTORY ###
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter(
+            'scope', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['upcoming', 'past'],
+            description="upcoming (check-in today or later, soonest first) or past (most recent first)"
+        ),
+        openapi.Parameter(
+            'status', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+            description="Comma-separated booking statuses to include"
+        ),
+        openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+        openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+    ],
+    responses={200: BookingHistorySerializer(many=True)}
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttled
+@profiled
+@compressed
+@read_from_replica
+def booking_history(request):
+    """Retrieve the current user's bookings, keyset-paginated by check-in date"""
+    scope = request.query_params.get('scope', 'upcoming')
+    if scope not in ('upcoming', 'past'):
+        return Response({"error": "scope must be 'upcoming' or 'past'"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Served by the (guest, status, check_in_date) index
+    bookings = visible_bookings().filter(guest=request.user)
+    statuses = [s for s in request.query_params.get('status', '').split(',') if s]
+    if statuses:
+        valid = {choice for choice, _ in Booking.BOOKING_STATUS_CHOICES}
+        if not set(statuses) <= valid:
+            return Response({"error": "Invalid status"}, status=status.HTTP_400_BAD_REQUEST)
+        bookings = bookings.filter(status__in=statuses)
+
+    today = timezone.localdate()
+    if scope == 'upcoming':
+        bookings = bookings.filter(check_in_date__gte=today)
+        ordering = ['check_in_date', 'booking_id']
+    else:
+        bookings = bookings.filter(check_in_date__lt=today)
+        ordering = ['-check_in_date', '-booking_id']
+
+    bookings = BookingHistorySerializer().optimize_queryset(bookings)
+    try:
+        limit = parse_limit(request.query_params.get('limit'))
+        rows, next_cursor = keyset_paginate(
+            bookings, ordering, request.query_params.get('cursor'), limit
+        )
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = BookingHistorySerializer(rows, many=True)
+    return Response({"results": serializer.data, "next_cursor": next_cursor})
+
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+        openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+    ],
+    responses={200: ArchivedBookingSerializer(many=True)}
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttled
+@profiled
+@compressed
+@read_from_replica
+def booking_archive(request):
+    """Retrieve the current user's archived bookings, most recent first"""
+    bookings = ArchivedBooking.objects.filter(guest_id=request.user.pk)
+    try:
+        limit = parse_limit(request.query_params.get('limit'))
+        rows, next_cursor = keyset_paginate(
+            bookings, ['-check_in_date', '-booking_id'], request.query_params.get('cursor'), limit
+        )
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = ArchivedBookingSerializer(rows, many=True)
+    return Response({"results": serializer.data, "next_cursor": next_cursor})
+
+
+### BOOKING STATUS LOG ###
+
+MAX_STATUS_LOG_DAYS = 366
+
+
+@swagger_auto_schema(method='get', responses={200: 'Status transitions of the booking, oldest first', 404: 'Not Found'})
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttled
+@compressed
+def booking_transitions(request, pk):
+    """Retrieve a booking's status history, including after it is deleted or archived"""
+    # Only the booking's guest, its listing's host and staff; 404 for anyone else
+    if not request.user.is_staff and request.user.pk not in (status_log.booking_parties(pk) or ()):
+        return Response({"error": "No status history for this booking"}, status=status.HTTP_404_NOT_FOUND)
+    transitions = status_log.booking_transitions(pk)
+    if not transitions:
+        return Response({"error": "No status history for this booking"}, status=status.HTTP_404_NOT_FOUND)
+    return Response({"results": transitions})
+
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter('start', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, required=True),
+        openapi.Parameter('end', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, required=True,
+                          description="Exclusive"),
+    ],
+    responses={200: 'Transition counts per day and new status'}
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@compressed
+def booking_transitions_daily(request):
+    """Count booking status transitions per day and new status"""
+    try:
+        start = parse_date(request.query_params.get('start', ''))
+        end = parse_date(request.query_params.get('end', ''))
+    except ValueError:
+        start = end = None
+    if start is None or end is None:
+        return Response({"error": "start and end must be dates (YYYY-MM-DD)"}, status=status.HTTP_400_BAD_REQUEST)
+    if end <= start:
+        return Response({"error": "end must be after start"}, status=status.HTTP_400_BAD_REQUEST)
+    if (end - start).days > MAX_STATUS_LOG_DAYS:
+        return Response(
+            {"error": f"At most {MAX_STATUS_LOG_DAYS} days per request"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response({"results": status_log.transitions_per_day(start, end)})
+
+
+### LOCATIONS ###
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                          description="Typed prefix; matches the start of any word of a location"),
+        openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+    ],
+    responses={200: 'Matching locations with listing counts, most listings first'}
+)
+@api_view(['GET'])
+def location_autocomplete(request):
+    """Suggest listing locations for a typed prefix from the in-memory index"""
+    try:
+        limit = parse_limit(request.query_params.get('limit'), default=10)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    matches = locations.get_index().search(request.query_params.get('q', ''), limit)
+    return Response({
+        "results": [{"location": location, "listings": count} for location, count in matches]
+    })
+
+
+### METRICS ###
+
+@swagger_auto_schema(method='get', responses={200: 'Rate limits and allowed/rejected counts per budget'})
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def throttle_metrics(request):
+    """Report this process's rate limiter decisions"""
+    return Response(get_limiter().metrics())
+
+
+@swagger_auto_schema(method='get', responses={200: 'Hit ratio, entries and approximate bytes of the search cache'})
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def search_cache_metrics(request):
+    """Report this process's search cache usage"""
+    return Response(search.get_cache().stats())
+
+
+@swagger_auto_schema(method='get', responses={200: 'Bytes in and out per encoding and compressed body cache usage'})
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def compression_metrics(request):
+    """Report this process's response compression savings"""
+    return Response(compression.get_cache().stats())
+
+
+### API SCHEMA ###
+
+@require_safe
+@compressed
+def api_schema(request):
+    """Serve the prebuilt OpenAPI schema, answering 304 when the client's ETag is current"""
+    body, etag = schema.load_schema()
+    # Compressed responses carry the weak form of the ETag, which clients send back
+    if etag in [tag.strip().removeprefix('W/') for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=300'
+    return response